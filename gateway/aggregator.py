@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Aggregator - Gộp số đo theo cửa sổ thời gian cho từng sensorUid trước khi upload
+  - Cấu hình theo loại cảm biến (mục "aggregation" trong devices.json), loại không cấu hình → gửi thẳng
+  - tumbling: cửa sổ cố định [k*window, (k+1)*window), đóng cửa sổ → gửi 1 bản ghi
+  - sliding: cửa sổ dài window, trượt mỗi step; chia thành window/step ngăn cố định (ring)
+  - Mỗi bản ghi: min / max / mean / last / count; data[key] = mean (hoặc last) để backend đọc như số đo thường
+  - Trạng thái mỗi sensorUid có kích thước cố định, tối đa max_sensors sensorUid (LRU)
+  - Cảnh báo ngưỡng vẫn chạy trên giá trị gốc trong send_to_backend, không chạy trên giá trị gộp
+"""
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+
+TUMBLING = "tumbling"
+SLIDING = "sliding"
+
+# Số ngăn tối đa của một cửa sổ sliding (window / step)
+MAX_BUCKETS = 120
+
+log = logging.getLogger("gateway.aggregator")
+
+
+class WindowSpec:
+    __slots__ = ("mode", "window", "step", "buckets", "report")
+
+    def __init__(self, sensor_type, spec):
+        self.mode = spec.get("mode", TUMBLING)
+        self.window = float(spec.get("window", 60))
+        self.report = spec.get("report", "mean")
+        if self.mode not in (TUMBLING, SLIDING):
+            raise ValueError(f"aggregation.{sensor_type}: mode không hỗ trợ: {self.mode}")
+        if self.report not in ("mean", "last"):
+            raise ValueError(f"aggregation.{sensor_type}: report không hỗ trợ: {self.report}")
+        if self.window <= 0:
+            raise ValueError(f"aggregation.{sensor_type}: window phải > 0")
+        self.step = float(spec.get("step", self.window)) if self.mode == SLIDING else self.window
+        self.buckets = int(round(self.window / self.step)) if self.step > 0 else 0
+        if self.mode == SLIDING and not (1 <= self.buckets <= MAX_BUCKETS
+                                         and math.isclose(self.buckets * self.step, self.window)):
+            raise ValueError(f"aggregation.{sensor_type}: window phải là bội của step (tối đa {MAX_BUCKETS} ngăn)")
+
+
+def compile_rules(config):
+    """{"TEMPERATURE": {"mode": "tumbling", "window": 60}, ...} → {type: WindowSpec}; null = không gộp."""
+    return {sensor_type: WindowSpec(sensor_type, spec) for sensor_type, spec in config.items() if spec}
+
+
+class _Window:
+    """Trạng thái một sensorUid: các ngăn (count, sum, min, max) trong mảng cố định."""
+    __slots__ = ("spec", "sensor_type", "key", "bucket", "counts", "sums", "mins", "maxs", "last", "context")
+
+    def __init__(self, spec, sensor_type, key):
+        n = spec.buckets if spec.mode == SLIDING else 1
+        self.spec = spec
+        self.sensor_type = sensor_type
+        self.key = key
+        self.bucket = None  # chỉ số ngăn hiện tại = int(t // step)
+        self.counts = [0] * n
+        self.sums = [0.0] * n
+        self.mins = [0.0] * n
+        self.maxs = [0.0] * n
+        self.last = None
+        self.context = None  # gói gốc gần nhất → rawData / sequenceNumber của bản ghi gộp
+
+    def add(self, value, slot):
+        i = slot % len(self.counts)
+        if self.counts[i]:
+            self.counts[i] += 1
+            self.sums[i] += value
+            if value < self.mins[i]:
+                self.mins[i] = value
+            if value > self.maxs[i]:
+                self.maxs[i] = value
+        else:
+            self.counts[i] = 1
+            self.sums[i] = value
+            self.mins[i] = value
+            self.maxs[i] = value
+
+    def advance(self, slot):
+        """Xóa các ngăn cũ khi chuyển sang ngăn slot (ngăn bị bỏ qua cũng được xóa)."""
+        n = len(self.counts)
+        for k in range(self.bucket + 1, min(slot, self.bucket + n) + 1):
+            self.counts[k % n] = 0
+        self.bucket = slot
+
+    def count(self):
+        return sum(self.counts)
+
+    def snapshot(self, sensor_uid):
+        """Bản ghi cảm biến cho cửa sổ kết thúc ở ngăn hiện tại (None nếu cửa sổ rỗng)."""
+        count = 0
+        total = 0.0
+        lo = hi = None
+        for i, c in enumerate(self.counts):
+            if c:
+                count += c
+                total += self.sums[i]
+                lo = self.mins[i] if lo is None or self.mins[i] < lo else lo
+                hi = self.maxs[i] if hi is None or self.maxs[i] > hi else hi
+        if not count:
+            return None
+        spec = self.spec
+        end = (self.bucket + 1) * spec.step
+        mean = round(total / count, 2)
+        return {
+            "sensorUid": sensor_uid,
+            "type": self.sensor_type,
+            "data": {
+                self.key: mean if spec.report == "mean" else self.last,
+                "aggregate": {
+                    "window": spec.mode,
+                    "start": int((end - spec.window) * 1000),
+                    "end": int(end * 1000),
+                    "count": count,
+                    "min": lo,
+                    "max": hi,
+                    "mean": mean,
+                    "last": self.last,
+                },
+            },
+        }
+
+
+class Aggregator:
+    def __init__(self, spec_fn, emit, max_sensors=10000, flush_interval=1.0):
+        """spec_fn(sensor_type) → WindowSpec hoặc None; emit(dev_id, sensors, context) gửi bản ghi gộp
+        của các cửa sổ được đóng bởi flusher nền (sensorUid không còn gửi số đo)."""
+        self.spec_fn = spec_fn
+        self.emit = emit
+        self.max_sensors = max_sensors
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.windows = OrderedDict()
+        self.samples = 0
+        self.passthrough = 0
+        self.emitted = 0
+        self.evicted = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add(self, dev_id, sensors, context, now=None):
+        """Nhận danh sách cảm biến của một gói. Trả về danh sách cần gửi ngay:
+        cảm biến không gộp + bản ghi của các cửa sổ vừa đóng."""
+        now = time.time() if now is None else now
+        out = []
+        evicted = []
+        with self.lock:
+            for sensor in sensors:
+                spec = self.spec_fn(sensor["type"])
+                data = sensor["data"]
+                if spec is None or len(data) != 1:
+                    self.passthrough += 1
+                    out.append(sensor)
+                    continue
+                (key, value), = data.items()
+                if not isinstance(value, (int, float)):
+                    self.passthrough += 1
+                    out.append(sensor)
+                    continue
+                self.samples += 1
+                uid = sensor["sensorUid"]
+                w = self.windows.get(uid)
+                if w is None or w.spec is not spec or w.key != key:
+                    # sensorUid mới hoặc cấu hình vừa nạp lại → bắt đầu cửa sổ mới
+                    if w is not None:
+                        self._close(uid, w, out)
+                    elif len(self.windows) >= self.max_sensors:
+                        old_uid, old = self.windows.popitem(last=False)
+                        self.evicted += 1
+                        evicted.append((old_uid, old))
+                    w = self.windows[uid] = _Window(spec, sensor["type"], key)
+                else:
+                    self.windows.move_to_end(uid)
+                slot = int(now // spec.step)
+                if w.bucket is None:
+                    w.bucket = slot
+                elif slot > w.bucket:
+                    self._close(uid, w, out, slot)
+                w.add(int(value) if isinstance(value, bool) else value, slot)
+                w.last = value  # giữ kiểu gốc (vd. bool của RAIN) cho report "last"
+                w.context = context
+        for uid, w in evicted:
+            self._emit_closed(uid, w)
+        return out
+
+    def _close(self, uid, w, out, slot=None):
+        """Đóng cửa sổ kết thúc ở ngăn hiện tại rồi chuyển sang ngăn slot."""
+        record = w.snapshot(uid)
+        if record is not None:
+            out.append(record)
+            self.emitted += 1
+        if slot is not None:
+            w.advance(slot)
+
+    def _emit_closed(self, uid, w):
+        record = w.snapshot(uid)
+        if record is not None:
+            with self.lock:
+                self.emitted += 1
+            self.emit(_dev_of(w.context), [record], w.context)
+
+    # ---------- Flusher nền ----------
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="aggregator-flusher", daemon=True)
+        self._thread.start()
+        log.info("[AGG] Gộp cửa sổ theo loại cảm biến, tối đa %d sensorUid", self.max_sensors)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(self.flush_interval * 2)
+        self.flush(force=True)
+        self.print_stats()
+
+    def flush(self, now=None, force=False):
+        """Đóng các cửa sổ đã hết hạn của sensorUid im lặng; cửa sổ rỗng hẳn thì xóa để giới hạn bộ nhớ."""
+        now = time.time() if now is None else now
+        pending = {}
+        with self.lock:
+            for uid, w in list(self.windows.items()):
+                slot = int(now // w.spec.step)
+                if not force and slot <= w.bucket:
+                    continue
+                record = w.snapshot(uid)
+                if force:
+                    del self.windows[uid]
+                else:
+                    w.advance(slot)
+                    if not w.count():
+                        del self.windows[uid]
+                if record is not None:
+                    self.emitted += 1
+                    dev_id = _dev_of(w.context)
+                    pending.setdefault(dev_id, ([], w.context))[0].append(record)
+        for dev_id, (records, context) in pending.items():
+            self.emit(dev_id, records, context)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                log.error("[AGG] Lỗi flush: %s", e)
+
+    def stats(self):
+        with self.lock:
+            return {"samples": self.samples, "emitted": self.emitted, "passthrough": self.passthrough,
+                    "evicted": self.evicted, "open_windows": len(self.windows)}
+
+    def print_stats(self):
+        s = self.stats()
+        ratio = s["samples"] / s["emitted"] if s["emitted"] else 0.0
+        log.info("[AGG] %d số đo → %d bản ghi gộp (x%.1f) | gửi thẳng %d | cửa sổ mở %d",
+                 s["samples"], s["emitted"], ratio, s["passthrough"], s["open_windows"], extra=s)
+
+
+def _dev_of(context):
+    return context.get("dev_id", "") if context else ""
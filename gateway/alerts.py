@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Alert Manager - Chống lặp, giới hạn tần suất và gửi cảnh báo IDS theo lô
+  - Mỗi cặp (thiết bị, attackType) có cửa sổ chặn: cảnh báo đầu tiên gửi ngay,
+    các lần lặp lại trong cửa sổ chỉ được gộp (số lần, lần đầu/cuối, giá trị lớn nhất)
+  - Hết cửa sổ → gửi một cảnh báo tổng hợp nếu có lần bị chặn
+  - Gửi bằng BackendUploader riêng (hàng đợi + session keep-alive + lô) → không chặn luồng xử lý
+"""
+import hashlib
+import logging
+import threading
+import time
+import uuid
+
+log = logging.getLogger("gateway.alerts")
+
+
+def _iso(ts):
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(ts)) + f".{int(ts * 1000) % 1000:03d}Z"
+
+
+def build_alert_payload(gateway_uid, attack_type, description, severity, seq_num, source_ip="192.168.4.x"):
+    alert_uid = str(uuid.uuid4())[:8]
+    return {
+        "deviceUid": gateway_uid,
+        "alertUid": f"ALERT_{alert_uid}",
+        "attackType": attack_type,
+        "severity": severity,
+        "confidence": 0.92,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime()),
+        "sequenceNumber": seq_num,
+        "signature": hashlib.md5(f"{gateway_uid}{alert_uid}{seq_num}".encode()).hexdigest(),
+        "sourceIp": source_ip,
+        "ruleDescription": description
+    }
+
+
+class _AlertWindow:
+    __slots__ = ("window_start", "first_seen", "last_seen", "count", "suppressed",
+                 "max_value", "max_severity", "last_seq", "description")
+
+    def __init__(self, now, value, severity, seq_num, description):
+        self.window_start = now
+        self.first_seen = now
+        self.last_seen = now
+        self.count = 1
+        self.suppressed = 0
+        self.max_value = value
+        self.max_severity = severity
+        self.last_seq = seq_num
+        self.description = description
+
+    def add(self, now, value, severity, seq_num, description):
+        self.last_seen = now
+        self.count += 1
+        self.suppressed += 1
+        if value is not None and (self.max_value is None or value > self.max_value):
+            self.max_value = value
+        if severity > self.max_severity:
+            self.max_severity = severity
+        self.last_seq = seq_num
+        self.description = description
+
+
+class AlertManager:
+    def __init__(self, sender, gateway_uid, window=60.0, flush_interval=1.0):
+        """sender: đối tượng có submit(payload) (thường là một BackendUploader cho API_IDS_ALERT)."""
+        self.sender = sender
+        self.gateway_uid = gateway_uid
+        self.window = window
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.windows = {}
+        self.emitted = 0
+        self.suppressed = 0
+        self.summaries = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def raise_alert(self, dev_id, attack_type, description, severity, seq_num, value=None):
+        """Trả về True nếu cảnh báo được gửi ngay, False nếu bị gộp vào cửa sổ hiện tại."""
+        now = time.time()
+        key = (dev_id, attack_type)
+        summary = None
+        with self.lock:
+            w = self.windows.get(key)
+            if w is not None and now - w.window_start < self.window:
+                w.add(now, value, severity, seq_num, description)
+                self.suppressed += 1
+                return False
+            if w is not None and w.suppressed:
+                summary = self._summary_payload(key, w)
+            self.windows[key] = _AlertWindow(now, value, severity, seq_num, description)
+            self.emitted += 1
+        if summary:
+            self.sender.submit(summary)
+        log.warning("[IDS] → Cảnh báo: %s - %s", attack_type, description)
+        self.sender.submit(build_alert_payload(self.gateway_uid, attack_type, description, severity, seq_num))
+        return True
+
+    def _summary_payload(self, key, w):
+        dev_id, attack_type = key
+        max_part = f", max {w.max_value}" if w.max_value is not None else ""
+        description = (f"{w.description} (lặp {w.count} lần trong {w.last_seen - w.first_seen:.0f}s"
+                       f"{max_part}, {_iso(w.first_seen)} → {_iso(w.last_seen)})")
+        payload = build_alert_payload(self.gateway_uid, attack_type, description, w.max_severity, w.last_seq)
+        payload.update({
+            "occurrences": w.count,
+            "firstSeen": _iso(w.first_seen),
+            "lastSeen": _iso(w.last_seen),
+            "maxValue": w.max_value,
+        })
+        self.summaries += 1
+        log.warning("[IDS] → Tổng hợp: %s từ %s x%d (đã chặn %d)", attack_type, dev_id, w.count, w.suppressed)
+        return payload
+
+    # ---------- Flusher nền ----------
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="alert-flusher", daemon=True)
+        self._thread.start()
+        log.info("[IDS] Cửa sổ chống lặp %.0fs / (thiết bị, attackType)", self.window)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(self.flush_interval * 2)
+        self.flush(force=True)
+        self.print_stats()
+
+    def flush(self, force=False):
+        """Đóng các cửa sổ đã hết hạn: gửi bản tổng hợp nếu có lần bị chặn, rồi xóa để giới hạn bộ nhớ."""
+        now = time.time()
+        summaries = []
+        with self.lock:
+            for key, w in list(self.windows.items()):
+                if force or now - w.window_start >= self.window:
+                    if w.suppressed:
+                        summaries.append(self._summary_payload(key, w))
+                    del self.windows[key]
+        for payload in summaries:
+            self.sender.submit(payload)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def stats(self):
+        with self.lock:
+            return {"emitted": self.emitted, "suppressed": self.suppressed,
+                    "summaries": self.summaries, "open_windows": len(self.windows)}
+
+    def print_stats(self):
+        s = self.stats()
+        log.info("[IDS] Đã gửi %d | chặn %d | tổng hợp %d | cửa sổ mở %d",
+                 s['emitted'], s['suppressed'], s['summaries'], s['open_windows'], extra=s)
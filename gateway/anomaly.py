@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Anomaly Detector - Phát hiện bất thường theo luồng cho từng cảm biến (dev_id + trường), O(1) mỗi mẫu
+  - spike: |x - mean| > z * std, mean/var là EWMA (alpha); giá trị vượt ngưỡng bị kẹp trước khi
+    cập nhật EWMA để một gai nhiễu không kéo lệch thống kê (robust)
+  - stuck: cùng một giá trị lặp lại stuck mẫu liên tiếp (cảm biến treo / firmware gửi giá trị cũ)
+  - rate: |Δx / Δt| > max_rate đơn vị/giây, Δt theo trường timestamp (uptime) của gói
+  - Độ nhạy cấu hình theo profile (mục "anomaly" trong devices.json), trường không cấu hình → bỏ qua
+  - Giá trị không qua điều kiện "valid" của cảm biến (vd -999 khi DHT lỗi) bị bỏ qua như khi trích xuất
+  - Bộ nhớ giới hạn: tối đa max_sensors cảm biến (LRU), chia stripe như seqtrack
+"""
+import math
+import threading
+import zlib
+from collections import OrderedDict
+
+SPIKE = "spike"
+STUCK = "stuck"
+RATE = "rate"
+
+DEFAULT_ATTACK_TYPE = "IOT_DATA_MANIPULATION"
+
+_MESSAGES = {
+    SPIKE: "{field} bất thường: {value} (trung bình {mean:.1f} ± {std:.1f}) từ {dev_id}",
+    STUCK: "{field} đứng yên ở {value} qua {count} gói liên tiếp từ {dev_id}",
+    RATE: "{field} thay đổi quá nhanh: {rate:.2f}/s ({value}) từ {dev_id}",
+}
+
+
+class AnomalySpec:
+    __slots__ = ("field", "alpha", "z", "warmup", "min_std", "stuck", "max_rate", "severity", "attack_type", "valid")
+
+    def __init__(self, field, spec, valid=None):
+        self.field = field
+        self.valid = valid
+        self.alpha = float(spec.get("alpha", 0.02))
+        self.z = float(spec.get("z", 4.0))
+        self.warmup = int(spec.get("warmup", 30))
+        self.min_std = float(spec.get("min_std", 0.1))
+        self.stuck = int(spec.get("stuck", 0))  # 0 = tắt
+        self.max_rate = float(spec.get("max_rate", 0))  # 0 = tắt
+        self.severity = int(spec.get("severity", 60))
+        self.attack_type = spec.get("attackType", DEFAULT_ATTACK_TYPE)
+        if not 0 < self.alpha < 1:
+            raise ValueError(f"anomaly.{field}: alpha phải trong (0, 1)")
+        if self.z <= 0:
+            raise ValueError(f"anomaly.{field}: z phải > 0")
+
+
+def compile_specs(config, valid=None):
+    """{"temperature": {"z": 4, "stuck": 40, "max_rate": 1.0}, ...} → tuple AnomalySpec.
+    valid: {field: hàm kiểm tra giá trị hợp lệ} lấy từ mục "sensors" của profile."""
+    valid = valid or {}
+    return tuple(AnomalySpec(field, spec, valid.get(field)) for field, spec in config.items())
+
+
+class _SensorState:
+    __slots__ = ("n", "mean", "var", "last", "last_t", "run")
+
+    def __init__(self, value, t):
+        self.n = 1
+        self.mean = float(value)
+        self.var = 0.0
+        self.last = value
+        self.last_t = t
+        self.run = 1
+
+
+class _Stripe:
+    __slots__ = ("lock", "sensors", "counts")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sensors = OrderedDict()
+        self.counts = {SPIKE: 0, STUCK: 0, RATE: 0}
+
+
+class AnomalyDetector:
+    def __init__(self, max_sensors=30000, stripes=16):
+        self.stripes = [_Stripe() for _ in range(stripes)]
+        self.per_stripe = max(1, max_sensors // stripes)
+
+    def check(self, dev_id, specs, data, t):
+        """Cập nhật trạng thái các trường của một gói. Trả về [(attack_type, description, severity, value)]."""
+        found = []
+        stripe = self.stripes[zlib.crc32(dev_id.encode()) % len(self.stripes)]
+        with stripe.lock:
+            sensors = stripe.sensors
+            for spec in specs:
+                value = data.get(spec.field)
+                if value is None or isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                if spec.valid is not None and not spec.valid(value):
+                    continue
+                key = (dev_id, spec.field)
+                st = sensors.get(key)
+                if st is None:
+                    if len(sensors) >= self.per_stripe:
+                        sensors.popitem(last=False)
+                    sensors[key] = _SensorState(value, t)
+                    continue
+                sensors.move_to_end(key)
+                for kind, fmt in self._update(st, spec, value, t):
+                    stripe.counts[kind] += 1
+                    found.append((spec.attack_type, _MESSAGES[kind].format(field=spec.field, value=value,
+                                                                           dev_id=dev_id, **fmt),
+                                  spec.severity, value))
+        return found
+
+    @staticmethod
+    def _update(st, spec, value, t):
+        out = []
+        std = math.sqrt(st.var)
+
+        # rate: bỏ qua khi Δt không dương (gói trễ / thiết bị khởi động lại)
+        if spec.max_rate and t is not None and st.last_t is not None:
+            dt = t - st.last_t
+            if dt > 0:
+                rate = abs(value - st.last) / dt
+                if rate > spec.max_rate:
+                    out.append((RATE, {"rate": rate}))
+
+        # stuck: báo một lần khi chuỗi lặp đạt ngưỡng
+        if value == st.last:
+            st.run += 1
+            if spec.stuck and st.run == spec.stuck:
+                out.append((STUCK, {"count": st.run}))
+        else:
+            st.run = 1
+
+        # spike: so với thống kê trước mẫu này; kẹp giá trị trước khi cập nhật EWMA
+        limit = spec.z * max(std, spec.min_std)
+        diff = value - st.mean
+        if st.n >= spec.warmup and abs(diff) > limit:
+            out.append((SPIKE, {"mean": st.mean, "std": std}))
+            diff = math.copysign(limit, diff)
+        alpha = spec.alpha if st.n >= spec.warmup else max(spec.alpha, 1.0 / (st.n + 1))
+        incr = alpha * diff
+        st.mean += incr
+        st.var = (1 - alpha) * (st.var + diff * incr)
+        st.n += 1
+        st.last = value
+        st.last_t = t
+        return out
+
+    def stats(self):
+        out = {SPIKE: 0, STUCK: 0, RATE: 0, "sensors": 0}
+        for stripe in self.stripes:
+            with stripe.lock:
+                out["sensors"] += len(stripe.sensors)
+                for kind, n in stripe.counts.items():
+                    out[kind] += n
+        return out
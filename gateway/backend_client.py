@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Backend Client - Chính sách gọi HTTP dùng chung cho mọi endpoint backend (đăng ký, dữ liệu, cảnh báo)
+  - Circuit breaker: closed → open sau failure_threshold lỗi liên tiếp → hết reset_timeout thì half-open
+    cho một request thử; thành công → closed, lỗi → open lại. Khi open: trả về ngay, không chờ timeout
+  - Thử lại: backoff lũy thừa + full jitter, chỉ với lỗi tạm thời (mất kết nối, timeout, 5xx, 408, 429),
+    tổng thời gian mỗi lần gọi không vượt budget của endpoint
+  - Timeout thích nghi: p99 độ trễ gần đây × factor, kẹp trong [min_timeout, timeout cấu hình];
+    request bị timeout được tính như một mẫu độ trễ = timeout → timeout tự nới ra khi backend chậm dần
+  - Dùng được cho cả requests (call) và aiohttp (acall): hàm send(timeout) tự gửi và trả về status / None
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# Số mẫu độ trễ giữ lại / tối thiểu trước khi thu hẹp timeout / số mẫu giữa hai lần tính lại
+LATENCY_WINDOW = 256
+LATENCY_MIN_SAMPLES = 20
+RECOMPUTE_EVERY = 16
+
+log = logging.getLogger("gateway.backend")
+
+
+def is_retryable(status):
+    """None = lỗi kết nối / timeout."""
+    return status is None or status >= 500 or status in (408, 429)
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.rejected = 0
+        self.trips = 0
+
+    def allow(self):
+        """True nếu được gửi request. Half-open chỉ cho một request thử tại một thời điểm."""
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self.probing = False
+                log.info("[BACKEND] %s: half-open → gửi thử", self.name)
+            if self.state == HALF_OPEN and not self.probing:
+                self.probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def release(self):
+        """Request bị hủy giữa chừng (không phải lỗi backend) → cho phép request thử khác."""
+        with self.lock:
+            self.probing = False
+
+    def record(self, ok):
+        with self.lock:
+            if ok:
+                if self.state != CLOSED:
+                    log.warning("[BACKEND] %s: backend hồi phục → closed (đã chặn %d request)", self.name, self.rejected)
+                self.state = CLOSED
+                self.failures = 0
+                self.probing = False
+                return
+            self.failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                if self.state == CLOSED:
+                    self.trips += 1
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self.probing = False
+                log.error("[BACKEND] %s: %d lỗi liên tiếp → open, fail-fast trong %.0fs",
+                          self.name, self.failures, self.reset_timeout)
+
+
+class AdaptiveTimeout:
+    def __init__(self, timeout, min_timeout=1.0, factor=3.0, percentile=0.99):
+        self.max_timeout = timeout
+        self.min_timeout = min(min_timeout, timeout)
+        self.factor = factor
+        self.percentile = percentile
+        self.lock = threading.Lock()
+        self.samples = deque(maxlen=LATENCY_WINDOW)
+        self.pending = 0
+        self.value = timeout
+
+    def observe(self, latency):
+        with self.lock:
+            self.samples.append(latency)
+            self.pending += 1
+            if self.pending < RECOMPUTE_EVERY or len(self.samples) < LATENCY_MIN_SAMPLES:
+                return
+            self.pending = 0
+            lats = sorted(self.samples)
+            p = lats[min(len(lats) - 1, int(len(lats) * self.percentile))]
+            self.value = min(self.max_timeout, max(self.min_timeout, p * self.factor))
+
+    def current(self):
+        return self.value
+
+
+class BackendEndpoint:
+    def __init__(self, name, timeout=15.0, min_timeout=1.0, retries=2, backoff_base=0.5, backoff_max=10.0,
+                 budget=None, failure_threshold=5, reset_timeout=30.0, adaptive=True):
+        """budget: tổng số giây cho một lần gọi kể cả thử lại (mặc định = timeout)."""
+        self.name = name
+        self.retries = max(0, retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.budget = budget if budget is not None else timeout
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+        self.timeout = AdaptiveTimeout(timeout, min_timeout if adaptive else timeout)
+        self.retried = 0
+        ENDPOINTS[name] = self
+
+    def backoff(self, attempt):
+        """Full jitter: ngẫu nhiên trong [0, min(max, base * 2^attempt)]."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _record(self, status, elapsed, timeout):
+        # Chỉ lỗi phía backend / mạng mới tính vào breaker; 4xx là lỗi payload
+        self.breaker.record(not is_retryable(status))
+        if status is not None:
+            self.timeout.observe(elapsed)
+        elif elapsed >= timeout * 0.95:
+            # Timeout: mẫu bị cắt ở mức timeout → đẩy p99 lên khi backend chậm dần
+            self.timeout.observe(timeout)
+
+    def _plan(self, deadline):
+        """(được gửi?, timeout) cho lần thử kế tiếp."""
+        if not self.breaker.allow():
+            return False, 0.0
+        remaining = deadline - time.monotonic()
+        return True, max(0.001, min(self.timeout.current(), remaining))
+
+    def _next_delay(self, attempt, status, deadline):
+        """Số giây chờ trước lần thử kế tiếp, None = dừng."""
+        if not is_retryable(status) or attempt >= self.retries:
+            return None
+        delay = self.backoff(attempt)
+        if time.monotonic() + delay >= deadline:
+            return None
+        self.retried += 1
+        return delay
+
+    def call(self, send, sleep=time.sleep):
+        """send(timeout) -> status | None. Trả về status cuối cùng, None nếu lỗi hoặc mạch đang open."""
+        deadline = time.monotonic() + self.budget
+        attempt = 0
+        while True:
+            allowed, timeout = self._plan(deadline)
+            if not allowed:
+                return None
+            t0 = time.monotonic()
+            try:
+                status = send(timeout)
+            except BaseException:
+                self.breaker.release()
+                raise
+            self._record(status, time.monotonic() - t0, timeout)
+            delay = self._next_delay(attempt, status, deadline)
+            if delay is None:
+                return status
+            sleep(delay)
+            attempt += 1
+
+    async def acall(self, send):
+        """Bản asyncio của call: send(timeout) là coroutine."""
+        deadline = time.monotonic() + self.budget
+        attempt = 0
+        while True:
+            allowed, timeout = self._plan(deadline)
+            if not allowed:
+                return None
+            t0 = time.monotonic()
+            try:
+                status = await send(timeout)
+            except BaseException:  # kể cả CancelledError khi dừng gateway
+                self.breaker.release()
+                raise
+            self._record(status, time.monotonic() - t0, timeout)
+            delay = self._next_delay(attempt, status, deadline)
+            if delay is None:
+                return status
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def is_open(self):
+        return self.breaker.state == OPEN
+
+    def stats(self):
+        b = self.breaker
+        return {"state": b.state, "failures": b.failures, "rejected": b.rejected, "trips": b.trips,
+                "retried": self.retried, "timeout": self.timeout.current()}
+
+
+# Mọi endpoint đã tạo → metric gateway_backend_*
+ENDPOINTS = {}
+
+
+def circuit_states():
+    return {name: STATE_VALUES[ep.breaker.state] for name, ep in list(ENDPOINTS.items())}
+
+
+def current_timeouts():
+    return {name: ep.timeout.current() for name, ep in list(ENDPOINTS.items())}
+
+
+def rejected_counts():
+    return {name: ep.breaker.rejected for name, ep in list(ENDPOINTS.items())}
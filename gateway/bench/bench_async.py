@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+So sánh chế độ thread (gateway.py) với chế độ asyncio (gateway_async.py) trên toàn đường đi:
+  MQTT → process_message (decode, checksum, profile, seq, cảnh báo) → upload HTTP → backend
+  - Backend giả (bench/mock_backend.py) chạy ở process riêng, trả 201 sau một độ trễ cố định
+  - Độ trễ đầu-cuối = lúc backend nhận - lúc thiết bị giả gửi (trường t_pub trong gói)
+  - Có broker (host:port) → gói đi qua MQTT thật: paho + dispatcher / aiomqtt
+    Không có → gói được đưa thẳng vào on_message / process_message (bỏ qua socket MQTT)
+Chạy: python bench/bench_async.py [số_gói] [độ_trễ_ms] [broker_host:port]
+"""
+import asyncio
+import json
+import os
+import resource
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import paho.mqtt.client as mqtt  # noqa: E402
+
+import gateway  # noqa: E402
+import gateway_async  # noqa: E402
+from checksum import calculate_checksum  # noqa: E402
+from device_profiles import DeviceRegistry  # noqa: E402
+from dispatcher import ShardedDispatcher  # noqa: E402
+from gateway_async import AsyncUploader  # noqa: E402
+from mock_backend import backend_stats, start_backend  # noqa: E402
+from seqtrack import SequenceTracker  # noqa: E402
+from uploader import BackendUploader  # noqa: E402
+
+NUM_DEVICES = 300
+PROFILES = ("esp32_multi1_", "esp32_multi2_", "esp32_multi3_")
+TOPIC = "iot/sensor/bench"
+
+
+# ==================== THIẾT BỊ GIẢ ====================
+def make_message(i):
+    """Gói như ESP32 gửi, dưới ngưỡng cảnh báo; seq tăng dần theo từng thiết bị."""
+    dev = f"{PROFILES[i % 3]}{i % NUM_DEVICES:04d}"
+    data = {"dev_id": dev, "timestamp": 1000 + i, "dev_ip": "192.168.4.3", "seq_num": i // NUM_DEVICES,
+            "rssi": -60, "temperature": 25.5, "humidity": 60.0, "rain_status": 0,
+            "gas_level": 300, "light_level": 500, "t_pub": time.time()}
+    data["checksum"] = calculate_checksum(data)
+    return json.dumps(data, separators=(',', ':')).encode("utf-8")
+
+
+class _Msg:
+    __slots__ = ("payload", "topic")
+
+    def __init__(self, payload, topic):
+        self.payload = payload
+        self.topic = topic
+
+
+def publish_all(n, broker, feed):
+    """Gửi n gói: qua broker (paho) nếu có, ngược lại gọi feed(payload) trực tiếp."""
+    if broker is None:
+        for i in range(n):
+            feed(make_message(i))
+        return
+    pub = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
+    pub.connect(*broker)
+    pub.loop_start()
+    for i in range(n):
+        pub.publish(TOPIC, make_message(i)).wait_for_publish()
+    pub.loop_stop()
+    pub.disconnect()
+
+
+class _AlertSink:
+    def raise_alert(self, *args, **kwargs):
+        return True
+
+
+def setup_gateway():
+    gateway.GATEWAY_UID = "GATEWAY-BENCH"
+    gateway.registry = DeviceRegistry(gateway.DEVICE_PROFILES_FILE, reload_interval=0)
+    gateway.alerts = _AlertSink()
+    gateway.seq_tracker = SequenceTracker(gateway.SEQ_WINDOW, gateway.SEQ_MAX_DEVICES)
+
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def report(name, base, uploader, elapsed, n, threads, cpu):
+    s = uploader.stats.snapshot()
+    b = backend_stats(base)
+    print(f"{name:<24} {n / elapsed:8.0f} msg/s | đầu-cuối p50 {b['p50_ms']:7.1f}ms p99 {b['p99_ms']:7.1f}ms | "
+          f"ok {s['sent']} fail {s['failed']} drop {s['dropped']} | thread {threads:3d} | cpu gateway {cpu:.2f}s")
+
+
+def _wait_done(uploader, n, timeout=120):
+    deadline = time.time() + timeout
+    while uploader.stats.sent + uploader.stats.failed + uploader.stats.dropped < n and time.time() < deadline:
+        time.sleep(0.005)
+
+
+# ==================== CHẾ ĐỘ THREAD ====================
+def bench_threaded(base, n, concurrency, broker):
+    setup_gateway()
+    up = BackendUploader(f"{base}/data", queue_size=n, concurrency=concurrency, stats_interval=0,
+                         name="THREAD", label_fn=gateway._payload_dev_id)
+    up.start()
+    gateway.outbox = up
+    gateway.dispatcher = ShardedDispatcher(gateway.process_message, num_workers=gateway.DISPATCH_WORKERS,
+                                           queue_size=n)
+    gateway.dispatcher.start()
+
+    client = None
+    if broker is not None:
+        client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
+        client.on_message = gateway.on_message
+        client.connect(*broker)
+        client.subscribe(TOPIC)
+        client.loop_start()
+        time.sleep(0.5)
+
+    threads = threading.active_count()
+    c0, t0 = cpu_seconds(), time.perf_counter()
+    publish_all(n, broker, lambda payload: gateway.on_message(None, None, _Msg(payload, TOPIC)))
+    _wait_done(up, n)
+    elapsed, cpu = time.perf_counter() - t0, cpu_seconds() - c0
+    if client is not None:
+        client.loop_stop()
+        client.disconnect()
+    gateway.dispatcher.stop()
+    up.stop(timeout=5)
+    report(f"thread upload x{concurrency}", base, up, elapsed, n, threads, cpu)
+
+
+# ==================== CHẾ ĐỘ ASYNCIO ====================
+async def bench_async(base, n, max_in_flight, broker):
+    setup_gateway()
+    up = AsyncUploader(f"{base}/data", queue_size=n, max_in_flight=max_in_flight, stats_interval=0,
+                       name="ASYNC", label_fn=gateway._payload_dev_id)
+    await up.start()
+    gateway.outbox = up
+    loop = asyncio.get_running_loop()
+
+    mqtt_task = None
+    if broker is not None:
+        gateway.MQTT_BROKER, gateway.MQTT_PORT = broker
+        gateway.MQTT_SUBSCRIPTION = TOPIC
+        mqtt_task = asyncio.create_task(gateway_async._mqtt_loop([0]))
+        await asyncio.sleep(0.5)
+
+    threads = threading.active_count()
+    c0, t0 = cpu_seconds(), time.perf_counter()
+    if broker is not None:
+        await asyncio.to_thread(publish_all, n, broker, None)
+    else:
+        # Thiết bị giả chạy trên thread riêng, chuyển gói vào loop như aiomqtt
+        def feed(payload):
+            loop.call_soon_threadsafe(gateway.process_message, payload, TOPIC)
+        await asyncio.to_thread(publish_all, n, None, feed)
+    await asyncio.to_thread(_wait_done, up, n)
+    elapsed, cpu = time.perf_counter() - t0, cpu_seconds() - c0
+    if mqtt_task is not None:
+        mqtt_task.cancel()
+        await asyncio.gather(mqtt_task, return_exceptions=True)
+    await up.stop()
+    report(f"asyncio in-flight {max_in_flight}", base, up, elapsed, n, threads, cpu)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 50) / 1000
+    broker = None
+    if len(sys.argv) > 3:
+        host, _, port = sys.argv[3].partition(":")
+        broker = (host, int(port or 1883))
+    base = start_backend(latency)
+    print(f"{n} gói từ {NUM_DEVICES} thiết bị, backend trễ {latency * 1000:.0f}ms/request, "
+          f"{'MQTT ' + sys.argv[3] if broker else 'không qua broker'}")
+    for concurrency in (2, 16, 64):
+        bench_threaded(base, n, concurrency, broker)
+    for max_in_flight in (64, 1000):
+        asyncio.run(bench_async(base, n, max_in_flight, broker))
+
+
+if __name__ == "__main__":
+    main()
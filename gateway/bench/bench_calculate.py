@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Đo Module 2 (script3/calculate.py): bản gốc groupby.apply so với bản vector hóa và bảng luồng tăng dần
+  - raw_flow.csv (dữ liệu bắt thật): chạy cả ba, kiểm tra CSV feature của bản vector hóa trùng từng byte bản gốc
+  - Bắt gói tổng hợp (mặc định 10 triệu gói): TCP / UDP / ICMP / ARP, kích thước luồng lệch (Zipf), cờ TCP ngẫu nhiên;
+    bản gốc chỉ chạy trên một mẫu nhỏ rồi ngoại suy theo số gói + số luồng
+Chạy: python bench/bench_calculate.py [số_gói_tổng_hợp] [số_luồng] [số_gói_mẫu_cho_bản_gốc]
+"""
+import math
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+SCRIPT3 = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "script3")
+sys.path.insert(0, SCRIPT3)
+import calculate  # noqa: E402
+from dump import RAW_FILE_COLUMNS  # noqa: E402
+
+FLAGS = np.array(["S", "SA", "A", "PA", "FA", "RA", "R", "FPA", "FSRPAU", ""], dtype=object)
+
+
+def synthetic_capture(n, flows, seed=0):
+    """n gói thuộc ~flows luồng trong 60 giây, sắp theo thời gian như file bắt thật."""
+    rng = np.random.default_rng(seed)
+    hosts = np.array([f"192.168.{i // 250}.{i % 250 + 1}" for i in range(2000)], dtype=object)
+    servers = np.array([f"10.{i // 250}.{i % 250}.{i % 7 + 1}" for i in range(500)], dtype=object)
+    flow = np.minimum(rng.zipf(1.3, n), flows) - 1
+    flow = (flow * 2654435761) % flows  # trộn để luồng lớn không dồn về id nhỏ
+    proto = np.array([6, 6, 6, 17, 17, 1, 2054], dtype=np.int64)[flow % 7]
+    client, server = hosts[flow % len(hosts)], servers[(flow // 7) % len(servers)]
+    reply = rng.random(n) < 0.4
+    src = np.where(reply, server, client)
+    dst = np.where(reply, client, server)
+    cport = 1024 + flow % 60000
+    sport_srv = np.array([80, 443, 1883, 53], dtype=np.int64)[flow % 4]
+    sport = np.where(reply, sport_srv, cport)
+    dport = np.where(reply, cport, sport_srv)
+    is_arp, is_tcp = proto == 2054, proto == 6
+    ports_off = is_arp | (proto == 1)
+    ts = 1765587960.0 + np.sort(rng.random(n)) * 60
+    return pd.DataFrame({
+        'Timestamp': ts,
+        'Source_IP': np.where(is_arp, '0.0.0.0', src), 'Source_Port': np.where(ports_off, 0, sport),
+        'Destination_IP': np.where(is_arp, '0.0.0.0', dst), 'Destination_Port': np.where(ports_off, 0, dport),
+        'Protocol': proto, 'Packet_Length': np.where(is_arp, 42, rng.integers(54, 1515, n)),
+        'Flags': np.where(is_tcp, FLAGS[rng.integers(0, len(FLAGS), n)], ''),
+        'IP_Header_Len': np.where(is_arp, 0, 20), 'TCP_Header_Len': np.where(is_tcp, 20, 0),
+        'ARP_Opcode': np.where(is_arp, rng.integers(1, 3, n), 0),
+        'Eth_Dst': np.where(rng.random(n) < 0.05, 'ff:ff:ff:ff:ff:ff', '11:22:33:44:55:66'),
+        'ARP_Src_MAC': '', 'ARP_Src_IP': '',
+    }, columns=RAW_FILE_COLUMNS)
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - t0
+
+
+def flow_table(df):
+    table = calculate.FlowTable(idle_timeout=math.inf, active_timeout=math.inf, max_flows=10 ** 9)
+    table.add_rows(df[RAW_FILE_COLUMNS].itertuples(index=False, name=None))
+    table.flush()
+    return table.drain()
+
+
+def report(name, n, flows, seconds):
+    print(f"  {name:<22} {seconds:9.3f} s  {n / seconds:>13,.0f} gói/s  ({flows} luồng)")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+    flows = int(sys.argv[2]) if len(sys.argv) > 2 else 200_000
+    sample = int(sys.argv[3]) if len(sys.argv) > 3 else 20_000
+
+    df = pd.read_csv(os.path.join(SCRIPT3, "raw_flow.csv"))
+    print(f"raw_flow.csv: {len(df)} gói")
+    old, t_old = timed(lambda: calculate.calculate_features_groupby(df.copy()))
+    new, t_new = timed(lambda: calculate.calculate_features(df.copy()))
+    table, t_table = timed(lambda: flow_table(df))
+    report("groupby.apply (gốc)", len(df), len(old), t_old)
+    report("vector hóa", len(df), len(new), t_new)
+    report("FlowTable (từng gói)", len(df), len(table), t_table)
+    print(f"  CSV feature trùng từng byte: {old.to_csv(index=False) == new.to_csv(index=False)} | "
+          f"nhanh hơn {t_old / t_new:,.0f} lần")
+
+    print(f"\nTổng hợp: {n:,} gói, tối đa {flows:,} luồng")
+    big, t_gen = timed(lambda: synthetic_capture(n, flows))
+    print(f"  (sinh dữ liệu {t_gen:.1f} s)")
+    small = big.iloc[:sample].copy()
+    _, t_key = timed(lambda: small.apply(calculate.get_flow_key, axis=1))
+    old, t_old = timed(lambda: calculate.calculate_features_groupby(small.copy()))
+    new_small = calculate.calculate_features(small.copy())
+    report(f"groupby.apply {sample:,} gói", sample, len(old), t_old)
+    print(f"  CSV feature trùng từng byte (mẫu): {old.to_csv(index=False) == new_small.to_csv(index=False)}")
+    new, t_new = timed(lambda: calculate.calculate_features(big))
+    report("vector hóa", n, len(new), t_new)
+    # Bản gốc = apply(get_flow_key) theo từng gói + calculate_features_from_group theo từng luồng
+    per_pkt, per_flow = t_key / sample, (t_old - t_key) / len(old)
+    print(f"  Bản gốc ngoại suy: ~{(per_pkt * n + per_flow * len(new)) / 60:,.0f} phút "
+          f"({1e6 * per_pkt:.0f} µs/gói + {1000 * per_flow:.1f} ms/luồng)")
+
+
+if __name__ == "__main__":
+    main()
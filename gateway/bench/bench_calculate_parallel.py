@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Đo khả năng mở rộng của calculate.ParallelExtractor theo số core (1..N tiến trình)
+  - Cùng dữ liệu tổng hợp với bench_calculate (TCP / UDP / ICMP / ARP, luồng Zipf); ARP dồn về một shard
+  - Mỗi cấu hình: Pool được tạo trước và chạy nháp một lần (không tính thời gian khởi động tiến trình),
+    lấy trung vị 3 lần; in độ lệch tải giữa các shard và kiểm tra kết quả trùng bản tuần tự
+  - Máy ít core hơn N: các tiến trình chia nhau core → chỉ đo được chi phí chia shard + shared memory
+Chạy: python bench/bench_calculate_parallel.py [số_gói] [số_luồng] [N]
+"""
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+from bench_calculate import SCRIPT3, synthetic_capture
+
+sys.path.insert(0, SCRIPT3)
+import calculate  # noqa: E402
+
+
+def timed(fn, repeat=3):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - t0)
+    return out, statistics.median(times)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    flows = int(sys.argv[2]) if len(sys.argv) > 2 else 200_000
+    max_workers = int(sys.argv[3]) if len(sys.argv) > 3 else max(os.cpu_count() or 1, 2)
+    df = synthetic_capture(n, flows)
+    print(f"{n:,} gói, tối đa {flows:,} luồng, {os.cpu_count()} core, 1..{max_workers} tiến trình")
+
+    serial, t_serial = timed(lambda: calculate.calculate_features(df))
+    expected = serial.to_csv(index=False)
+    print(f"  tuần tự (calculate_features) {t_serial:7.2f} s  {n / t_serial:>11,.0f} gói/s  ({len(serial)} luồng)")
+
+    c, _ = calculate._encode(df)
+    for workers in range(1, max_workers + 1):
+        shard_sizes = np.bincount(calculate._shard_of(c, workers), minlength=workers)
+        extractor = calculate.ParallelExtractor(workers)
+        try:
+            extractor(df.head(1000))  # tiến trình con import xong, tracker chạy
+            out, t = timed(lambda: extractor(df))
+        finally:
+            extractor.close()
+        same = out.to_csv(index=False) == expected
+        print(f"  {workers} tiến trình                 {t:7.2f} s  {n / t:>11,.0f} gói/s  "
+              f"tăng tốc {t_serial / t:4.2f}x | shard lớn nhất {shard_sizes.max() / n:5.1%} | trùng tuần tự: {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark checksum: đường cũ (decode → copy dict → json.dumps → MD5) so với checksum.py
+Chạy: python bench/bench_checksum.py [số_gói]
+"""
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from checksum import ALGORITHMS, ChecksumVerifier, canonical_bytes  # noqa: E402
+
+TARGET_RATE = 10000  # msg/s
+
+
+def old_calculate_checksum(data_dict):
+    clean_data = {k: v for k, v in data_dict.items() if k != "checksum"}
+    json_str = json.dumps(clean_data, separators=(',', ':'), ensure_ascii=False)
+    md5_hash = hashlib.md5(json_str.encode('utf-8')).hexdigest()
+    return int(md5_hash[:2], 16)
+
+
+def make_messages(n, algorithm="md5_8"):
+    """Gói giống data.json, serialize gọn như ESP32, checksum đặt cuối."""
+    rnd = random.Random(42)
+    fn = ALGORITHMS[algorithm]
+    out = []
+    for i in range(n):
+        dev = rnd.choice(["esp32_multi1", "esp32_multi2", "esp32_multi3"])
+        data = {"dev_id": dev, "timestamp": i, "dev_ip": "192.168.4.3", "seq_num": i,
+                "packet_interval": 3, "dev_status": "normal"}
+        if dev != "esp32_multi2":
+            data["temperature"] = round(rnd.uniform(20, 40), 1)
+            data["humidity"] = round(rnd.uniform(30, 95), 1)
+        if dev == "esp32_multi1":
+            data["rain_status"] = rnd.randint(0, 1)
+        else:
+            data["gas_level"] = rnd.randint(100, 3000)
+        if dev == "esp32_multi2":
+            data["light_level"] = rnd.randint(0, 100)
+        data.update({"rssi": rnd.randint(-80, -30), "ssid": "ESP32_AP"})
+        data["checksum"] = fn(canonical_bytes(data))
+        out.append(json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode("utf-8"))
+    return out
+
+
+def bench(label, fn, messages):
+    t0 = time.perf_counter()
+    for raw in messages:
+        fn(raw)
+    elapsed = time.perf_counter() - t0
+    per_msg = elapsed / len(messages)
+    print(f"{label:<38} {per_msg * 1e6:7.2f} µs/msg | {1 / per_msg:10.0f} msg/s | "
+          f"CPU @ {TARGET_RATE} msg/s: {per_msg * TARGET_RATE * 100:5.1f}%")
+    return per_msg
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    messages = make_messages(n)
+    print(f"{n} gói, mục tiêu {TARGET_RATE} msg/s\n")
+
+    def old_path(raw):
+        data = json.loads(raw.decode("utf-8"))
+        assert data["checksum"] == old_calculate_checksum(data)
+
+    verifier = ChecksumVerifier()
+
+    def new_path(raw):
+        data = json.loads(raw)
+        assert verifier.verify(data, raw, data["dev_id"])[0]
+
+    slow_verifier = ChecksumVerifier()
+
+    def new_path_no_raw(raw):
+        data = json.loads(raw)
+        assert slow_verifier.verify(data)[0]
+
+    base = bench("cũ: decode + dict copy + dumps + md5", old_path, messages)
+    fast = bench("mới: decode + md5 trên bytes gốc", new_path, messages)
+    bench("mới: không có bytes gốc (dumps)", new_path_no_raw, messages)
+    for alg in ("crc32", "blake2s_32"):
+        msgs = make_messages(n, alg)
+        v = ChecksumVerifier()
+        bench(f"mới: {alg} trên bytes gốc", lambda raw: v.verify(json.loads(raw), raw, None, alg), msgs)
+    print(f"\nTăng tốc đường kiểm tra md5_8: x{base / fast:.2f} | verifier: {verifier.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+So sánh kích thước body và CPU mã hóa cho payload gửi backend (dạng data.json)
+  - rawData: full / dedup / none
+  - Định dạng: json / msgpack / cbor (nếu đã cài) × nén: identity / gzip / deflate
+  - Một payload mỗi request và lô UPLOAD_BATCH_SIZE payload (API_SENSOR_DATA_BATCH)
+Chạy: python bench/bench_encoding.py [số_payload] [kích_thước_lô]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import gateway  # noqa: E402
+from bench_async import NUM_DEVICES, PROFILES  # noqa: E402
+from checksum import calculate_checksum  # noqa: E402
+from device_profiles import DeviceRegistry  # noqa: E402
+from encoding import COMPRESSIONS, FORMATS, RAW_MODES, BodyEncoder  # noqa: E402
+
+
+class _Capture:
+    def __init__(self):
+        self.payloads = []
+
+    def submit(self, payload):
+        self.payloads.append(payload)
+
+
+def esp32_packet(i, rng):
+    """Gói giống data.json: đủ trường của firmware, số đo dao động như cảm biến thật."""
+    dev = f"{PROFILES[i % 3]}{i % NUM_DEVICES:04d}"
+    data = {"dev_id": dev, "timestamp": 60 + 3 * (i // NUM_DEVICES), "dev_ip": f"192.168.4.{2 + i % 200}",
+            "seq_num": i // NUM_DEVICES, "packet_interval": 3, "dev_status": "normal"}
+    if i % 3 != 1:
+        data["temperature"] = round(rng.uniform(24, 32), 1)
+        data["humidity"] = round(rng.uniform(40, 70), 1)
+    if i % 3 == 0:
+        data["rain_status"] = rng.randint(0, 1)
+    if i % 3 != 0:
+        data["gas_level"] = rng.randint(300, 900)
+    if i % 3 == 1:
+        data["light_level"] = rng.randint(20, 800)
+    data["rssi"] = rng.randint(-75, -35)
+    data["ssid"] = "ESP32_AP"
+    data["checksum"] = calculate_checksum(data)
+    return data
+
+
+def build_payloads(n, raw_mode):
+    """Payload thật do gateway tạo (profile, checksum, rawData) từ các gói ESP32 giả."""
+    gateway.GATEWAY_UID = "GATEWAY-001"
+    gateway.registry = DeviceRegistry(gateway.DEVICE_PROFILES_FILE, reload_interval=0)
+    gateway.alerts = type("Sink", (), {"raise_alert": lambda *a, **k: True})()
+    gateway.aggregator = None
+    gateway.RAW_DATA_MODE = raw_mode
+    gateway.outbox = _Capture()
+    rng = random.Random(1)
+    for i in range(n):
+        data = esp32_packet(i, rng)
+        gateway.send_to_backend(data, data["dev_id"])
+    return gateway.outbox.payloads
+
+
+def measure(encoder, bodies):
+    t0 = time.perf_counter()
+    size = 0
+    for body in bodies:
+        size += len(encoder.encode(body)[0])
+    return size / len(bodies), 1e6 * (time.perf_counter() - t0) / len(bodies)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    batch = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    print(f"{n} payload từ {min(n, NUM_DEVICES)} thiết bị (multi1/2/3), lô {batch} | định dạng: {', '.join(FORMATS)}")
+    print(f"{'rawData':<7} {'body':<17} {'byte/gói':>9} {'µs/gói':>8} | {'byte/gói (lô)':>13} {'µs/gói (lô)':>11}")
+    baseline = None
+    for raw_mode in RAW_MODES:
+        payloads = build_payloads(n, raw_mode)
+        batches = [payloads[i:i + batch] for i in range(0, len(payloads), batch)]
+        for fmt in FORMATS:
+            for compression in COMPRESSIONS:
+                encoder = BodyEncoder(fmt, compression)
+                single, single_us = measure(encoder, payloads)
+                per_batch, batch_us = measure(encoder, batches)
+                per_batch /= batch
+                batch_us /= batch
+                baseline = baseline or single
+                print(f"{raw_mode:<7} {fmt + '+' + compression:<17} {single:9.0f} {single_us:8.1f} | "
+                      f"{per_batch:13.0f} {batch_us:11.1f}   ({100 * per_batch / baseline:5.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark chi phí ghi nhận metric (mục tiêu: dưới 1 µs mỗi lần)
+Chạy: python bench/bench_metrics.py [số_lần]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from metrics import Counter, Histogram, render_all  # noqa: E402
+
+
+def bench(label, fn, n):
+    t0 = time.perf_counter()
+    fn(n)
+    per_op = (time.perf_counter() - t0) / n
+    print(f"{label:<44} {per_op * 1e9:7.0f} ns/lần")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    counter = Counter("bench_total", "bench", ["dev_id"], register=False)
+    plain = Counter("bench_plain_total", "bench", register=False)
+    hist = Histogram("bench_seconds", "bench", ["stage"], register=False)
+    child = counter.labels("esp32_multi1")
+    stage = hist.labels("decode")
+
+    def loop_empty(k):
+        for _ in range(k):
+            pass
+
+    def loop_plain(k):
+        for _ in range(k):
+            plain.inc()
+
+    def loop_child(k):
+        for _ in range(k):
+            child.inc()
+
+    def loop_labels(k):
+        for _ in range(k):
+            counter.labels("esp32_multi1").inc()
+
+    def loop_observe(k):
+        for _ in range(k):
+            stage.observe(0.0003)
+
+    def loop_timed(k):
+        pc = time.perf_counter
+        for _ in range(k):
+            t0 = pc()
+            stage.observe(pc() - t0)
+
+    bench("vòng lặp rỗng (tham chiếu)", loop_empty, n)
+    bench("Counter.inc() không nhãn", loop_plain, n)
+    bench("child.inc() (nhãn đã cache)", loop_child, n)
+    bench("counter.labels(dev_id).inc()", loop_labels, n)
+    bench("histogram child.observe()", loop_observe, n)
+    bench("2 x perf_counter + observe()", loop_timed, n)
+
+    t0 = time.perf_counter()
+    render_all()
+    print(f"\nrender_all(): {(time.perf_counter() - t0) * 1e3:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
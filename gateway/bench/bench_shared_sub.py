@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Đo msg/s khi chia tải bằng MQTT 5 shared subscription (supervisor.py, 1..N worker)
+  - Cần broker hỗ trợ MQTT 5 ($share/...): mosquitto trong docker-compose.yml (docker compose up -d mosquitto)
+  - Chưa có số đo nào được ghi nhận cho repo này - chưa khẳng định mức tăng theo số worker; broker, backend giả,
+    process phát và các worker chạy chung máy nên chỉ có ý nghĩa khi số core >= số worker + 2
+  - Backend giả (mock_backend) chạy ở process riêng, trả 201 ngay → điểm nghẽn là xử lý trong gateway
+  - Mỗi lượt: khởi động supervisor với N worker, nhiều process phát gói cùng lúc,
+    đo thời gian tới khi backend nhận đủ → msg/s và hệ số tăng so với 1 worker
+Chạy: python bench/bench_shared_sub.py [broker_host:port] [số_gói] [danh_sách_worker, vd 1,2,4]
+"""
+import json
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import paho.mqtt.client as mqtt  # noqa: E402
+
+from bench_async import make_message  # noqa: E402
+from mock_backend import start_backend  # noqa: E402
+
+HERE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+PUBLISHERS = 4
+STARTUP_WAIT = 4.0
+
+
+def received(base):
+    with urllib.request.urlopen(f"{base}/count", timeout=5) as r:
+        return json.load(r)["received"]
+
+
+def _publish(broker, start, count):
+    pub = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
+    pub.max_queued_messages_set(0)
+    pub.connect(*broker)
+    pub.loop_start()
+    info = None
+    for i in range(start, start + count):
+        info = pub.publish(f"iot/sensor/bench/{i % 16}", make_message(i), qos=1)
+    if info is not None:
+        info.wait_for_publish()
+    pub.loop_stop()
+    pub.disconnect()
+
+
+def run(broker, base, n, workers):
+    env = dict(os.environ, SUPERVISOR_WORKERS=str(workers), MQTT_BROKER=broker[0], MQTT_PORT=str(broker[1]),
+               BACKEND_URL=base, METRICS_PORT="0", LOG_LEVEL="WARNING", SEQ_WINDOW="0",
+               UPLOAD_CONCURRENCY=os.getenv("UPLOAD_CONCURRENCY", "16"),
+               UPLOAD_QUEUE_SIZE=str(n), DISPATCH_QUEUE_SIZE=str(n), MQTT_SHARE_GROUP="bench")
+    sup = subprocess.Popen([sys.executable, os.path.join(HERE, "supervisor.py")], env=env,
+                           stdout=subprocess.DEVNULL)
+    try:
+        time.sleep(STARTUP_WAIT)
+        before = received(base)
+        per = n // PUBLISHERS
+        t0 = time.perf_counter()
+        procs = [multiprocessing.Process(target=_publish, args=(broker, k * per, per)) for k in range(PUBLISHERS)]
+        for p in procs:
+            p.start()
+        total = per * PUBLISHERS
+        last, last_change = before, time.perf_counter()
+        while True:
+            time.sleep(0.05)
+            got = received(base) - before
+            now = time.perf_counter()
+            if got != last:
+                last, last_change = got, now
+            if got >= total or now - last_change > 10:
+                break
+        elapsed = last_change - t0
+        for p in procs:
+            p.join()
+        return last, total, elapsed
+    finally:
+        sup.send_signal(signal.SIGINT)
+        sup.wait(60)
+
+
+def main():
+    host, _, port = (sys.argv[1] if len(sys.argv) > 1 else "127.0.0.1:1883").partition(":")
+    broker = (host, int(port or 1883))
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 40000
+    counts = [int(x) for x in (sys.argv[3] if len(sys.argv) > 3 else "1,2,4").split(",")]
+    base = start_backend(0.0)
+    print(f"{n} gói, broker {host}:{broker[1]}, {PUBLISHERS} process phát, CPU: {os.cpu_count()}")
+    baseline = None
+    for workers in counts:
+        got, total, elapsed = run(broker, base, n, workers)
+        rate = got / elapsed if elapsed > 0 else 0.0
+        baseline = baseline or rate
+        print(f"{workers:2d} worker: {rate:8.0f} msg/s | nhận {got}/{total} | x{rate / baseline:.2f} "
+              f"(lý tưởng x{workers / counts[0]:.0f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Đo TimeSeriesStore: chi phí ghi mỗi gói và độ trễ truy vấn latest / range / downsample
+  - Đội thiết bị như bench_async (esp32_multi1/2/3), mỗi gói qua profile.extract như send_to_backend
+  - Vòng đệm đầy (ghi đè) trước khi đo truy vấn; range 10 phút, downsample 1 giờ theo ngăn 60s
+  - In bộ nhớ mảng và số cảm biến bị thu hồi / không được lưu khi vượt TIMESERIES_MAX_BYTES
+Chạy: python bench/bench_timeseries.py [số_gói] [mẫu_mỗi_cảm_biến] [max_bytes]
+"""
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import gateway  # noqa: E402
+from bench_async import NUM_DEVICES, PROFILES  # noqa: E402
+from device_profiles import DeviceRegistry  # noqa: E402
+from timeseries import TimeSeriesStore  # noqa: E402
+
+STEP = 3.0  # chu kỳ gửi của ESP32 (giây)
+
+
+def packets(n, rng):
+    for i in range(n):
+        dev = f"{PROFILES[i % 3]}{i % NUM_DEVICES:04d}"
+        data = {"dev_id": dev, "temperature": round(rng.uniform(24, 32), 1), "humidity": round(rng.uniform(40, 70), 1),
+                "rain_status": rng.randint(0, 1), "gas_level": rng.randint(300, 900), "light_level": rng.randint(0, 1000)}
+        yield dev, data, (i // NUM_DEVICES) * STEP
+
+
+def now_of(batch):
+    return batch[-1][2] + STEP
+
+
+def timed(fn, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return 1e6 * (time.perf_counter() - t0) / repeat
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    points = int(sys.argv[2]) if len(sys.argv) > 2 else 1200
+    max_bytes = int(sys.argv[3]) if len(sys.argv) > 3 else 32 * 1024 * 1024
+    registry = DeviceRegistry(gateway.DEVICE_PROFILES_FILE, reload_interval=0)
+    rng = random.Random(0)
+    batch = [(dev, registry.lookup(dev).extract(data, dev), t) for dev, data, t in packets(n, rng)]
+
+    store = TimeSeriesStore(points, max_bytes)
+    t0 = time.perf_counter()
+    for dev, sensors, t in batch:
+        store.record(dev, sensors, t)
+    elapsed = time.perf_counter() - t0
+
+    # Ghi thêm một vòng khi vòng đệm đã đầy: bộ nhớ không được tăng theo số mẫu
+    tracemalloc.start()
+    for dev, sensors, t in batch[:len(batch) // 4]:
+        store.record(dev, sensors, t + now_of(batch))
+    grown, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    s = store.stats()
+    newest = max(store.sensors(), key=lambda x: x["last"])
+    uid, now = newest["sensorUid"], newest["last"] + STEP
+    print(f"{n} gói, {NUM_DEVICES} thiết bị, {points} mẫu/cảm biến, giới hạn {max_bytes / 2**20:.0f} MiB")
+    print(f"Ghi: {1e6 * elapsed / n:.2f} µs/gói ({n / elapsed:,.0f} gói/s) | "
+          f"mảng {s['bytes'] / 2**20:.1f} MiB (ghi đè thêm {len(batch) // 4} gói: +{grown / 1024:.0f} KiB) | "
+          f"{s['sensors']} cảm biến, {s['points']} mẫu, thu hồi {s['evicted']}, không lưu {s['rejected']}")
+    print(f"latest:                  {timed(lambda: store.latest(uid), 10000):8.2f} µs")
+    print(f"range 10 phút:           {timed(lambda: store.range(uid, now - 600), 2000):8.2f} µs "
+          f"({len(store.range(uid, now - 600))} mẫu)")
+    print(f"downsample 1 giờ / 60s:  {timed(lambda: store.downsample(uid, now - 3600, now + 1, 60), 500):8.2f} µs "
+          f"({len(store.downsample(uid, now - 3600, now + 1, 60))} ngăn)")
+    print(f"query HTTP/MQTT latest:  {timed(lambda: store.query('latest', {'sensor': uid}), 10000):8.2f} µs")
+
+
+if __name__ == "__main__":
+    main()
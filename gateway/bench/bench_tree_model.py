@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+So sánh script3/tree_model.TreeEnsemble (mảng NumPy) với XGBClassifier trong xgboost_model.joblib
+  - Trùng kết quả: margin trùng từng bit với booster.predict(output_margin=True) và nhãn trùng model.predict,
+    trên feature thật (raw_flow.csv) và dữ liệu khó: giá trị đúng bằng ngưỡng split / sát hai bên ngưỡng,
+    NaN (nhánh mặc định); không có ±inf vì XGBoost từ chối inf khi missing=nan
+  - Khởi động nguội (tiến trình mới: import + nạp model + predict một dòng) và RSS đỉnh
+  - Tốc độ predict theo kích thước lô (1 dòng, một cửa sổ ~200 luồng, cả raw_flow.csv, lô lớn)
+Chạy: python bench/bench_tree_model.py [số_dòng_kiểm_tra]
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+warnings.filterwarnings("ignore")
+
+SCRIPT3 = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "script3")
+sys.path.insert(0, SCRIPT3)
+import calculate  # noqa: E402
+import tree_model  # noqa: E402
+
+MODEL_FILE = os.path.join(SCRIPT3, tree_model.MODEL_FILE)
+NPZ_FILE = os.path.join(SCRIPT3, tree_model.MODEL_NPZ_FILE)
+
+COLD_START = {
+    "xgboost (joblib)": "import numpy as np, joblib; m = joblib.load({model!r}); m.predict(np.zeros((1, 23)))",
+    "tree_model (npz)": "import numpy as np, tree_model; m = tree_model.TreeEnsemble.load({npz!r}); "
+                        "m.predict(np.zeros((1, 23)))",
+}
+
+
+def real_features():
+    df = calculate.calculate_features(pd.read_csv(os.path.join(SCRIPT3, "raw_flow.csv")))
+    return df[calculate.MODEL_FEATURE_COLUMNS[:23]].to_numpy(dtype=np.float64)
+
+
+def hard_features(ensemble, real, n, seed=0):
+    """Mỗi ô lấy ngẫu nhiên: giá trị thật, đúng ngưỡng split của feature đó, sát trên / dưới ngưỡng, NaN."""
+    rng = np.random.default_rng(seed)
+    internal = ensemble.left != np.arange(len(ensemble.left))
+    X = real[rng.integers(0, len(real), n)].astype(np.float32)
+    for f in range(X.shape[1]):
+        cuts = ensemble.threshold[internal & (ensemble.feature == f)]
+        if not len(cuts):
+            continue
+        pick = rng.integers(0, 6, n)
+        cut = cuts[rng.integers(0, len(cuts), n)]
+        X[pick == 1, f] = cut[pick == 1]
+        X[pick == 2, f] = np.nextafter(cut, np.float32(np.inf))[pick == 2]
+        X[pick == 3, f] = np.nextafter(cut, np.float32(-np.inf))[pick == 3]
+        X[pick == 4, f] = np.nan
+    return X
+
+
+def cold_start(name, code):
+    # VmHWM thay cho ru_maxrss: ru_maxrss giữ giá trị của tiến trình cha qua fork + exec
+    script = (f"import time; t0 = time.perf_counter(); {code}; t = time.perf_counter() - t0; "
+              "print(t, [l.split()[1] for l in open('/proc/self/status') if l.startswith('VmHWM')][0])")
+    times, rss = [], 0
+    for _ in range(3):
+        out = subprocess.run([sys.executable, "-W", "ignore", "-c", script.format(model=MODEL_FILE, npz=NPZ_FILE)],
+                             cwd=SCRIPT3, capture_output=True, text=True, check=True).stdout.split()
+        times.append(float(out[0]))
+        rss = int(out[1])
+    print(f"  {name:<18} {statistics.median(times):6.2f} s   RSS đỉnh {rss / 1024:6.0f} MiB")
+
+
+def timed(fn, repeat=3):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    import joblib
+    import xgboost
+
+    model = joblib.load(MODEL_FILE)
+    booster = model.get_booster()
+    ensemble = tree_model.TreeEnsemble.load(NPZ_FILE)
+    real = real_features()
+
+    print("Trùng kết quả với XGBoost:")
+    for name, X in (("raw_flow.csv", real), (f"dữ liệu khó {n:,} dòng", hard_features(ensemble, real, n))):
+        expected = booster.predict(xgboost.DMatrix(X, feature_names=booster.feature_names), output_margin=True)
+        margin = ensemble.predict_margin(X)
+        same_labels = np.array_equal(ensemble.predict(X), model.predict(X))
+        print(f"  {name:<24} {len(X):>8,} dòng | margin trùng từng bit: {np.array_equal(margin, expected)} | "
+              f"nhãn trùng: {same_labels}")
+
+    print("\nKhởi động nguội (tiến trình mới, import + nạp + predict 1 dòng):")
+    for name, code in COLD_START.items():
+        cold_start(name, code)
+
+    print("\nPredict theo lô:")
+    X_big = hard_features(ensemble, real, n, seed=1)
+    for rows in (1, 200, len(real), n):
+        X = X_big[:rows]
+        t_xgb = timed(lambda: model.predict(X))
+        t_np = timed(lambda: ensemble.predict(X))
+        print(f"  {rows:>8,} dòng  xgboost {1000 * t_xgb:9.2f} ms   tree_model {1000 * t_np:9.2f} ms  "
+              f"({t_xgb / t_np:5.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
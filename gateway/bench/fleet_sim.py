@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Giả lập đội ESP32 (esp32_multi1/2/3) + đo tải gateway đầu-cuối
+  - Mỗi thiết bị: seq_num tăng dần (thỉnh thoảng mất gói), timestamp = uptime, RSSI dao động,
+    số đo đi ngẫu nhiên quanh giá trị thật, checksum đúng theo profile; SIM_BAD_CHECKSUM gói bị sai checksum
+  - Tốc độ tổng SIM_RATE msg/s chia đều cho các thiết bị, SIM_BURST="mỗi:kéo_dài:hệ_số" tạo đợt tăng vọt
+  - Publish tới mosquitto trong docker-compose.yml (MQTT_BROKER:MQTT_PORT), topic iot/sensor/<dev_id>
+  - Backend giả (mock_backend.py) với độ trễ / tỉ lệ lỗi tiêm vào; gateway chạy ở process con trỏ BACKEND_URL vào đó
+  - Báo cáo: msg/s backend nhận được, độ trễ đầu-cuối p50/p99 (publish → backend), gói mất
+Chạy: docker compose up -d mosquitto && python bench/fleet_sim.py
+      SIM_GATEWAY=none: gateway đã chạy sẵn với BACKEND_URL=http://<máy này>:SIM_BACKEND_PORT
+"""
+import json
+import multiprocessing
+import os
+import random
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import paho.mqtt.client as mqtt  # noqa: E402
+
+from checksum import calculate_checksum  # noqa: E402
+from mock_backend import Faults, backend_stats, start_backend  # noqa: E402
+
+MQTT_BROKER = os.getenv("MQTT_BROKER", "127.0.0.1")
+MQTT_PORT = int(os.getenv("MQTT_PORT", 1883))
+
+SIM_DEVICES = int(os.getenv("SIM_DEVICES", 300))
+SIM_RATE = float(os.getenv("SIM_RATE", 500))  # msg/s tổng (ngoài đợt burst)
+SIM_DURATION = float(os.getenv("SIM_DURATION", 30))
+SIM_BURST = os.getenv("SIM_BURST", "")  # "30:5:10" = mỗi 30s, trong 5s, tốc độ x10
+SIM_BAD_CHECKSUM = float(os.getenv("SIM_BAD_CHECKSUM", 0.01))
+SIM_LOSS = float(os.getenv("SIM_LOSS", 0.005))  # tỉ lệ seq_num bị nhảy (gói "mất" trên đường WiFi)
+SIM_QOS = int(os.getenv("SIM_QOS", 0))
+SIM_PUBLISHERS = int(os.getenv("SIM_PUBLISHERS", 2))
+SIM_GATEWAY = os.getenv("SIM_GATEWAY", "thread")  # thread | async | none
+
+SIM_BACKEND_PORT = int(os.getenv("SIM_BACKEND_PORT", 0))
+SIM_BACKEND_LATENCY_MS = float(os.getenv("SIM_BACKEND_LATENCY_MS", 30))
+SIM_BACKEND_JITTER_MS = float(os.getenv("SIM_BACKEND_JITTER_MS", 10))
+SIM_BACKEND_ERROR_RATE = float(os.getenv("SIM_BACKEND_ERROR_RATE", 0.0))
+SIM_BACKEND_HANG_RATE = float(os.getenv("SIM_BACKEND_HANG_RATE", 0.0))
+
+PROFILES = ("esp32_multi1_", "esp32_multi2_", "esp32_multi3_")
+HERE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+STARTUP_WAIT = 3.0
+DRAIN_IDLE = 5.0
+
+
+# ==================== THIẾT BỊ GIẢ ====================
+class Device:
+    __slots__ = ("dev_id", "kind", "ip", "boot", "seq", "rssi", "temperature", "humidity", "gas", "light", "rain")
+
+    def __init__(self, index, rng, now):
+        self.kind = index % 3
+        self.dev_id = f"{PROFILES[self.kind]}{index:04d}"
+        self.ip = f"192.168.{4 + index // 250}.{2 + index % 250}"
+        self.boot = now - rng.uniform(0, 3600)
+        self.seq = rng.randint(0, 1000)
+        self.rssi = rng.uniform(-75, -35)
+        self.temperature = rng.uniform(24, 31)
+        self.humidity = rng.uniform(40, 70)
+        self.gas = rng.uniform(300, 800)
+        self.light = rng.uniform(20, 800)
+        self.rain = 0
+
+    def packet(self, rng, now, bad_checksum):
+        self.seq += 2 if rng.random() < SIM_LOSS else 1
+        self.rssi = min(-30.0, max(-90.0, self.rssi + rng.gauss(0, 1.5)))
+        data = {"dev_id": self.dev_id, "timestamp": int(now - self.boot), "dev_ip": self.ip, "seq_num": self.seq,
+                "packet_interval": 3, "dev_status": "normal"}
+        if self.kind != 1:
+            self.temperature = min(40.0, max(15.0, self.temperature + rng.gauss(0, 0.1)))
+            self.humidity = min(95.0, max(20.0, self.humidity + rng.gauss(0, 0.3)))
+            data["temperature"] = round(self.temperature, 1)
+            data["humidity"] = round(self.humidity, 1)
+        if self.kind == 0:
+            if rng.random() < 0.01:
+                self.rain ^= 1
+            data["rain_status"] = self.rain
+        if self.kind != 0:
+            self.gas = min(1500.0, max(100.0, self.gas + rng.gauss(0, 10)))
+            data["gas_level"] = int(self.gas)
+        if self.kind == 1:
+            self.light = min(1000.0, max(0.0, self.light + rng.gauss(0, 5)))
+            data["light_level"] = int(self.light)
+        data["rssi"] = int(self.rssi)
+        data["ssid"] = "ESP32_AP"
+        data["t_pub"] = time.time()  # chỉ có ở gói giả: tính độ trễ đầu-cuối tại backend giả
+        data["checksum"] = calculate_checksum(data)
+        if bad_checksum:
+            data["checksum"] = data["checksum"] + "0" if isinstance(data["checksum"], str) else data["checksum"] + 1
+        return json.dumps(data, separators=(',', ':')).encode("utf-8")
+
+
+def parse_burst(spec):
+    """"30:5:10" → (30.0, 5.0, 10.0); rỗng → None."""
+    if not spec:
+        return None
+    every, duration, factor = (float(x) for x in spec.split(":"))
+    return every, duration, factor
+
+
+def rate_factor(elapsed, burst):
+    if burst is None:
+        return 1.0
+    every, duration, factor = burst
+    return factor if elapsed % every < duration else 1.0
+
+
+def _publisher(index, device_ids, rate, duration, burst, result):
+    rng = random.Random(index)
+    now = time.time()
+    devices = [Device(i, rng, now) for i in device_ids]
+    client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
+    client.max_queued_messages_set(0)
+    client.connect(MQTT_BROKER, MQTT_PORT)
+    client.loop_start()
+    sent = bad = 0
+    quota = 0.0
+    t0 = last = time.perf_counter()
+    while True:
+        now = time.perf_counter()
+        elapsed = now - t0
+        if elapsed >= duration:
+            break
+        # Tích lũy hạn mức gửi theo tốc độ hiện tại (có burst)
+        quota += (now - last) * rate * rate_factor(elapsed, burst)
+        last = now
+        while quota >= 1.0:
+            dev = devices[sent % len(devices)]
+            is_bad = rng.random() < SIM_BAD_CHECKSUM
+            client.publish(f"iot/sensor/{dev.dev_id}", dev.packet(rng, time.time(), is_bad), qos=SIM_QOS)
+            sent += 1
+            bad += is_bad
+            quota -= 1.0
+        time.sleep(0.001)
+    client.loop_stop()
+    client.disconnect()
+    result.put((sent, bad))
+
+
+# ==================== GATEWAY + BACKEND ====================
+def start_gateway(base):
+    if SIM_GATEWAY == "none":
+        return None
+    script = "gateway_async.py" if SIM_GATEWAY == "async" else "gateway.py"
+    env = dict(os.environ, BACKEND_URL=base, MQTT_BROKER=MQTT_BROKER, MQTT_PORT=str(MQTT_PORT), METRICS_PORT="0",
+               LOG_LEVEL=os.getenv("LOG_LEVEL", "WARNING"), UPLOAD_QUEUE_SIZE=os.getenv("UPLOAD_QUEUE_SIZE", "20000"),
+               DISPATCH_QUEUE_SIZE=os.getenv("DISPATCH_QUEUE_SIZE", "20000"),
+               UPLOAD_CONCURRENCY=os.getenv("UPLOAD_CONCURRENCY", "16"))
+    return subprocess.Popen([sys.executable, os.path.join(HERE, script)], env=env)
+
+
+def received(base):
+    with urllib.request.urlopen(f"{base}/count", timeout=5) as r:
+        return json.load(r)["received"]
+
+
+def main():
+    burst = parse_burst(SIM_BURST)
+    faults = Faults(SIM_BACKEND_LATENCY_MS / 1000, SIM_BACKEND_JITTER_MS / 1000, SIM_BACKEND_ERROR_RATE,
+                    SIM_BACKEND_HANG_RATE)
+    base = start_backend(faults=faults, port=SIM_BACKEND_PORT)
+    print(f"Backend giả {base} | trễ {SIM_BACKEND_LATENCY_MS:.0f}±{SIM_BACKEND_JITTER_MS:.0f}ms | "
+          f"lỗi {SIM_BACKEND_ERROR_RATE:.1%} | treo {SIM_BACKEND_HANG_RATE:.1%}")
+    print(f"{SIM_DEVICES} thiết bị → {MQTT_BROKER}:{MQTT_PORT} | {SIM_RATE:.0f} msg/s trong {SIM_DURATION:.0f}s | "
+          f"burst {SIM_BURST or 'không'} | checksum sai {SIM_BAD_CHECKSUM:.1%} | gateway {SIM_GATEWAY}")
+
+    gw = start_gateway(base)
+    try:
+        time.sleep(STARTUP_WAIT)
+        backend_stats(base)  # bỏ số liệu lúc khởi động (đăng ký gateway)
+        before = received(base)
+        result = multiprocessing.Queue()
+        per = SIM_RATE / SIM_PUBLISHERS
+        procs = [multiprocessing.Process(target=_publisher,
+                                         args=(k, range(k, SIM_DEVICES, SIM_PUBLISHERS), per, SIM_DURATION, burst,
+                                               result))
+                 for k in range(SIM_PUBLISHERS)]
+        t0 = time.perf_counter()
+        for p in procs:
+            p.start()
+        sent = bad = 0
+        for _ in procs:
+            s, b = result.get()
+            sent += s
+            bad += b
+        for p in procs:
+            p.join()
+        published_at = time.perf_counter() - t0
+
+        expected = sent - bad
+        got, last_change = 0, time.perf_counter()
+        while got < expected and time.perf_counter() - last_change < DRAIN_IDLE:
+            time.sleep(0.2)
+            now_got = received(base) - before
+            if now_got != got:
+                got, last_change = now_got, time.perf_counter()
+        elapsed = last_change - t0
+        stats = backend_stats(base)
+    finally:
+        if gw is not None:
+            gw.send_signal(signal.SIGINT)
+            try:
+                gw.wait(30)
+            except subprocess.TimeoutExpired:
+                gw.kill()
+
+    print(f"Đã publish {sent} gói ({sent / published_at:.0f} msg/s), {bad} gói checksum sai")
+    print(f"Backend nhận {got}/{expected} ({100 * got / max(expected, 1):.1f}%) | {got / elapsed:.0f} msg/s | "
+          f"đầu-cuối p50 {stats['p50_ms']:.1f}ms p99 {stats['p99_ms']:.1f}ms")
+    print(f"Request {stats['requests']} | lỗi tiêm {stats['errors']} | treo {stats['hangs']} | "
+          f"cảnh báo IDS {stats['alerts']} | {stats['bytes'] / max(got, 1):.0f} byte/gói")
+
+
+if __name__ == "__main__":
+    main()
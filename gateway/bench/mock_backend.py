@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Backend giả cho benchmark / thử tải (aiohttp, chạy ở process riêng)
+  - Đường dẫn thật: /api/v1/test/devices/register, /sensors/data, /ids-alerts (+ /data, /alerts cho bench_async)
+  - Lô: body là mảng payload (API_SENSOR_DATA_BATCH / API_IDS_ALERT_BATCH trỏ cùng đường dẫn)
+  - Đọc được body gzip/deflate và msgpack/cbor (encoding.py), header Accept-Post / Accept-Encoding khi đăng ký
+  - Tiêm lỗi: độ trễ mỗi request (+ dao động), tỉ lệ trả 503, tỉ lệ treo quá timeout của gateway
+  - Độ trễ đầu-cuối = lúc nhận - rawData.t_pub (thiết bị giả ghi lúc publish)
+  - GET /stats: số liệu từ lần gọi trước (rồi xóa), GET /count: tổng số payload cảm biến đã nhận
+Chạy riêng: python bench/mock_backend.py [port] [độ_trễ_ms] [tỉ_lệ_lỗi] → BACKEND_URL=http://127.0.0.1:<port>
+"""
+import asyncio
+import gzip
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from encoding import FORMATS  # noqa: E402
+
+API = "/api/v1/test"
+HANG_SECONDS = 60
+
+_DECODERS = {"application/json": json.loads}
+try:
+    import msgpack
+    _DECODERS["application/msgpack"] = msgpack.unpackb
+except ImportError:
+    pass
+try:
+    import cbor2
+    _DECODERS["application/cbor"] = cbor2.loads
+except ImportError:
+    pass
+_DECOMPRESS = {"gzip": gzip.decompress, "deflate": zlib.decompress}
+
+
+class Faults:
+    """Lỗi tiêm vào mọi endpoint POST."""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, hang_rate=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+
+
+def _percentile(values, q):
+    return 1000 * values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+
+def backend_main(faults, port_value, ready, port=0):
+    from aiohttp import web
+
+    latencies = []
+    counters = {"received": 0, "requests": 0, "errors": 0, "hangs": 0, "alerts": 0, "registered": 0,
+                "bytes": 0}
+    rng = random.Random()
+
+    async def decode(request):
+        body = await request.read()
+        counters["bytes"] += len(body)
+        coding = request.headers.get("Content-Encoding")
+        if coding in _DECOMPRESS:
+            body = _DECOMPRESS[coding](body)
+        ctype = request.headers.get("Content-Type", "application/json").split(";")[0].strip()
+        return _DECODERS.get(ctype, json.loads)(body)
+
+    async def inject():
+        """None = xử lý bình thường, ngược lại là response lỗi."""
+        counters["requests"] += 1
+        r = rng.random()
+        if r < faults.hang_rate:
+            counters["hangs"] += 1
+            await asyncio.sleep(HANG_SECONDS)
+        elif r < faults.hang_rate + faults.error_rate:
+            counters["errors"] += 1
+            return web.json_response({"error": "injected"}, status=503)
+        delay = faults.latency + (rng.uniform(-faults.jitter, faults.jitter) if faults.jitter else 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return None
+
+    async def data(request):
+        body = await decode(request)
+        error = await inject()
+        if error is not None:
+            return error
+        now = time.time()
+        for payload in body if isinstance(body, list) else (body,):
+            counters["received"] += 1
+            t_pub = (payload.get("rawData") or {}).get("t_pub")
+            if t_pub is not None:
+                latencies.append(now - t_pub)
+        return web.json_response({"data": {"sensorDataId": counters["received"], "anomalyDetected": False}},
+                                 status=201)
+
+    async def alerts(request):
+        body = await decode(request)
+        error = await inject()
+        if error is not None:
+            return error
+        counters["alerts"] += len(body) if isinstance(body, list) else 1
+        return web.json_response({}, status=201)
+
+    async def register(request):
+        await decode(request)
+        counters["registered"] += 1
+        accept = ", ".join(ctype for ctype, _ in FORMATS.values() if ctype in _DECODERS)
+        return web.json_response({"data": {}}, status=201,
+                                 headers={"Accept-Post": accept, "Accept-Encoding": "gzip, deflate"})
+
+    async def count(request):
+        return web.json_response({"received": counters["received"]})
+
+    async def stats(request):
+        lats = sorted(latencies)
+        out = dict(counters, count=len(lats), p50_ms=_percentile(lats, 0.5), p99_ms=_percentile(lats, 0.99))
+        latencies.clear()
+        return web.json_response(out)
+
+    async def serve():
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        for path, handler in (("/data", data), ("/alerts", alerts), (f"{API}/sensors/data", data),
+                              (f"{API}/ids-alerts", alerts), (f"{API}/devices/register", register)):
+            app.router.add_post(path, handler)
+        app.router.add_get("/stats", stats)
+        app.router.add_get("/count", count)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", port, backlog=4096)
+        await site.start()
+        port_value.value = site._server.sockets[0].getsockname()[1]
+        ready.set()
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+def start_backend(latency=0.0, faults=None, port=0):
+    """Chạy backend giả ở process nền, trả về base URL (http://127.0.0.1:<port>)."""
+    faults = faults or Faults(latency)
+    port_value = multiprocessing.Value("i", 0)
+    ready = multiprocessing.Event()
+    proc = multiprocessing.Process(target=backend_main, args=(faults, port_value, ready, port), daemon=True)
+    proc.start()
+    ready.wait()
+    return f"http://127.0.0.1:{port_value.value}"
+
+
+def backend_stats(base):
+    import requests
+    return requests.get(f"{base}/stats", timeout=10).json()
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8080
+    faults = Faults(latency=(float(sys.argv[2]) if len(sys.argv) > 2 else 0) / 1000,
+                    error_rate=float(sys.argv[3]) if len(sys.argv) > 3 else 0.0)
+    print(f"Backend giả: http://127.0.0.1:{port} | trễ {faults.latency * 1000:.0f}ms | lỗi {faults.error_rate:.0%}")
+    backend_main(faults, multiprocessing.Value("i", 0), multiprocessing.Event(), port)
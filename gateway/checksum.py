@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Checksum - Tính / kiểm tra checksum gói tin ESP32 và payload gửi backend
+  - md5_8 (mặc định, tương thích ESP32 cũ): byte đầu của MD5 trên JSON gọn, bỏ khóa "checksum"
+  - crc32 / blake2s_32: thuật toán nhanh hơn / mạnh hơn, chọn theo profile thiết bị
+  - Kiểm tra nhanh: băm thẳng bytes nhận được (cắt đuôi ,"checksum":N) thay vì
+    decode → copy dict → json.dumps lại; thiết bị nào không gửi JSON chuẩn thì tạm đi đường cũ,
+    thời gian tạm tăng gấp đôi mỗi lần thử lại thất bại, về 0 ngay khi đường nhanh đúng trở lại
+"""
+import hashlib
+import json
+import re
+import zlib
+
+
+def _md5_8(body):
+    return hashlib.md5(body).digest()[0]
+
+
+def _crc32(body):
+    return zlib.crc32(body)
+
+
+def _blake2s_32(body):
+    return int.from_bytes(hashlib.blake2s(body, digest_size=4).digest(), "big")
+
+
+ALGORITHMS = {
+    "md5_8": _md5_8,
+    "crc32": _crc32,
+    "blake2s_32": _blake2s_32,
+}
+DEFAULT_ALGORITHM = "md5_8"
+
+# ,"checksum":123} ở cuối gói – đúng định dạng json.dumps(separators=(',', ':'))
+_TAIL_RE = re.compile(rb',"checksum":(\d+)}$')
+
+# Số thiết bị tối đa được ghi nhớ là "không gửi JSON chuẩn"
+SLOW_DEVICE_CACHE_SIZE = 10000
+# Sau một lần đường nhanh sai: bỏ qua đường nhanh N gói rồi thử lại (N gấp đôi mỗi lần sai, tối đa MAX)
+SLOW_PATH_SKIP = 16
+SLOW_PATH_SKIP_MAX = 4096
+
+
+def canonical_bytes(data):
+    """JSON gọn (không khoảng trắng, giữ unicode) của data, bỏ khóa "checksum"."""
+    if "checksum" in data:
+        data = {k: v for k, v in data.items() if k != "checksum"}
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def calculate_checksum(data_dict, algorithm=DEFAULT_ALGORITHM):
+    return ALGORITHMS[algorithm](canonical_bytes(data_dict))
+
+
+def resolve_algorithm(data, allowed=(DEFAULT_ALGORITHM,)):
+    """Thiết bị có thể chọn thuật toán qua trường "checksum_alg" nếu profile cho phép.
+
+    Trả về None nếu thiết bị yêu cầu thuật toán không được phép.
+    """
+    requested = data.get("checksum_alg")
+    if requested is None:
+        return allowed[0]
+    return requested if requested in allowed else None
+
+
+class ChecksumVerifier:
+    def __init__(self):
+        # dev_id -> [số gói còn bỏ qua đường nhanh, số gói sẽ bỏ qua nếu lần thử lại vẫn sai]
+        self.slow_devices = {}
+        self.fast_ok = 0
+        self.slow_ok = 0
+        self.failed = 0
+
+    def verify(self, data, raw=None, dev_id=None, algorithm=DEFAULT_ALGORITHM):
+        """Trả về (hợp lệ, checksum tính được). raw là bytes gốc nhận từ MQTT (nếu có)."""
+        received = data.get("checksum")
+        if received is None:
+            self.failed += 1
+            return False, None
+        fn = ALGORITHMS[algorithm]
+
+        slow = self.slow_devices.get(dev_id)
+        tried_fast = False
+        if slow is not None and slow[0] > 0:
+            slow[0] -= 1
+        elif raw is not None:
+            tried_fast = True
+            m = _TAIL_RE.search(raw.rstrip())
+            if m and fn(raw[:m.start()] + b"}") == received:
+                if slow is not None:
+                    del self.slow_devices[dev_id]
+                self.fast_ok += 1
+                return True, received
+
+        calculated = fn(canonical_bytes(data))
+        if calculated != received:
+            self.failed += 1
+            return False, calculated
+        self.slow_ok += 1
+        # Đúng theo cách cũ nhưng sai theo bytes gốc → thiết bị không gửi JSON chuẩn, tạm đi thẳng đường chậm
+        if tried_fast:
+            if slow is not None:
+                slow[0] = slow[1]
+                slow[1] = min(slow[1] * 2, SLOW_PATH_SKIP_MAX)
+            elif len(self.slow_devices) < SLOW_DEVICE_CACHE_SIZE:
+                self.slow_devices[dev_id] = [SLOW_PATH_SKIP, SLOW_PATH_SKIP * 2]
+        return True, calculated
+
+    def stats(self):
+        return {"fast_ok": self.fast_ok, "slow_ok": self.slow_ok, "failed": self.failed,
+                "slow_devices": len(self.slow_devices)}
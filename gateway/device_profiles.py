@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Device Profiles - Bảng cấu hình thiết bị thay cho chuỗi if/elif theo dev_id
+  - devices.json: profile (trường, loại cảm biến, ép kiểu, lọc giá trị, luật cảnh báo)
+  - Mỗi profile được biên dịch sẵn thành hàm trích xuất riêng
+  - Tra cứu O(1) theo dev_id; thiết bị lạ được khớp theo prefix / glob / regex rồi ghi nhớ
+  - Tự nạp lại khi file cấu hình thay đổi, không cần khởi động lại gateway
+  - Mục "aggregation": cửa sổ gộp theo loại cảm biến (xem aggregator.py)
+  - Mục "anomaly" trong profile: độ nhạy phát hiện bất thường theo trường (xem anomaly.py)
+"""
+import fnmatch
+import json
+import logging
+import operator
+import os
+import re
+import threading
+
+from aggregator import compile_rules
+from anomaly import compile_specs
+from checksum import ALGORITHMS, DEFAULT_ALGORITHM
+from encoding import ENVELOPE_FIELDS
+
+CASTS = {
+    "raw": lambda v: v,
+    "round1": lambda v: round(v, 1),
+    "round2": lambda v: round(v, 2),
+    "int": int,
+    "float": float,
+    "bool": bool,
+}
+
+OPS = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+# Giới hạn số dev_id đã khớp pattern được ghi nhớ
+MATCH_CACHE_SIZE = 10000
+
+log = logging.getLogger("gateway.profiles")
+
+
+def _always_valid(value):
+    return True
+
+
+def _compile_valid(spec):
+    """{"gt": -999, "lt": 100} → hàm kiểm tra giá trị hợp lệ."""
+    if not spec:
+        return _always_valid
+    checks = []
+    for name, bound in spec.items():
+        op = {"gt": operator.gt, "ge": operator.ge, "lt": operator.lt, "le": operator.le}.get(name)
+        if op is None:
+            raise ValueError(f"Điều kiện valid không hỗ trợ: {name}")
+        checks.append((op, bound))
+    if len(checks) == 1:
+        op, bound = checks[0]
+        return lambda v: op(v, bound)
+    return lambda v: all(op(v, bound) for op, bound in checks)
+
+
+class DeviceProfile:
+    def __init__(self, name, spec):
+        self.name = name
+        self.spec = spec
+        self.description = spec.get("description", "")
+        self.sensor_types = {s["field"]: s["type"] for s in spec.get("sensors", [])}
+        # Trường của gói gốc đã có trong payload → bỏ khỏi rawData khi RAW_DATA_MODE=dedup
+        self.raw_duplicates = frozenset(self.sensor_types) | frozenset(ENVELOPE_FIELDS)
+        # "checksum": "crc32" hoặc ["crc32", "md5_8"] – phần tử đầu là mặc định
+        algorithms = spec.get("checksum", DEFAULT_ALGORITHM)
+        if isinstance(algorithms, str):
+            algorithms = [algorithms]
+        for alg in algorithms:
+            if alg not in ALGORITHMS:
+                raise ValueError(f"Thuật toán checksum không hỗ trợ: {alg}")
+        self.checksum_algorithms = tuple(algorithms)
+        self.extract = self._compile_sensors(spec.get("sensors", []))
+        self.check_alerts = self._compile_alerts(spec.get("alerts", []))
+        # Cùng điều kiện "valid" với extract: giá trị lỗi (-999) không vào thống kê bất thường
+        self.anomaly = compile_specs(spec.get("anomaly", {}),
+                                     {s["field"]: _compile_valid(s.get("valid")) for s in spec.get("sensors", [])})
+
+    @staticmethod
+    def _compile_sensors(sensor_specs):
+        table = []
+        for s in sensor_specs:
+            cast = CASTS.get(s.get("cast", "raw"))
+            if cast is None:
+                raise ValueError(f"cast không hỗ trợ: {s.get('cast')}")
+            table.append((s["field"], "_" + s["suffix"], s["type"], s["key"], cast, _compile_valid(s.get("valid"))))
+        table = tuple(table)
+
+        def extract(data, dev_id):
+            sensors = []
+            get = data.get
+            for field, suffix, sensor_type, key, cast, valid in table:
+                value = get(field)
+                if value is not None and valid(value):
+                    sensors.append({
+                        "sensorUid": dev_id + suffix,
+                        "type": sensor_type,
+                        "data": {key: cast(value)}
+                    })
+            return sensors
+
+        return extract
+
+    @staticmethod
+    def _compile_alerts(alert_specs):
+        table = []
+        for a in alert_specs:
+            op = OPS.get(a.get("op", ">"))
+            if op is None:
+                raise ValueError(f"op không hỗ trợ: {a.get('op')}")
+            table.append((a["field"], op, a["value"], a["attackType"], a["message"], a.get("severity", 50)))
+        table = tuple(table)
+
+        def check_alerts(data, dev_id):
+            """Trả về [(attack_type, description, severity, value)] cho các luật bị vi phạm."""
+            alerts = []
+            get = data.get
+            for field, op, threshold, attack_type, message, severity in table:
+                value = get(field)
+                if value is not None and op(value, threshold):
+                    alerts.append((attack_type, message.format(value=value, dev_id=dev_id), severity, value))
+            return alerts
+
+        return check_alerts
+
+
+def _compile_pattern(entry):
+    if "prefix" in entry:
+        prefix = entry["prefix"]
+        return lambda dev_id: dev_id.startswith(prefix)
+    if "glob" in entry:
+        return re.compile(fnmatch.translate(entry["glob"])).match
+    if "regex" in entry:
+        return re.compile(entry["regex"]).search
+    raise ValueError(f"Pattern thiếu prefix/glob/regex: {entry}")
+
+
+class _Table:
+    """Ảnh chụp bất biến của cấu hình; nạp lại = thay cả bảng bằng một phép gán."""
+
+    def __init__(self, config):
+        self.profiles = {name: DeviceProfile(name, spec) for name, spec in config.get("profiles", {}).items()}
+        self.exact = {}
+        for dev_id, name in config.get("devices", {}).items():
+            if name not in self.profiles:
+                raise ValueError(f"Thiết bị {dev_id} trỏ tới profile không tồn tại: {name}")
+            self.exact[dev_id] = self.profiles[name]
+        self.patterns = []
+        for entry in config.get("patterns", []):
+            if entry.get("profile") not in self.profiles:
+                raise ValueError(f"Pattern trỏ tới profile không tồn tại: {entry}")
+            self.patterns.append((_compile_pattern(entry), self.profiles[entry["profile"]]))
+        self.aggregation = compile_rules(config.get("aggregation", {}))
+        self.matched = {}
+
+
+class DeviceRegistry:
+    def __init__(self, path, reload_interval=5.0):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._mtime = None
+        self._table = None
+        self._stop = threading.Event()
+        self.reload(force=True)
+
+    def reload(self, force=False):
+        """Nạp lại nếu file thay đổi. Cấu hình lỗi → giữ bảng cũ."""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError as e:
+            if self._table is None:
+                raise
+            log.error("[PROFILE] Không đọc được %s: %s → giữ cấu hình cũ", self.path, e)
+            return False
+        if not force and mtime == self._mtime:
+            return False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                table = _Table(json.load(f))
+        except (ValueError, KeyError, TypeError) as e:
+            if self._table is None:
+                raise
+            log.error("[PROFILE] Cấu hình lỗi: %s → giữ cấu hình cũ", e)
+            self._mtime = mtime
+            return False
+        self._table, self._mtime = table, mtime
+        log.info("[PROFILE] Đã nạp %d profile, %d thiết bị, %d pattern từ %s",
+                 len(table.profiles), len(table.exact), len(table.patterns), self.path)
+        return True
+
+    def lookup(self, dev_id):
+        """dev_id → DeviceProfile hoặc None nếu không khớp gì."""
+        table = self._table
+        profile = table.exact.get(dev_id)
+        if profile is not None:
+            return profile
+        try:
+            return table.matched[dev_id]
+        except KeyError:
+            pass
+        profile = None
+        for match, candidate in table.patterns:
+            if match(dev_id):
+                profile = candidate
+                break
+        if len(table.matched) < MATCH_CACHE_SIZE:
+            table.matched[dev_id] = profile
+        if profile is not None:
+            log.info("[PROFILE] Thiết bị mới %s → profile %s", dev_id, profile.name)
+        return profile
+
+    def window_spec(self, sensor_type):
+        """Loại cảm biến → WindowSpec gộp hoặc None (gửi từng số đo)."""
+        return self._table.aggregation.get(sensor_type)
+
+    # ---------- Tự nạp lại ----------
+    def start_watching(self):
+        if not self.reload_interval:
+            return
+        threading.Thread(target=self._watch, name="profile-watcher", daemon=True).start()
+
+    def stop_watching(self):
+        self._stop.set()
+
+    def _watch(self):
+        while not self._stop.wait(self.reload_interval):
+            self.reload()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Dispatcher - Chuyển xử lý tin nhắn MQTT từ luồng paho sang pool worker
+  - Chia shard theo dev_id: cùng một thiết bị luôn vào cùng một worker → giữ thứ tự seq_num
+  - Các thiết bị khác nhau chạy song song trên các worker khác nhau
+  - Mỗi shard có hàng đợi và bộ đếm riêng → worker không tranh chấp chung một lock
+"""
+import logging
+import queue
+import re
+import threading
+import zlib
+
+# Lấy dev_id trực tiếp từ bytes, không cần json.loads trên luồng paho
+_DEV_ID_RE = re.compile(rb'"dev_id"\s*:\s*"([^"]*)"')
+
+_STOP = object()
+
+log = logging.getLogger("gateway.dispatcher")
+
+
+def extract_shard_key(payload, topic=""):
+    """Khóa shard: dev_id nếu tìm thấy trong payload, ngược lại dùng topic."""
+    m = _DEV_ID_RE.search(payload)
+    if m:
+        return m.group(1)
+    return topic.encode("utf-8")
+
+
+class Shard:
+    def __init__(self, index, queue_size):
+        self.index = index
+        self.queue = queue.Queue(maxsize=queue_size)
+        # Chỉ worker của shard ghi các bộ đếm này → không cần lock
+        self.processed = 0
+        self.packet_count = 0
+        self.errors = 0
+        # Luồng paho ghi bộ đếm này
+        self.dropped = 0
+        self.thread = None
+
+
+class ShardedDispatcher:
+    def __init__(self, handler, num_workers=4, queue_size=1000):
+        """handler(payload_bytes, topic) -> True nếu gói hợp lệ (được tính vào packet_count)."""
+        self.handler = handler
+        self.shards = [Shard(i, queue_size) for i in range(max(1, num_workers))]
+
+    def shard_for(self, key):
+        return self.shards[zlib.crc32(key) % len(self.shards)]
+
+    def submit(self, payload, topic=""):
+        """Gọi từ on_message. Không chặn: shard đầy → bỏ gói và trả về False."""
+        shard = self.shard_for(extract_shard_key(payload, topic))
+        try:
+            shard.queue.put_nowait((payload, topic))
+            return True
+        except queue.Full:
+            shard.dropped += 1
+            log.error("[DISPATCH] Shard %d đầy (%d) → bỏ gói từ %s", shard.index, shard.queue.maxsize, topic)
+            return False
+
+    def start(self):
+        for shard in self.shards:
+            shard.thread = threading.Thread(target=self._worker, args=(shard,),
+                                            name=f"dispatch-{shard.index}", daemon=True)
+            shard.thread.start()
+        log.info("[DISPATCH] Khởi động %d worker | queue/shard=%d", len(self.shards), self.shards[0].queue.maxsize)
+
+    def stop(self, timeout=10):
+        """Xử lý nốt các gói đã nhận rồi dừng worker."""
+        for shard in self.shards:
+            shard.queue.put(_STOP)
+        for shard in self.shards:
+            if shard.thread:
+                shard.thread.join(timeout)
+
+    def _worker(self, shard):
+        while True:
+            item = shard.queue.get()
+            if item is _STOP:
+                return
+            try:
+                if self.handler(*item):
+                    shard.packet_count += 1
+            except Exception as e:
+                shard.errors += 1
+                log.error("Lỗi xử lý tin nhắn: %s", e)
+            shard.processed += 1
+
+    # ---------- Thống kê ----------
+    def packet_count(self):
+        return sum(s.packet_count for s in self.shards)
+
+    def queue_depths(self):
+        return [s.queue.qsize() for s in self.shards]
+
+    def stats(self):
+        return {
+            "packet_count": self.packet_count(),
+            "processed": sum(s.processed for s in self.shards),
+            "dropped": sum(s.dropped for s in self.shards),
+            "errors": sum(s.errors for s in self.shards),
+            "queue_depths": self.queue_depths(),
+        }
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Encoding - Thu gọn payload gửi backend
+  - rawData: full (giữ nguyên gói ESP32) | dedup (bỏ các trường đã có trong sensors / sequenceNumber /
+    sourceIp / rssi) | none (bỏ hẳn rawData; metric theo thiết bị mất nhãn dev_id)
+    dedup / none: backend không kiểm tra lại được checksum gốc của ESP32, chỉ còn checksum của payload
+  - Định dạng body: json | msgpack | cbor (cần gói msgpack / cbor2, thiếu → dùng json)
+  - Nén body: identity | gzip | deflate (Content-Encoding), body nhỏ hơn min_size không nén
+  - auto: theo header backend trả về khi đăng ký gateway
+      Accept-Post: application/msgpack, application/cbor   (định dạng nhận được)
+      Accept-Encoding: gzip, deflate                         (nén request body, RFC 7694)
+"""
+import gzip
+import json
+import logging
+import zlib
+
+try:
+    import msgpack
+except ImportError:  # tùy chọn
+    msgpack = None
+try:
+    import cbor2
+except ImportError:  # tùy chọn
+    cbor2 = None
+
+RAW_FULL = "full"
+RAW_DEDUP = "dedup"
+RAW_NONE = "none"
+RAW_MODES = (RAW_FULL, RAW_DEDUP, RAW_NONE)
+
+# Trường của gói ESP32 đã nằm ở cấp ngoài payload (sequenceNumber / sourceIp / rssi)
+ENVELOPE_FIELDS = ("seq_num", "dev_ip", "rssi")
+
+AUTO = "auto"
+
+log = logging.getLogger("gateway.encoding")
+
+
+def _json(body):
+    return json.dumps(body, ensure_ascii=False, separators=(',', ':')).encode("utf-8")
+
+
+# Thứ tự ưu tiên khi auto: nhỏ hơn đứng trước
+FORMATS = {"json": ("application/json", _json)}
+if msgpack is not None:
+    FORMATS["msgpack"] = ("application/msgpack", msgpack.packb)
+if cbor2 is not None:
+    FORMATS["cbor"] = ("application/cbor", cbor2.dumps)
+FORMAT_PREFERENCE = ("msgpack", "cbor", "json")
+
+COMPRESSIONS = {
+    "identity": None,
+    "gzip": lambda body, level: gzip.compress(body, compresslevel=level, mtime=0),
+    "deflate": lambda body, level: zlib.compress(body, level),  # HTTP "deflate" = zlib (RFC 1950)
+}
+COMPRESSION_PREFERENCE = ("gzip", "deflate", "identity")
+
+
+def strip_raw_data(data, mode, duplicates=()):
+    """Gói ESP32 → rawData theo chế độ (None = bỏ hẳn)."""
+    if mode == RAW_FULL:
+        return data
+    if mode == RAW_NONE:
+        return None
+    return {k: v for k, v in data.items() if k not in duplicates}
+
+
+def _tokens(header):
+    """"gzip;q=1.0, Deflate" → {"gzip", "deflate"} (bỏ mục q=0)."""
+    out = set()
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if name and params.replace(" ", "") not in ("q=0", "q=0.0"):
+            out.add(name.strip().lower())
+    return out
+
+
+class BodyEncoder:
+    def __init__(self, fmt="json", compression="identity", level=6, min_size=256):
+        if fmt not in FORMATS:
+            raise ValueError(f"Định dạng không hỗ trợ (hoặc thiếu thư viện): {fmt}")
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Kiểu nén không hỗ trợ: {compression}")
+        self.format = fmt
+        self.compression = compression
+        self.level = level
+        self.min_size = min_size
+        self.content_type, self._dump = FORMATS[fmt]
+        self._compress = COMPRESSIONS[compression]
+
+    @classmethod
+    def negotiate(cls, headers, fmt=AUTO, compression=AUTO, **kwargs):
+        """Chọn định dạng / nén: giá trị cấu hình cụ thể được dùng nguyên, auto → theo header của backend."""
+        headers = headers or {}
+        if fmt == AUTO:
+            accepted = _tokens(headers.get("Accept-Post"))
+            fmt = next(f for f in FORMAT_PREFERENCE
+                       if f == "json" or (f in FORMATS and FORMATS[f][0] in accepted))
+        if compression == AUTO:
+            accepted = _tokens(headers.get("Accept-Encoding"))
+            compression = next(c for c in COMPRESSION_PREFERENCE if c == "identity" or c in accepted)
+        if fmt not in FORMATS:
+            log.warning("[ENCODING] Thiếu thư viện cho %s → dùng json", fmt)
+            fmt = "json"
+        return cls(fmt, compression, **kwargs)
+
+    def encode(self, body):
+        """payload / lô payload → (bytes, headers)."""
+        data = self._dump(body)
+        headers = {"Content-Type": self.content_type}
+        if self._compress is not None and len(data) >= self.min_size:
+            data = self._compress(data, self.level)
+            headers["Content-Encoding"] = self.compression
+        return data, headers
+
+    def __repr__(self):
+        return f"{self.format}+{self.compression}"
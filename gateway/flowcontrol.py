@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Flow Control - Backpressure đầu-cuối: MQTT → dispatch → upload/alerts/spool → backend
+  - Độ đầy = max(độ sâu / sức chứa) trên mọi hàng đợi đã đăng ký (một hàng đợi đầy là đủ để nghẽn)
+  - Ngưỡng trễ (hysteresis): đầy ≥ high → tạm dừng nhận MQTT, chỉ nhận lại khi ≤ low
+  - Tạm dừng = chặn callback MQTT → không đọc socket → broker giữ tin (QoS 1: cửa sổ inflight đầy)
+  - Chặn tối đa max_pause giây mỗi đợt nghẽn (không để broker ngắt vì keepalive), quá hạn → chỉ còn shed
+  - Shed theo chính sách: mỗi loại dữ liệu một ngưỡng đầy, vd. aggregatable:0.85,reading:0.95
+    → bỏ số đo gộp được trước, số đo thường sau, cảnh báo IDS không bao giờ bị bỏ (trừ khi cấu hình)
+"""
+import asyncio
+import logging
+import threading
+import time
+
+# Loại dữ liệu theo thứ tự bị bỏ trước → sau
+AGGREGATABLE = "aggregatable"
+READING = "reading"
+ALERT = "alert"
+KINDS = (AGGREGATABLE, READING, ALERT)
+# Tin bị bỏ trước điểm tạm dừng (hàng đợi nhận của aiomqtt đầy) – không thuộc chính sách shed, chỉ để đếm
+MQTT_INCOMING = "mqtt_incoming"
+
+log = logging.getLogger("gateway.flow")
+
+
+def parse_shed_policy(spec):
+    """"aggregatable:0.85,reading:0.95" → {"aggregatable": 0.85, "reading": 0.95}."""
+    policy = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        kind, _, level = part.partition(":")
+        kind = kind.strip()
+        if kind not in KINDS:
+            raise ValueError(f"loại dữ liệu không hỗ trợ trong chính sách shed: {kind}")
+        try:
+            level = float(level)
+        except ValueError:
+            raise ValueError(f"ngưỡng shed không hợp lệ: {part}") from None
+        if not 0 < level <= 1:
+            raise ValueError(f"ngưỡng shed phải trong (0, 1]: {part}")
+        policy[kind] = level
+    return policy
+
+
+class FlowController:
+    def __init__(self, high=0.8, low=0.5, shed=None, max_pause=30.0, poll=0.05, refresh=0.02):
+        """shed: {loại: độ đầy bắt đầu bỏ}; loại không có trong shed → không bao giờ bỏ."""
+        if not 0 < low < high <= 1:
+            raise ValueError("cần 0 < low < high <= 1")
+        self.high = high
+        self.low = low
+        self.shed = dict(shed or {})
+        self.max_pause = max_pause
+        self.poll = poll
+        self.refresh = refresh
+        self.lock = threading.Lock()
+        self.queues = {}  # tên → (hàm độ sâu, sức chứa)
+        self.fill = 0.0
+        self.paused = False
+        self.overrun = False  # đã chặn quá max_pause trong đợt nghẽn này → chỉ shed, không chặn nữa
+        self._checked = 0.0
+        self._paused_at = 0.0
+        self.pauses = 0
+        self.overruns = 0
+        self.paused_seconds = 0.0
+        self.shed_counts = {kind: 0 for kind in KINDS + (MQTT_INCOMING,)}
+
+    def add_queue(self, name, depth_fn, capacity):
+        if capacity > 0:
+            self.queues[name] = (depth_fn, capacity)
+
+    # ---------- Độ đầy + hysteresis ----------
+    def fills(self):
+        return {name: min(1.0, fn() / capacity) for name, (fn, capacity) in list(self.queues.items())}
+
+    def update(self, force=False):
+        """Tính lại độ đầy (tối đa mỗi refresh giây) và trạng thái tạm dừng. Trả về True nếu đang tạm dừng."""
+        now = time.monotonic()
+        if not force and now - self._checked < self.refresh:
+            return self.paused
+        fill = max(self.fills().values(), default=0.0)
+        with self.lock:
+            self._checked = now
+            self.fill = fill
+            if not self.paused and fill >= self.high:
+                self.paused = True
+                self.pauses += 1
+                self._paused_at = now
+                log.warning("[FLOW] Hàng đợi đầy %.0f%% ≥ %.0f%% → tạm dừng nhận MQTT", 100 * fill, 100 * self.high)
+            elif self.paused and fill <= self.low:
+                self.paused = False
+                self.overrun = False
+                self.paused_seconds += now - self._paused_at
+                log.warning("[FLOW] Hàng đợi còn %.0f%% ≤ %.0f%% → nhận lại sau %.1fs",
+                            100 * fill, 100 * self.low, now - self._paused_at)
+            return self.paused
+
+    # ---------- Tạm dừng (gọi từ luồng nhận MQTT) ----------
+    def _blocking(self):
+        return self.update(force=True) and not self.overrun
+
+    def _mark_overrun(self):
+        with self.lock:
+            self.overrun = True
+            self.overruns += 1
+        log.error("[FLOW] Đã tạm dừng %.0fs mà hàng đợi vẫn đầy %.0f%% → nhận tiếp, chỉ dựa vào shed",
+                  self.max_pause, 100 * self.fill)
+
+    def wait(self, sleep=time.sleep):
+        """Chặn luồng gọi khi đang tạm dừng (tối đa max_pause mỗi đợt nghẽn). Trả về số giây đã chặn."""
+        if not self.update() or self.overrun:
+            return 0.0
+        t0 = time.monotonic()
+        deadline = t0 + self.max_pause
+        while self._blocking():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._mark_overrun()
+                break
+            sleep(min(self.poll, remaining))
+        return time.monotonic() - t0
+
+    async def wait_async(self):
+        """Bản asyncio của wait: nhường event loop cho uploader xả hàng đợi trong lúc chờ."""
+        if not self.update() or self.overrun:
+            return 0.0
+        t0 = time.monotonic()
+        deadline = t0 + self.max_pause
+        while self._blocking():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._mark_overrun()
+                break
+            await asyncio.sleep(min(self.poll, remaining))
+        return time.monotonic() - t0
+
+    # ---------- Shed ----------
+    def shedding(self, kind):
+        """True nếu dữ liệu loại kind phải bỏ ở độ đầy hiện tại."""
+        level = self.shed.get(kind)
+        if level is None:
+            return False
+        self.update()
+        return self.fill >= level
+
+    def admit(self, kind, count=1):
+        """False (và đếm count mục bị bỏ) nếu loại kind đang bị shed."""
+        if not self.shedding(kind):
+            return True
+        self.record_shed(kind, count)
+        return False
+
+    def record_shed(self, kind, count):
+        if count:
+            with self.lock:
+                self.shed_counts[kind] += count
+
+    # ---------- Thống kê ----------
+    def stats(self):
+        with self.lock:
+            paused_seconds = self.paused_seconds
+            if self.paused:
+                paused_seconds += time.monotonic() - self._paused_at
+            out = {"paused": int(self.paused), "fill": self.fill, "pauses": self.pauses, "overruns": self.overruns,
+                   "paused_seconds": paused_seconds}
+            for kind, n in self.shed_counts.items():
+                out[f"shed_{kind}"] = n
+        return out
+
+    def print_stats(self):
+        s = self.stats()
+        log.info("[FLOW] đầy %.0f%% | tạm dừng %d lần (%.1fs, quá hạn %d) | shed gộp được %d, thường %d, cảnh báo %d"
+                 " | MQTT bỏ %d", 100 * s["fill"], s["pauses"], s["paused_seconds"], s["overruns"],
+                 s["shed_aggregatable"], s["shed_reading"], s["shed_alert"], s["shed_mqtt_incoming"])
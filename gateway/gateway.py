@@ -5,19 +5,42 @@ Tương thích với:
   - esp32_multi1: DHT11 + Rain sensor
   - esp32_multi2: MQ2 + LDR (light)
   - esp32_multi3: DHT11 + MQ2
+Thiết bị / profile cảm biến khai báo trong devices.json (tự nạp lại khi sửa)
 """
 import paho.mqtt.client as mqtt
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
 import json
-import hashlib
+import logging
 import time
 import requests
-import threading
-from collections import OrderedDict
 import os
-import uuid
+from uploader import BackendUploader
+from dispatcher import ShardedDispatcher
+from spool import SegmentLog, StoreAndForward
+from device_profiles import DeviceRegistry
+from alerts import AlertManager
+from aggregator import Aggregator
+import backend_client
+from backend_client import BackendEndpoint
+from anomaly import AnomalyDetector
+from timeseries import TimeSeriesStore
+from flowcontrol import AGGREGATABLE, ALERT, READING, FlowController, parse_shed_policy
+from encoding import RAW_FULL, RAW_MODES, RAW_NONE, BodyEncoder, strip_raw_data
+from checksum import ChecksumVerifier, DEFAULT_ALGORITHM, calculate_checksum, resolve_algorithm
+from logger import PacketSampler, log_packet, setup_logging, shutdown_logging
+import metrics
+from metrics import CHECKSUM_FAILED, MESSAGES_RECEIVED, SEQ_DUPLICATES, SEQ_REPLAYS, STAGE_SECONDS, UNKNOWN_DEVICE
+from seqtrack import DUPLICATE, REPLAY, SequenceTracker
 
 # ==================== CONFIGURATION ====================
-BACKEND_URL = "https://iot.theman.vn"  # Production
+# Log: LOG_LEVEL=DEBUG để xem từng gói tin; LOG_FORMAT = console (màu) | plain | json
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "console")
+LOG_PACKET_SAMPLE = int(os.getenv("LOG_PACKET_SAMPLE", 1))  # chỉ log chi tiết 1/N gói
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+
+BACKEND_URL = os.getenv("BACKEND_URL", "https://iot.theman.vn")  # Production
 # BACKEND_URL = "http://localhost:8080"  # Local test
 
 # MQTT_BROKER = "localhost"
@@ -25,40 +48,154 @@ BACKEND_URL = "https://iot.theman.vn"  # Production
 MQTT_BROKER = os.getenv("MQTT_BROKER", "mosquitto")
 MQTT_PORT = int(os.getenv("MQTT_PORT", 1883))
 MQTT_TOPIC_IN = "iot/sensor/#"
+# Chạy nhiều instance chia tải (xem supervisor.py): MQTT 5 shared subscription $share/<group>/iot/sensor/#
+MQTT_SHARE_GROUP = os.getenv("MQTT_SHARE_GROUP", "").strip()
+MQTT_SUBSCRIPTION = f"$share/{MQTT_SHARE_GROUP}/{MQTT_TOPIC_IN}" if MQTT_SHARE_GROUP else MQTT_TOPIC_IN
+# Số thứ tự instance (supervisor đặt 0..N-1) → hậu tố của GATEWAY_UID và MQTT client id
+GATEWAY_INSTANCE = os.getenv("GATEWAY_INSTANCE", "").strip()
 MQTT_TOPIC_OUT = "iot/response"
+# QoS subscribe (1 → broker giữ tin chưa ack khi gateway tạm dừng) + số tin QoS>0 broker gửi chưa cần ack
+# MQTT_MAX_INFLIGHT là Receive Maximum của MQTT 5; MQTT 3.1.1 dùng max_inflight_messages trong mosquitto.conf
+MQTT_QOS = int(os.getenv("MQTT_QOS", 1))
+MQTT_MAX_INFLIGHT = int(os.getenv("MQTT_MAX_INFLIGHT", 100))
+MQTT_MAX_QUEUED = int(os.getenv("MQTT_MAX_QUEUED", 10000))  # chế độ asyncio: tin đã đọc từ socket chờ xử lý
 
 GATEWAY_UID = None
+BACKEND_HEADERS = {}  # header của response đăng ký → chọn định dạng / nén khi auto
 POLL_INTERVAL = 10
 
 API_REGISTER = f"{BACKEND_URL}/api/v1/test/devices/register"
 API_SENSOR_DATA = f"{BACKEND_URL}/api/v1/test/sensors/data"
 API_IDS_ALERT = f"{BACKEND_URL}/api/v1/test/ids-alerts"
+# Endpoint nhận mảng payload; để trống → mỗi gói vẫn POST riêng nhưng dùng chung kết nối keep-alive
+API_SENSOR_DATA_BATCH = os.getenv("API_SENSOR_DATA_BATCH", "").strip() or None
+
+# Uploader chạy nền (tách khỏi luồng mạng của paho)
+UPLOAD_QUEUE_SIZE = int(os.getenv("UPLOAD_QUEUE_SIZE", 1000))
+UPLOAD_BATCH_SIZE = int(os.getenv("UPLOAD_BATCH_SIZE", 20))
+UPLOAD_FLUSH_INTERVAL = float(os.getenv("UPLOAD_FLUSH_INTERVAL", 0.5))
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", 2))
+UPLOAD_TIMEOUT = float(os.getenv("UPLOAD_TIMEOUT", 15))
+UPLOAD_STATS_INTERVAL = float(os.getenv("UPLOAD_STATS_INTERVAL", 30))
+# Thu gọn payload (xem encoding.py): rawData full | dedup | none; định dạng / nén body: auto = theo backend
+RAW_DATA_MODE = os.getenv("RAW_DATA_MODE", RAW_FULL)
+UPLOAD_FORMAT = os.getenv("UPLOAD_FORMAT", "json")  # json | msgpack | cbor | auto
+UPLOAD_COMPRESSION = os.getenv("UPLOAD_COMPRESSION", "identity")  # identity | gzip | deflate | auto
+UPLOAD_COMPRESS_MIN = int(os.getenv("UPLOAD_COMPRESS_MIN", 256))  # body nhỏ hơn (byte) không nén
+
+# Gọi backend (xem backend_client.py): thử lại + backoff jitter, circuit breaker, timeout thích nghi
+BACKEND_RETRIES = int(os.getenv("BACKEND_RETRIES", 2))
+BACKEND_BACKOFF_BASE = float(os.getenv("BACKEND_BACKOFF_BASE", 0.5))
+BACKEND_BACKOFF_MAX = float(os.getenv("BACKEND_BACKOFF_MAX", 10))
+BACKEND_BREAKER_FAILURES = int(os.getenv("BACKEND_BREAKER_FAILURES", 5))  # lỗi liên tiếp → mạch open
+BACKEND_BREAKER_RESET = float(os.getenv("BACKEND_BREAKER_RESET", 30))  # giây open trước khi gửi thử
+BACKEND_ADAPTIVE_TIMEOUT = os.getenv("BACKEND_ADAPTIVE_TIMEOUT", "1") == "1"
+BACKEND_MIN_TIMEOUT = float(os.getenv("BACKEND_MIN_TIMEOUT", 1.0))
+# Tổng thời gian tối đa (giây) của một lần gửi kể cả thử lại, theo endpoint
+REGISTER_TIMEOUT = float(os.getenv("REGISTER_TIMEOUT", 10))
+REGISTER_BUDGET = float(os.getenv("REGISTER_BUDGET", 30))
+UPLOAD_BUDGET = float(os.getenv("UPLOAD_BUDGET", 30))
+ALERT_TIMEOUT = float(os.getenv("ALERT_TIMEOUT", 10))
+ALERT_BUDGET = float(os.getenv("ALERT_BUDGET", 20))
+
+# Cảnh báo IDS: chống lặp theo (thiết bị, attackType), gửi theo lô ở nền
+API_IDS_ALERT_BATCH = os.getenv("API_IDS_ALERT_BATCH", "").strip() or None
+ALERT_WINDOW = float(os.getenv("ALERT_WINDOW", 60))
+ALERT_BATCH_SIZE = int(os.getenv("ALERT_BATCH_SIZE", 20))
+ALERT_FLUSH_INTERVAL = float(os.getenv("ALERT_FLUSH_INTERVAL", 1.0))
+
+# Store-and-forward trên đĩa: giữ mọi payload cho tới khi backend xác nhận
+SPOOL_ENABLED = os.getenv("SPOOL_ENABLED", "0") == "1"
+SPOOL_DIR = os.getenv("SPOOL_DIR", "spool")
+SPOOL_SEGMENT_BYTES = int(os.getenv("SPOOL_SEGMENT_BYTES", 8 * 1024 * 1024))
+SPOOL_MAX_BYTES = int(os.getenv("SPOOL_MAX_BYTES", 512 * 1024 * 1024))
+SPOOL_FSYNC = os.getenv("SPOOL_FSYNC", "interval")  # always | interval | never
+SPOOL_FSYNC_INTERVAL = float(os.getenv("SPOOL_FSYNC_INTERVAL", 1.0))
+SPOOL_REPLAY_RATE = float(os.getenv("SPOOL_REPLAY_RATE", 50))  # msg/s, 0 = không giới hạn
+
+# Bảng profile thiết bị (tự nạp lại khi file thay đổi)
+DEVICE_PROFILES_FILE = os.getenv("DEVICE_PROFILES_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "devices.json"))
+PROFILE_RELOAD_INTERVAL = float(os.getenv("PROFILE_RELOAD_INTERVAL", 5))
+
+# HTTP metrics (Prometheus text) – METRICS_PORT=0 để tắt
+METRICS_ADDR = os.getenv("METRICS_ADDR", "0.0.0.0")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9108))
+
+# Theo dõi seq_num: bỏ gói trùng, phát hiện replay (SEQ_WINDOW=0 để tắt)
+SEQ_WINDOW = int(os.getenv("SEQ_WINDOW", 256))
+SEQ_MAX_DEVICES = int(os.getenv("SEQ_MAX_DEVICES", 10000))
+SEQ_REPLAY_ALERT = os.getenv("SEQ_REPLAY_ALERT", "1") == "1"
+SEQ_RESTART_AFTER = int(os.getenv("SEQ_RESTART_AFTER", 5))  # gói bị từ chối liên tiếp (seq tăng) → coi là reset
+SEQ_RESTART_QUIET = float(os.getenv("SEQ_RESTART_QUIET", 10))  # ...và không nhận gói nào trong ngần ấy giây
+SEQ_RESTART_CONFIRM = int(os.getenv("SEQ_RESTART_CONFIRM", 3))  # gói có uptime khớp lần boot mới trước khi reset
+
+# Gộp số đo theo cửa sổ trước khi upload (cấu hình theo loại cảm biến: mục "aggregation" trong devices.json)
+AGGREGATION_ENABLED = os.getenv("AGGREGATION_ENABLED", "0") == "1"
+AGGREGATION_MAX_SENSORS = int(os.getenv("AGGREGATION_MAX_SENSORS", 10000))
+AGGREGATION_FLUSH_INTERVAL = float(os.getenv("AGGREGATION_FLUSH_INTERVAL", 1.0))
+
+# Phát hiện bất thường theo luồng (spike / stuck / rate) cho các trường khai báo "anomaly" trong devices.json
+ANOMALY_ENABLED = os.getenv("ANOMALY_ENABLED", "1") == "1"
+ANOMALY_MAX_SENSORS = int(os.getenv("ANOMALY_MAX_SENSORS", 30000))
+
+# Lịch sử số đo tại gateway (xem timeseries.py): HTTP /ts/<op> trên cổng metrics,
+# MQTT iot/gateway/<GATEWAY_UID>/ts/<op> với tham số JSON, trả lời lên MQTT_TOPIC_OUT (hoặc reply_to bên dưới nó)
+TIMESERIES_ENABLED = os.getenv("TIMESERIES_ENABLED", "1") == "1"
+TIMESERIES_POINTS = int(os.getenv("TIMESERIES_POINTS", 1200))  # mẫu/cảm biến (~1 giờ với chu kỳ 3s)
+TIMESERIES_MAX_BYTES = int(os.getenv("TIMESERIES_MAX_BYTES", 32 * 1024 * 1024))
+TIMESERIES_IDLE = float(os.getenv("TIMESERIES_IDLE", 600))  # giây im lặng trước khi cảm biến bị thu hồi khi hết bộ nhớ
+TIMESERIES_MQTT = os.getenv("TIMESERIES_MQTT", "1") == "1"
+
+# Backpressure (xem flowcontrol.py): đầy ≥ HIGH → tạm dừng nhận MQTT, ≤ LOW → nhận lại; shed theo loại dữ liệu
+FLOW_CONTROL_ENABLED = os.getenv("FLOW_CONTROL_ENABLED", "1") == "1"
+FLOW_HIGH_WATERMARK = float(os.getenv("FLOW_HIGH_WATERMARK", 0.8))
+FLOW_LOW_WATERMARK = float(os.getenv("FLOW_LOW_WATERMARK", 0.5))
+FLOW_MAX_PAUSE = float(os.getenv("FLOW_MAX_PAUSE", 30))  # < keepalive MQTT (60s)
+FLOW_SHED_POLICY = os.getenv("FLOW_SHED_POLICY", "aggregatable:0.85,reading:0.95")  # thêm alert:<mức> để bỏ cả cảnh báo
+
+# Pool worker xử lý tin nhắn (shard theo dev_id)
+DISPATCH_WORKERS = int(os.getenv("DISPATCH_WORKERS", 4))
+DISPATCH_QUEUE_SIZE = int(os.getenv("DISPATCH_QUEUE_SIZE", 1000))
 
 # ==================== GLOBAL STATE ====================
-packet_count = 0
-lock = threading.Lock()
-
-# ==================== CHỈ THÊM HÀM IN ĐẸP (KHÔNG ẢNH HƯỞNG GÌ KHÁC) ====================
-def print_packet(label, direction, seq, data):
-    arrow = "←" if direction == "RECV" else "→"
-    color = "\033[94m" if direction == "RECV" else "\033[92m"
-    reset = "\033[0m"
-    json_str = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
-    print(f"{color}[{label}] {arrow} {direction} (seq={seq}): {json_str}{reset}")
+# packet_count nằm trong từng shard của dispatcher (dispatcher.packet_count())
+uploader = None
+dispatcher = None
+outbox = None  # uploader (chỉ bộ nhớ) hoặc spool (ghi đĩa trước rồi mới gửi)
+registry = None
+alerts = None
+aggregator = None
+flow = None
+verifier = ChecksumVerifier()
+packet_sampler = PacketSampler(LOG_PACKET_SAMPLE)
+seq_tracker = SequenceTracker(SEQ_WINDOW, SEQ_MAX_DEVICES, restart_after=SEQ_RESTART_AFTER, restart_quiet=SEQ_RESTART_QUIET,
+                              restart_confirm=SEQ_RESTART_CONFIRM) if SEQ_WINDOW > 0 else None
+anomaly_detector = AnomalyDetector(ANOMALY_MAX_SENSORS) if ANOMALY_ENABLED else None
+ts_store = TimeSeriesStore(TIMESERIES_POINTS, TIMESERIES_MAX_BYTES, idle=TIMESERIES_IDLE) if TIMESERIES_ENABLED else None
+
+log = logging.getLogger("gateway")
+
+# Child metric theo bước xử lý, cache sẵn để ghi nhận không phải tra nhãn
+_T_DECODE = STAGE_SECONDS.labels("decode")
+_T_VALIDATE = STAGE_SECONDS.labels("validate")
+_T_MAP = STAGE_SECONDS.labels("map")
+_T_ALERT = STAGE_SECONDS.labels("alert")
 
 # ==================== DEVICE REGISTRATION (GIỮ NGUYÊN 100%) ====================
 def register_gateway():
-    global GATEWAY_UID
-    print("\n" + "="*60)
-    print("GATEWAY REGISTRATION")
-    print("="*60)
+    global GATEWAY_UID, BACKEND_HEADERS
+    log.info("=" * 60)
+    log.info("GATEWAY REGISTRATION")
+    log.info("=" * 60)
 
     device_uid = os.getenv("GATEWAY_UID", "GATEWAY-001").strip()
+    if device_uid and GATEWAY_INSTANCE:
+        device_uid = f"{device_uid}-{GATEWAY_INSTANCE}"
     device_name = os.getenv("DEVICE_NAME", "IoT Multi-Sensor Gateway").strip()
     location = os.getenv("LOCATION", "Lab").strip()
 
     if not device_uid:
-        print("Device UID required! Set env var GATEWAY_UID.")
+        log.error("Device UID required! Set env var GATEWAY_UID.")
         return False
 
     payload = {
@@ -70,255 +207,484 @@ def register_gateway():
         "isGateway": True
     }
 
-    print(f"\nĐăng ký gateway: {device_uid}...")
-    try:
-        response = requests.post(API_REGISTER, json=payload, timeout=10, verify=False)
-        if response.status_code in [200, 201]:
-            print("Đăng ký thành công!")
-            GATEWAY_UID = device_uid
-            return True
-        else:
-            print(f"Đăng ký thất bại: {response.status_code} - {response.text[:200]}")
-            GATEWAY_UID = device_uid  # vẫn dùng để test
-            return True
-    except Exception as e:
-        print(f"Lỗi kết nối: {e} → vẫn dùng UID để test")
-        GATEWAY_UID = device_uid
+    log.info("Đăng ký gateway: %s...", device_uid)
+    responses = []
+
+    def send(timeout):
+        try:
+            responses.append(requests.post(API_REGISTER, json=payload, timeout=timeout, verify=False))
+            return responses[-1].status_code
+        except Exception as e:
+            log.warning("Lỗi kết nối: %s", e)
+            return None
+
+    backend_endpoint("register", REGISTER_TIMEOUT, REGISTER_BUDGET).call(send)
+    GATEWAY_UID = device_uid  # thất bại vẫn dùng UID để test
+    if not responses:
+        log.warning("Không kết nối được backend → vẫn dùng UID để test")
         return True
-
-# ==================== CHECKSUM (GIỮ NGUYÊN) ====================
-def calculate_checksum(data_dict):
-    clean_data = {k: v for k, v in data_dict.items() if k != "checksum"}
-    json_str = json.dumps(clean_data, separators=(',', ':'), ensure_ascii=False)
-    md5_hash = hashlib.md5(json_str.encode('utf-8')).hexdigest()
-    return int(md5_hash[:2], 16)
-
-def validate_checksum(data):
+    response = responses[-1]
+    BACKEND_HEADERS = response.headers
+    if response.status_code in [200, 201]:
+        log.info("Đăng ký thành công!")
+    else:
+        log.warning("Đăng ký thất bại: %s - %s", response.status_code, response.text[:200])
+    return True
+
+def backend_endpoint(name, timeout, budget):
+    return BackendEndpoint(name, timeout=timeout, min_timeout=BACKEND_MIN_TIMEOUT, retries=BACKEND_RETRIES,
+                           backoff_base=BACKEND_BACKOFF_BASE, backoff_max=BACKEND_BACKOFF_MAX, budget=budget,
+                           failure_threshold=BACKEND_BREAKER_FAILURES, reset_timeout=BACKEND_BREAKER_RESET,
+                           adaptive=BACKEND_ADAPTIVE_TIMEOUT)
+
+def register_backend_metrics():
+    metrics.Gauge("gateway_backend_circuit_state", "Circuit breaker theo endpoint: 0 closed / 1 half-open / 2 open",
+                  ["endpoint"], fn=backend_client.circuit_states)
+    metrics.Gauge("gateway_backend_timeout_seconds", "Timeout hiện tại (thích nghi) theo endpoint",
+                  ["endpoint"], fn=backend_client.current_timeouts)
+    metrics.Gauge("gateway_backend_rejected", "Request bị từ chối ngay vì mạch đang open", ["endpoint"],
+                  fn=backend_client.rejected_counts)
+
+# ==================== CHECKSUM (xem checksum.py) ====================
+def validate_checksum(data, raw=None, dev_id=None, profile=None, trace=False):
     received = data.get("checksum")
     if received is None:
         return False
-    calculated = calculate_checksum(data)
-    print(f"[CHECKSUM] Nhận: {received:3d}, Tính: {calculated:3d} → {'OK' if received == calculated else 'FAIL'}")
-    return received == calculated
+    allowed = profile.checksum_algorithms if profile else (DEFAULT_ALGORITHM,)
+    algorithm = resolve_algorithm(data, allowed)
+    if algorithm is None:
+        log.warning("[CHECKSUM] Thuật toán %s không được phép cho %s", data.get('checksum_alg'), dev_id)
+        return False
+    ok, calculated = verifier.verify(data, raw, dev_id, algorithm)
+    if trace:
+        log.debug("[CHECKSUM] Nhận: %3d, Tính: %3d → %s", received, calculated, 'OK' if ok else 'FAIL')
+    return ok
 
 # ==================== MQTT HANDLERS (CHỈ THÊM 2 DÒNG IN ĐẸP) ====================
 def on_connect(client, userdata, flags, rc, props=None):
-    print(f"\n[MQTT] Kết nối broker thành công!")
-    client.subscribe(MQTT_TOPIC_IN)
-    print(f"[MQTT] Đã subscribe: {MQTT_TOPIC_IN}/#")
+    log.info("[MQTT] Kết nối broker thành công!")
+    client.subscribe(MQTT_SUBSCRIPTION, qos=MQTT_QOS)
+    log.info("[MQTT] Đã subscribe: %s (QoS %d)", MQTT_SUBSCRIPTION, MQTT_QOS)
+    if ts_store is not None and TIMESERIES_MQTT:
+        client.subscribe(ts_query_topic())
+        log.info("[MQTT] Truy vấn lịch sử: %s", ts_query_topic())
 
 def on_message(client, userdata, msg):
-    global packet_count
-    print(f"\n[MQTT] ← {msg.topic}")
+    # Hàng đợi phía sau đầy → chặn tại đây (paho ngừng đọc socket, broker giữ tin) tới khi xả xuống ngưỡng thấp
+    if flow is not None:
+        flow.wait()
+    # Luồng paho chỉ chuyển tin nhắn sang worker, không decode/gửi HTTP tại đây
+    dispatcher.submit(msg.payload, msg.topic)
+
+def on_ts_query(client, userdata, msg):
+    # Truy vấn chỉ mất vài µs → trả lời ngay trên luồng paho, không qua dispatcher / flow control
+    reply_to, body = ts_query_message(msg.topic, msg.payload)
+    client.publish(reply_to, body)
+
+def process_message(raw_payload, topic):
+    """Chạy trên worker của dispatcher. Trả về True nếu gói hợp lệ."""
+    # Quyết định một lần cho cả gói: có log chi tiết gói này hay không (DEBUG + lấy mẫu 1/N)
+    trace = log.isEnabledFor(logging.DEBUG) and packet_sampler.sample()
+    if trace:
+        log.debug("[MQTT] ← %s", topic)
 
     try:
-        payload = msg.payload.decode('utf-8')
+        t0 = time.perf_counter()
+        payload = raw_payload.decode('utf-8')
         data = json.loads(payload)
         dev_id = data.get("dev_id")
+        t1 = time.perf_counter()
+        _T_DECODE.observe(t1 - t0)
 
         if not dev_id:
-            print("Thiếu dev_id → bỏ qua")
-            return
+            MESSAGES_RECEIVED.labels("").inc()
+            log.warning("Thiếu dev_id → bỏ qua (%s)", topic)
+            return False
+        MESSAGES_RECEIVED.labels(dev_id).inc()
 
-        # THÊM DÒNG NÀY: in gói tin nhận được đẹp như mẫu bạn đưa
-        print_packet(dev_id, "RECV", data.get("seq_num", "???"), data)
+        # In gói tin nhận được (chỉ serialize khi DEBUG đang bật)
+        if trace:
+            log_packet(log, dev_id, "RECV", data.get("seq_num", "???"), data)
 
-        # Kiểm tra checksum
-        if not validate_checksum(data):
-            print(f"Checksum lỗi từ {dev_id} → bỏ gói tin")
-            return
+        profile = registry.lookup(dev_id)
+
+        # Kiểm tra checksum (băm thẳng bytes gốc nếu thiết bị gửi JSON chuẩn)
+        ok = validate_checksum(data, raw_payload, dev_id, profile, trace)
+        _T_VALIDATE.observe(time.perf_counter() - t1)
+        if not ok:
+            CHECKSUM_FAILED.labels(dev_id).inc()
+            log.warning("Checksum lỗi từ %s → bỏ gói tin", dev_id)
+            return False
 
-        with lock:
-            packet_count += 1
+        if trace:
+            log.debug("Đã nhận từ %s | Seq: %s | RSSI: %s dBm", dev_id, data.get('seq_num'), data.get('rssi'))
 
-        print(f"Đã nhận từ {dev_id} | Seq: {data.get('seq_num')} | RSSI: {data.get('rssi')} dBm")
+        # Bỏ gói trùng / replay trước khi tốn công gửi backend
+        if seq_tracker is not None and not check_sequence(data, dev_id):
+            return False
 
         # Gửi lên backend (giữ nguyên hoàn toàn)
-        send_to_backend(data, dev_id)
+        send_to_backend(data, dev_id, profile, trace)
+        return True
 
     except Exception as e:
-        print(f"Lỗi xử lý tin nhắn: {e}")
+        log.error("Lỗi xử lý tin nhắn: %s", e)
+        return False
 
-# ==================== GỬI DỮ LIỆU LÊN BACKEND (CHỈ THÊM rawData + in đẹp + check response) ====================
-def send_to_backend(data, dev_id):
-    timestamp_ms = int(time.time() * 1000)
-    sensors = []
-
-    # === Xử lý từng loại cảm biến theo dev_id (GIỮ NGUYÊN HOÀN TOÀN CODE CỦA BẠN) ===
-    if dev_id == "esp32_multi1":
-        temp = data.get("temperature")
-        hum = data.get("humidity")
-        rain = data.get("rain_status")
-
-        if temp is not None and temp > -999:
-            sensors.append({
-                "sensorUid": f"{dev_id}_dht_temp",
-                "type": "TEMPERATURE",
-                "data": {"temperature": round(temp, 1)}
-            })
-        if hum is not None and hum > -999:
-            sensors.append({
-                "sensorUid": f"{dev_id}_dht_hum",
-                "type": "HUMIDITY",
-                "data": {"humidity": round(hum, 1)}
-            })
-        if rain is not None:
-            sensors.append({
-                "sensorUid": f"{dev_id}_rain",
-                "type": "RAIN",
-                "data": {"rain_detected": bool(rain)}  # 1 = có mưa
-            })
-
-        # Cảnh báo
-        if temp > 35:
-            send_ids_alert("IOT_DATA_MANIPULATION", f"Nhiệt độ cao bất thường: {temp}°C từ {dev_id}", 80, data.get("seq_num", 0))
-        if hum > 90:
-            send_ids_alert("IOT_DATA_MANIPULATION", f"Độ ẩm cực cao: {hum}% từ {dev_id}", 70, data.get("seq_num", 0))
-
-    elif dev_id == "esp32_multi2":
-        gas = data.get("gas_level")
-        light = data.get("light_level")
-
-        if gas is not None:
-            sensors.append({
-                "sensorUid": f"{dev_id}_mq2",
-                "type": "GAS_LPG",
-                "data": {"gas_level": int(gas)}
-            })
-        if light is not None:
-            sensors.append({
-                "sensorUid": f"{dev_id}_ldr",
-                "type": "LIGHT",
-                "data": {"light_level": int(light)}
-            })
-
-        if gas is not None and gas > 2000:
-            send_ids_alert("IOT_DEVICE_HIJACKING", f"Khí gas nguy hiểm: {gas} từ {dev_id}", 95, data.get("seq_num", 0))
-
-    elif dev_id == "esp32_multi3":
-        temp = data.get("temperature")
-        hum = data.get("humidity")
-        gas = data.get("gas_level")
-
-        if temp is not None and temp > -999:
-            sensors.append({
-                "sensorUid": f"{dev_id}_dht_temp",
-                "type": "TEMPERATURE",
-                "data": {"temperature": round(temp, 1)}
-            })
-        if hum is not None and hum > -999:
-            sensors.append({
-                "sensorUid": f"{dev_id}_dht_hum",
-                "type": "HUMIDITY",
-                "data": {"humidity": round(hum, 1)}
-            })
-        if gas is not None:
-            sensors.append({
-                "sensorUid": f"{dev_id}_mq2",
-                "type": "GAS_LPG",
-                "data": {"gas_level": int(gas)}
-            })
-
-        if temp is not None and temp > 35:
-            send_ids_alert("IOT_DATA_MANIPULATION", f"Nhiệt độ cao: {temp}°C từ {dev_id}", 85, data.get("seq_num", 0))
-        if gas is not None and gas > 2000:
-            send_ids_alert("IOT_DEVICE_HIJACKING", f"Nồng độ gas nguy hiểm: {gas} từ {dev_id}", 95, data.get("seq_num", 0))
+def check_sequence(data, dev_id):
+    """Trả về False nếu gói phải bỏ (trùng seq_num hoặc replay)."""
+    seq = data.get("seq_num")
+    if not isinstance(seq, int):
+        return True
+    verdict = seq_tracker.check(dev_id, seq, data.get("timestamp"))
+    if verdict == DUPLICATE:
+        SEQ_DUPLICATES.labels(dev_id).inc()
+        log.info("[SEQ] Gói trùng từ %s (seq=%d) → bỏ", dev_id, seq)
+        return False
+    if verdict == REPLAY:
+        SEQ_REPLAYS.labels(dev_id).inc()
+        log.warning("[SEQ] seq=%d từ %s cũ hơn cửa sổ %d gói → nghi replay, bỏ", seq, dev_id, SEQ_WINDOW)
+        if SEQ_REPLAY_ALERT:
+            send_ids_alert("IOT_REPLAY_ATTACK", f"Gói phát lại (seq={seq}) từ {dev_id}", 75, seq, dev_id, seq)
+        return False
+    return True
 
-    else:
-        print(f"Device không xác định: {dev_id} → bỏ qua")
+def _seq_stats_route(query):
+    return 200, "application/json; charset=utf-8", json.dumps(seq_tracker.stats(), ensure_ascii=False)
+
+# ==================== GỬI DỮ LIỆU LÊN BACKEND (CHỈ THÊM rawData + in đẹp + check response) ====================
+def send_to_backend(data, dev_id, profile=None, trace=False):
+    # === Tra profile theo dev_id (devices.json) rồi trích xuất cảm biến + kiểm tra cảnh báo ===
+    if profile is None:
+        profile = registry.lookup(dev_id)
+    if profile is None:
+        UNKNOWN_DEVICE.labels(dev_id).inc()
+        log.warning("Device không xác định: %s → bỏ qua", dev_id)
         return
 
+    t0 = time.perf_counter()
+    sensors = profile.extract(data, dev_id)
+    t1 = time.perf_counter()
+    _T_MAP.observe(t1 - t0)
+
+    # Lịch sử cục bộ giữ mọi số đo gốc, kể cả khi upload bị gộp cửa sổ hoặc bị shed
+    if ts_store is not None and sensors:
+        ts_store.record(dev_id, sensors)
+
+    # Cảnh báo: luật ngưỡng cố định + bất thường so với lịch sử của chính cảm biến đó
+    for attack_type, description, severity, value in profile.check_alerts(data, dev_id):
+        send_ids_alert(attack_type, description, severity, data.get("seq_num", 0), dev_id, value)
+    if anomaly_detector is not None and profile.anomaly:
+        check_anomalies(data, dev_id, profile)
+    _T_ALERT.observe(time.perf_counter() - t1)
+
     if not sensors:
-        print(f"Không có dữ liệu cảm biến hợp lệ từ {dev_id}")
+        log.info("Không có dữ liệu cảm biến hợp lệ từ %s", dev_id)
         return
 
-    # Payload gửi lên backend – THÊM rawData để gửi đầy đủ
+    # Hàng đợi upload gần đầy: bỏ bớt số đo theo chính sách (sau khi đã kiểm tra cảnh báo trên gói đầy đủ)
+    if flow is not None:
+        sensors = shed_sensors(sensors)
+        if not sensors:
+            return
+
+    # Gộp theo cửa sổ: chỉ gửi cảm biến không gộp + cửa sổ vừa đóng (cảnh báo ở trên đã chạy trên giá trị gốc)
+    if aggregator is not None:
+        sensors = aggregator.add(dev_id, sensors, data)
+        if not sensors:
+            return
+
+    submit_sensors(dev_id, sensors, data, trace, profile)
+
+def shed_sensors(sensors):
+    """Bỏ số đo gộp được trước (cửa sổ gộp vẫn đóng, chỉ ít mẫu hơn), hàng đợi đầy thêm mới bỏ cả gói."""
+    # Không bật gộp cửa sổ → không có số đo nào "gộp được", mọi số đo chỉ bị bỏ theo ngưỡng READING
+    if aggregator is not None and flow.shedding(AGGREGATABLE):
+        kept = [s for s in sensors if registry.window_spec(s["type"]) is None]
+        flow.record_shed(AGGREGATABLE, len(sensors) - len(kept))
+        sensors = kept
+    if sensors and not flow.admit(READING, len(sensors)):
+        return []
+    return sensors
+
+def flow_controller():
+    """FlowController theo cấu hình FLOW_* (None nếu tắt); chính sách shed sai → dùng mặc định."""
+    if not FLOW_CONTROL_ENABLED:
+        return None
+    try:
+        shed = parse_shed_policy(FLOW_SHED_POLICY)
+    except ValueError as e:
+        log.error("[FLOW] FLOW_SHED_POLICY không hợp lệ (%s) → chỉ bỏ số đo gộp được / số đo thường", e)
+        shed = {AGGREGATABLE: 0.85, READING: 0.95}
+    flow = FlowController(FLOW_HIGH_WATERMARK, FLOW_LOW_WATERMARK, shed=shed, max_pause=FLOW_MAX_PAUSE)
+    log.info("[FLOW] Tạm dừng ở %.0f%%, nhận lại ở %.0f%% | shed %s", 100 * flow.high, 100 * flow.low,
+             ", ".join(f"{k}≥{100 * v:.0f}%" for k, v in shed.items()) or "tắt")
+    return flow
+
+def register_flow_metrics():
+    metrics.Gauge("gateway_queue_fill_ratio", "Độ đầy hàng đợi nội bộ (độ sâu / sức chứa)", ["queue"], fn=flow.fills)
+    metrics.Gauge("gateway_flow_control", "Backpressure: paused / fill / pauses / overruns / paused_seconds / shed_*",
+                  ["state"], fn=flow.stats)
+
+def ts_query_topic():
+    return f"iot/gateway/{GATEWAY_UID}/ts/+"
+
+def ts_query_message(topic, payload):
+    """Yêu cầu MQTT trên iot/gateway/<uid>/ts/<op> → (topic trả lời, body JSON)."""
+    op = topic.rsplit("/", 1)[-1]
+    try:
+        params = json.loads(payload) if payload else {}
+        if not isinstance(params, dict):
+            raise ValueError
+    except ValueError:
+        params = {}
+        status, result = 400, {"error": "payload phải là JSON object"}
+    else:
+        status, result = ts_store.query(op, params)
+    # Chỉ trả lời dưới MQTT_TOPIC_OUT: không để yêu cầu đẩy dữ liệu giả vào iot/sensor/#
+    reply_to = params.get("reply_to")
+    if not isinstance(reply_to, str) or not reply_to.startswith(MQTT_TOPIC_OUT + "/"):
+        reply_to = MQTT_TOPIC_OUT
+    body = {"op": op, "id": params.get("id"), "status": status, "result": result}
+    return reply_to, json.dumps(body, ensure_ascii=False)
+
+def _ts_route(op):
+    def route(query):
+        status, result = ts_store.query(op, {k: v[-1] for k, v in query.items()})
+        return status, "application/json; charset=utf-8", json.dumps(result, ensure_ascii=False)
+    return route
+
+def register_timeseries_metrics():
+    metrics.Gauge("gateway_timeseries", "Lịch sử số đo tại gateway: sensors / points / evicted / rejected / bytes",
+                  ["state"], fn=ts_store.stats)
+    for op in ("sensors", "latest", "range", "downsample"):
+        metrics.register_route(f"/ts/{op}", _ts_route(op))
+
+def mqtt_connect_properties():
+    """MQTT 5: Receive Maximum giới hạn số tin QoS>0 broker gửi khi gateway chưa ack."""
+    props = Properties(PacketTypes.CONNECT)
+    props.ReceiveMaximum = MQTT_MAX_INFLIGHT
+    return props
+
+def check_anomalies(data, dev_id, profile):
+    # Δt theo uptime của ESP32 (giây); gói không có timestamp → dùng đồng hồ gateway
+    t = data.get("timestamp")
+    if not isinstance(t, (int, float)) or isinstance(t, bool):
+        t = time.monotonic()
+    for attack_type, description, severity, value in anomaly_detector.check(dev_id, profile.anomaly, data, t):
+        log.warning("[ANOMALY] %s", description)
+        send_ids_alert(attack_type, description, severity, data.get("seq_num", 0), dev_id, value)
+
+def submit_sensors(dev_id, sensors, data, trace=False, profile=None):
+    """Đóng gói danh sách cảm biến của một thiết bị thành payload và đưa vào hàng đợi upload."""
+    # Payload gửi lên backend – THÊM rawData để gửi đầy đủ (RAW_DATA_MODE=dedup/none để thu gọn)
     payload = {
         "deviceUid": GATEWAY_UID,
-        "timestamp": timestamp_ms,
+        "timestamp": int(time.time() * 1000),
         "sensors": sensors,
         "sequenceNumber": data.get("seq_num", 0),
         "sourceIp": data.get("dev_ip", "unknown"),
         "rssi": data.get("rssi", 0),
         "rawData": data  # ← Dòng duy nhất thêm vào payload
     }
-
-    payload["checksum"] = calculate_checksum(payload)
-
-    # THÊM DÒNG IN ĐẸP CHO GÓI TIN GỬI LÊN
-    print_packet(f"GATEWAY→{dev_id}", "SENT", data.get("seq_num", 0), payload)
-
-    # GỬI VÀ KIỂM TRA RESPONSE CHI TIẾT (KHÔNG ẢNH HƯỞNG HÀM KHÁC)
-    try:
-        response = requests.post(API_SENSOR_DATA, json=payload, timeout=15, verify=False)
-
-        if response.status_code in [200, 201]:
-            print(f"{'':>10}\033[92m[SERVER] ĐÃ NHẬN THÀNH CÔNG\033[0m", end="")
-            try:
-                res = response.json()
-                anomaly = res.get("data", {}).get("anomalyDetected", False)
-                sid = res.get("data", {}).get("sensorDataId", "N/A")
-                print(f" | ID: {sid} | Anomaly: {anomaly}")
-            except:
-                print(" (không parse được JSON)")
+    if RAW_DATA_MODE != RAW_FULL:
+        if profile is None and RAW_DATA_MODE != RAW_NONE:
+            profile = registry.lookup(dev_id)
+        raw = strip_raw_data(data, RAW_DATA_MODE, profile.raw_duplicates if profile else ())
+        if raw is None:
+            del payload["rawData"]
         else:
-            print(f"{'':>10}\033[91m[SERVER] LỖI {response.status_code}\033[0m → {response.text[:150]}")
-
-    except requests.exceptions.Timeout:
-        print(f"{'':>10}\033[91m[SERVER] TIMEOUT\033[0m")
-    except Exception as e:
-        print(f"{'':>10}\033[91m[SERVER] LỖI: {e}\033[0m")
+            payload["rawData"] = raw
 
-# ==================== IDS ALERT (GIỮ NGUYÊN HOÀN TOÀN) ====================
-def send_ids_alert(attack_type, description, severity, seq_num):
-    alert_uid = str(uuid.uuid4())[:8]
-    payload = {
-        "deviceUid": GATEWAY_UID,
-        "alertUid": f"ALERT_{alert_uid}",
-        "attackType": attack_type,
-        "severity": severity,
-        "confidence": 0.92,
-        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime()),
-        "sequenceNumber": seq_num,
-        "signature": hashlib.md5(f"{GATEWAY_UID}{alert_uid}{seq_num}".encode()).hexdigest(),
-        "sourceIp": "192.168.4.x",
-        "ruleDescription": description
-    }
+    # Giữ checksum trên toàn payload (kể cả rawData): backend kiểm tra theo dạng JSON chuẩn của rawData,
+    # không thể ghép bytes MQTT gốc vào vì ESP32 có thể gửi khác dạng chuẩn (vd. 25.10 ↔ 25.1)
+    payload["checksum"] = calculate_checksum(payload)
 
-    print(f"[IDS] → Cảnh báo: {attack_type} - {description}")
-    try:
-        requests.post(API_IDS_ALERT, json=payload, timeout=10, verify=False)
-    except:
-        pass
+    # IN GÓI TIN GỬI LÊN (chỉ serialize khi DEBUG đang bật)
+    if trace:
+        log_packet(log, f"GATEWAY→{dev_id}", "SENT", data.get("seq_num", 0), payload)
+
+    # ĐƯA VÀO HÀNG ĐỢI UPLOAD – worker nền gửi và kiểm tra response, không chặn luồng MQTT
+    outbox.submit(payload)
+
+def upload_encoder():
+    """BodyEncoder cho dữ liệu cảm biến: theo cấu hình, auto → theo header backend trả về khi đăng ký."""
+    global RAW_DATA_MODE
+    if RAW_DATA_MODE not in RAW_MODES:
+        log.error("[ENCODING] RAW_DATA_MODE không hỗ trợ: %s → dùng %s", RAW_DATA_MODE, RAW_FULL)
+        RAW_DATA_MODE = RAW_FULL
+    encoder = BodyEncoder.negotiate(BACKEND_HEADERS, UPLOAD_FORMAT, UPLOAD_COMPRESSION,
+                                    min_size=UPLOAD_COMPRESS_MIN)
+    log.info("[ENCODING] rawData=%s | body %s", RAW_DATA_MODE, encoder)
+    return encoder
+
+def _payload_dev_id(payload):
+    raw = payload.get("rawData")
+    return raw.get("dev_id", "") if raw else ""
+
+# ==================== IDS ALERT (xem alerts.py) ====================
+def send_ids_alert(attack_type, description, severity, seq_num, dev_id=None, value=None):
+    # Không gửi trực tiếp: AlertManager gộp cảnh báo lặp lại và gửi theo lô ở nền
+    if flow is not None and not flow.admit(ALERT):
+        return
+    alerts.raise_alert(dev_id or GATEWAY_UID, attack_type, description, severity, seq_num, value)
 
 # ==================== MAIN (GIỮ NGUYÊN) ====================
 def main():
-    print("\n" + "="*70)
-    print("IOT GATEWAY - ĐA CẢM BIẾN (esp32_multi1/2/3 + Proxy MQTT)")
-    print("="*70)
+    setup_logging(LOG_LEVEL, LOG_FORMAT, LOG_QUEUE_SIZE)
+    log.info("=" * 70)
+    log.info("IOT GATEWAY - ĐA CẢM BIẾN (esp32_multi1/2/3 + Proxy MQTT)")
+    log.info("=" * 70)
 
     if not register_gateway():
+        shutdown_logging()
         return
 
-    client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
+    global registry
+    registry = DeviceRegistry(DEVICE_PROFILES_FILE, reload_interval=PROFILE_RELOAD_INTERVAL)
+    registry.start_watching()
+
+    global uploader
+    uploader = BackendUploader(
+        API_SENSOR_DATA,
+        batch_url=API_SENSOR_DATA_BATCH,
+        queue_size=UPLOAD_QUEUE_SIZE,
+        batch_size=UPLOAD_BATCH_SIZE,
+        flush_interval=UPLOAD_FLUSH_INTERVAL,
+        concurrency=UPLOAD_CONCURRENCY,
+        timeout=UPLOAD_TIMEOUT,
+        verify=False,
+        stats_interval=UPLOAD_STATS_INTERVAL,
+        label_fn=_payload_dev_id,
+        encoder=upload_encoder(),
+        endpoint=backend_endpoint("sensor_data", UPLOAD_TIMEOUT, UPLOAD_BUDGET),
+    )
+
+    global alerts
+    alert_sender = BackendUploader(
+        API_IDS_ALERT,
+        batch_url=API_IDS_ALERT_BATCH,
+        batch_size=ALERT_BATCH_SIZE,
+        flush_interval=ALERT_FLUSH_INTERVAL,
+        concurrency=1,
+        timeout=ALERT_TIMEOUT,
+        verify=False,
+        stats_interval=0,
+        name="IDS",
+        endpoint=backend_endpoint("ids_alerts", ALERT_TIMEOUT, ALERT_BUDGET),
+    )
+    alert_sender.start()
+    alerts = AlertManager(alert_sender, GATEWAY_UID, window=ALERT_WINDOW, flush_interval=ALERT_FLUSH_INTERVAL)
+    alerts.start()
+
+    global outbox
+    if SPOOL_ENABLED:
+        spool_log = SegmentLog(SPOOL_DIR, segment_bytes=SPOOL_SEGMENT_BYTES, max_bytes=SPOOL_MAX_BYTES,
+                               fsync=SPOOL_FSYNC, fsync_interval=SPOOL_FSYNC_INTERVAL)
+        outbox = StoreAndForward(spool_log, uploader.deliver, batch_size=UPLOAD_BATCH_SIZE,
+                                 replay_rate=SPOOL_REPLAY_RATE)
+    else:
+        outbox = uploader
+    outbox.start()
+
+    global aggregator
+    if AGGREGATION_ENABLED:
+        aggregator = Aggregator(registry.window_spec, submit_sensors, max_sensors=AGGREGATION_MAX_SENSORS,
+                                flush_interval=AGGREGATION_FLUSH_INTERVAL)
+        aggregator.start()
+
+    global dispatcher
+    dispatcher = ShardedDispatcher(process_message, num_workers=DISPATCH_WORKERS,
+                                   queue_size=DISPATCH_QUEUE_SIZE)
+    dispatcher.start()
+
+    global flow
+    flow = flow_controller()
+    if flow is not None:
+        for shard in dispatcher.shards:
+            flow.add_queue(f"dispatch_{shard.index}", shard.queue.qsize, shard.queue.maxsize)
+        flow.add_queue("upload", uploader.queue.qsize, uploader.queue.maxsize)
+        flow.add_queue("alerts", alert_sender.queue.qsize, alert_sender.queue.maxsize)
+        if SPOOL_ENABLED:
+            flow.add_queue("spool_bytes", outbox.log.pending, SPOOL_MAX_BYTES)
+
+    if METRICS_PORT:
+        for shard in dispatcher.shards:
+            metrics.register_queue(f"dispatch_{shard.index}", shard.queue.qsize)
+        metrics.register_queue("upload", uploader.queue.qsize)
+        metrics.register_queue("alerts", alert_sender.queue.qsize)
+        metrics.Gauge("gateway_ids_alerts", "Cảnh báo IDS: emitted / suppressed / summaries / open_windows",
+                      ["state"], fn=alerts.stats)
+        register_backend_metrics()
+        if flow is not None:
+            register_flow_metrics()
+        if ts_store is not None:
+            register_timeseries_metrics()
+        if SPOOL_ENABLED:
+            metrics.register_queue("spool_bytes", outbox.log.pending)
+        if anomaly_detector is not None:
+            metrics.Gauge("gateway_anomalies", "Bất thường phát hiện tại gateway: spike / stuck / rate / sensors",
+                          ["kind"], fn=anomaly_detector.stats)
+        if aggregator is not None:
+            metrics.Gauge("gateway_aggregator", "Gộp cửa sổ: samples / emitted / passthrough / evicted / open_windows",
+                          ["state"], fn=aggregator.stats)
+        if seq_tracker is not None:
+            metrics.Gauge("gateway_seq_loss_ratio", "Tỉ lệ mất gói theo seq_num", ["dev_id"],
+                          fn=lambda: {d: s["loss_rate"] for d, s in seq_tracker.stats().items()})
+            metrics.Gauge("gateway_seq_lost_packets", "Số gói mất theo seq_num", ["dev_id"],
+                          fn=lambda: {d: s["lost"] for d, s in seq_tracker.stats().items()})
+            metrics.register_route("/devices/seq", _seq_stats_route)
+        try:
+            metrics.start_http_server(METRICS_PORT, METRICS_ADDR)
+        except OSError as e:
+            log.error("[METRICS] Không mở được cổng %s: %s", METRICS_PORT, e)
+
+    if MQTT_SHARE_GROUP:
+        # Shared subscription cần MQTT 5; client id riêng cho từng instance
+        client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2,
+                             client_id=f"gateway-{GATEWAY_UID}", protocol=mqtt.MQTTv5)
+        properties = mqtt_connect_properties()
+    else:
+        client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
+        properties = None
     client.on_connect = on_connect
     client.on_message = on_message
+    if ts_store is not None and TIMESERIES_MQTT:
+        client.message_callback_add(ts_query_topic(), on_ts_query)
 
-    print(f"\nKết nối MQTT broker {MQTT_BROKER}:{MQTT_PORT}...")
+    log.info("Kết nối MQTT broker %s:%s...", MQTT_BROKER, MQTT_PORT)
     try:
-        client.connect(MQTT_BROKER, MQTT_PORT, keepalive=60)
+        client.connect(MQTT_BROKER, MQTT_PORT, keepalive=60, properties=properties)
     except Exception as e:
-        print(f"Không kết nối được broker: {e}")
+        log.error("Không kết nối được broker: %s", e)
+        dispatcher.stop()
+        if aggregator is not None:
+            aggregator.stop()
+        alerts.stop()
+        alert_sender.stop()
+        outbox.stop()
+        shutdown_logging()
         return
 
-    print("\nGateway đã chạy! Đang lắng nghe các ESP32...")
-    print("Nhấn Ctrl+C để dừng\n")
+    log.info("Gateway đã chạy! Đang lắng nghe các ESP32...")
+    log.info("Nhấn Ctrl+C để dừng")
 
     try:
         client.loop_forever()
     except KeyboardInterrupt:
-        print("\nDừng gateway. Tạm biệt!")
+        log.info("Dừng gateway. Tạm biệt!")
         client.disconnect()
+        dispatcher.stop()
+        if aggregator is not None:
+            aggregator.stop()
+        alerts.stop()
+        alert_sender.stop()
+        outbox.stop()
+        if flow is not None:
+            flow.print_stats()
+        log.info("Tổng số gói hợp lệ: %d", dispatcher.packet_count())
+        shutdown_logging()
 
 if __name__ == "__main__":
+    # Chế độ asyncio (aiomqtt + aiohttp): chạy python gateway_async.py
     main()
\ No newline at end of file
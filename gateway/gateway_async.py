@@ -0,0 +1,520 @@
+#!/usr/bin/env python3
+"""
+Gateway chế độ asyncio (python gateway_async.py) - một luồng, hàng nghìn upload đồng thời
+  - MQTT: aiomqtt, tự kết nối lại khi mất broker (như loop_forever của paho)
+  - HTTP: aiohttp, một ClientSession dùng chung, số request đang bay giới hạn bằng Semaphore
+  - Xử lý gói dùng lại nguyên process_message của gateway.py (checksum, profile, seq, cảnh báo)
+  - Backpressure: hàng đợi upload đầy → ngừng lấy tin từ aiomqtt; QoS 1 chỉ được ack sau khi xử lý xong nên
+    broker ngừng gửi khi cửa sổ inflight (MQTT_MAX_INFLIGHT) đầy. Hàng đợi của aiomqtt (MQTT_MAX_QUEUED) chỉ còn
+    có thể tràn với QoS 0 / MQTT_MAX_QUEUED < cửa sổ inflight; tin bị bỏ ở đó được đếm (shed_mqtt_incoming)
+  - SPOOL_ENABLED=1: ghi đĩa trên một thread riêng (giữ thứ tự), không chặn event loop
+  - Dừng (Ctrl+C / SIGTERM): ngừng nhận MQTT → gửi nốt hàng đợi → chờ các request đang bay
+"""
+import asyncio
+import concurrent.futures
+import logging
+import os
+import signal
+import threading
+import time
+
+try:
+    import aiohttp
+    import aiomqtt
+except ImportError:  # chế độ tùy chọn: chế độ thread không cần các gói này
+    aiohttp = aiomqtt = None
+
+import gateway
+import metrics
+from aggregator import Aggregator
+from alerts import AlertManager
+from device_profiles import DeviceRegistry
+from encoding import BodyEncoder
+from flowcontrol import MQTT_INCOMING
+from logger import setup_logging, shutdown_logging
+from metrics import BACKEND_RESPONSES, MESSAGES_UPLOADED, STAGE_SECONDS, UPLOAD_FAILED
+from spool import SegmentLog, StoreAndForward
+from uploader import UploaderStats
+
+# Số request HTTP tối đa đang bay cùng lúc (mỗi uploader)
+ASYNC_MAX_IN_FLIGHT = int(os.getenv("ASYNC_MAX_IN_FLIGHT", 1000))
+ASYNC_QUEUE_SIZE = int(os.getenv("ASYNC_QUEUE_SIZE", 20000))
+ASYNC_SHUTDOWN_TIMEOUT = float(os.getenv("ASYNC_SHUTDOWN_TIMEOUT", 15))
+MQTT_RECONNECT_DELAY = float(os.getenv("MQTT_RECONNECT_DELAY", 5))
+
+_STOP = object()
+
+# Client MQTT hiện tại (đổi mỗi lần kết nối lại) → metric số tin đã nhận chờ xử lý
+_mqtt = None
+
+log = logging.getLogger("gateway.async")
+
+
+class AsyncUploader:
+    """Tương đương BackendUploader nhưng chạy trên event loop: mỗi lô là một task, không có thread/request."""
+
+    def __init__(self, url, batch_url=None, queue_size=ASYNC_QUEUE_SIZE, batch_size=20,
+                 flush_interval=0.5, max_in_flight=ASYNC_MAX_IN_FLIGHT, timeout=15, verify=False,
+                 stats_interval=30, name="UPLOAD", label_fn=None, encoder=None, endpoint=None):
+        self.name = name
+        self.encoder = encoder or BodyEncoder()
+        self.endpoint = endpoint
+        self.label_fn = label_fn
+        self._upload_seconds = STAGE_SECONDS.labels(name.lower())
+        self.url = url
+        self.batch_url = batch_url
+        self.queue_size = queue_size
+        # Không có endpoint lô → mỗi payload một request, gửi song song thay vì gom lô
+        self.batch_size = max(1, batch_size) if batch_url else 1
+        self.flush_interval = flush_interval
+        self.max_in_flight = max(1, max_in_flight)
+        self.timeout = timeout
+        self.verify = verify
+        self.stats_interval = stats_interval
+        self.stats = UploaderStats()
+        self.queue = None
+        self._loop = None
+        self._loop_thread = None
+        self._session = None
+        self._sem = None
+        self._in_flight = set()
+        self._tasks = []
+
+    # ---------- API cho event loop (và các thread khác, vd. alert-flusher) ----------
+    def submit(self, payload):
+        """Không bao giờ chặn. Gọi từ thread khác → chuyển vào loop. Trả về False nếu hàng đợi đầy."""
+        if threading.get_ident() != self._loop_thread:
+            self._loop.call_soon_threadsafe(self._put, payload)
+            return True
+        return self._put(payload)
+
+    def _put(self, payload):
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            with self.stats.lock:
+                self.stats.dropped += 1
+            log.error("[%s] Hàng đợi đầy (%d) → bỏ gói seq=%s", self.name, self.queue_size, payload.get('sequenceNumber'))
+            return False
+        with self.stats.lock:
+            self.stats.enqueued += 1
+        return True
+
+    def qsize(self):
+        return self.queue.qsize() if self.queue is not None else 0
+
+    def in_flight(self):
+        return len(self._in_flight)
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self._sem = asyncio.Semaphore(self.max_in_flight)
+        connector = aiohttp.TCPConnector(limit=self.max_in_flight, ssl=None if self.verify else False)
+        self._session = aiohttp.ClientSession(connector=connector,
+                                              timeout=aiohttp.ClientTimeout(total=self.timeout))
+        self._tasks.append(asyncio.create_task(self._run(), name=f"{self.name.lower()}-batcher"))
+        if self.stats_interval:
+            self._tasks.append(asyncio.create_task(self._report_loop(), name=f"{self.name.lower()}-stats"))
+        log.info("[%s] asyncio | tối đa %d request đồng thời | batch=%d | queue=%d",
+                 self.name, self.max_in_flight, self.batch_size, self.queue_size)
+
+    async def stop(self, timeout=ASYNC_SHUTDOWN_TIMEOUT):
+        """Gửi nốt hàng đợi và chờ các request đang bay (tối đa timeout giây) rồi đóng session."""
+        deadline = self._loop.time() + timeout
+        await self.queue.put(_STOP)
+        batcher = self._tasks[0]
+        try:
+            await asyncio.wait_for(asyncio.shield(batcher), max(0.0, deadline - self._loop.time()))
+        except asyncio.TimeoutError:
+            log.warning("[%s] Hết thời gian chờ, còn %d gói trong hàng đợi", self.name, self.queue.qsize())
+        if self._in_flight:
+            await asyncio.wait(set(self._in_flight), timeout=max(0.0, deadline - self._loop.time()))
+        for task in self._tasks:
+            task.cancel()
+        for task in set(self._in_flight):
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._in_flight, return_exceptions=True)
+        await self._session.close()
+        self.print_stats()
+
+    # ---------- Gom lô + phát task ----------
+    async def _collect_batch(self):
+        first = await self.queue.get()
+        if first is _STOP:
+            return None
+        batch = [first]
+        deadline = self._loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                item = self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                remaining = deadline - self._loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            if item is _STOP:
+                # Gửi nốt lô hiện tại, lần gọi sau sẽ thấy _STOP
+                self.queue.put_nowait(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect_batch()
+            if batch is None:
+                return
+            await self._sem.acquire()
+            task = asyncio.ensure_future(self._send(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._done)
+
+    def _done(self, task):
+        self._in_flight.discard(task)
+        self._sem.release()
+
+    async def _send(self, batch):
+        if self.batch_url and len(batch) > 1:
+            return await self._post(self.batch_url, batch, len(batch))
+        return await self._post(self.url, batch[0], 1)
+
+    def deliver(self, batch):
+        """Gửi đồng bộ theo thứ tự cho spool (gọi từ thread của StoreAndForward, không phải từ loop)."""
+        return asyncio.run_coroutine_threadsafe(self._deliver(batch), self._loop).result()
+
+    async def _deliver(self, batch):
+        async with self._sem:
+            if self.batch_url and len(batch) > 1:
+                return len(batch) if self._is_final(await self._post(self.batch_url, batch, len(batch))) else 0
+            for i, payload in enumerate(batch):
+                if not self._is_final(await self._post(self.url, payload, 1)):
+                    return i
+            return len(batch)
+
+    @staticmethod
+    def _is_final(status):
+        if status is None:
+            return False
+        return status < 500 and status not in (408, 429)
+
+    async def _post(self, url, body, count):
+        """POST một payload hoặc một lô. Trả về status code, None nếu lỗi kết nối/timeout."""
+        t0 = time.perf_counter()
+        data, headers = self.encoder.encode(body)
+        if self.endpoint is None:
+            status = await self._request(url, data, headers, count, self.timeout)
+        else:
+            status = await self.endpoint.acall(lambda timeout: self._request(url, data, headers, count, timeout))
+        elapsed = time.perf_counter() - t0
+        ok = status in [200, 201]
+        self.stats.record(count, ok, elapsed)
+        self._record_metrics(body, count, status, ok, elapsed)
+        return status
+
+    async def _request(self, url, data, headers, count, timeout):
+        try:
+            async with self._session.post(url, data=data, headers=headers,
+                                          timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                await self._log_response(response, count)
+                return response.status
+        except asyncio.TimeoutError:
+            log.error("[SERVER] TIMEOUT %.1fs (%s, %d gói)", timeout, self.name, count)
+        except aiohttp.ClientError as e:
+            log.error("[SERVER] LỖI: %s", e)
+        return None
+
+    def _record_metrics(self, body, count, status, ok, elapsed):
+        self._upload_seconds.observe(elapsed)
+        BACKEND_RESPONSES.labels(self.name.lower(), str(status) if status is not None else "error").inc()
+        if self.label_fn is None:
+            return
+        counter = MESSAGES_UPLOADED if ok else UPLOAD_FAILED
+        for payload in (body if count > 1 else (body,)):
+            counter.labels(self.label_fn(payload)).inc()
+
+    async def _log_response(self, response, count):
+        if response.status not in [200, 201]:
+            text = await response.text()
+            log.error("[SERVER] LỖI %s → %s", response.status, text[:150])
+            return
+        if not log.isEnabledFor(logging.DEBUG):
+            return
+        if count > 1:
+            log.debug("[SERVER] ĐÃ NHẬN THÀNH CÔNG %d gói", count)
+            return
+        try:
+            res = await response.json(content_type=None)
+            anomaly = res.get("data", {}).get("anomalyDetected", False)
+            sid = res.get("data", {}).get("sensorDataId", "N/A")
+            log.debug("[SERVER] ĐÃ NHẬN THÀNH CÔNG | ID: %s | Anomaly: %s", sid, anomaly)
+        except Exception:
+            log.debug("[SERVER] ĐÃ NHẬN THÀNH CÔNG (không parse được JSON)")
+
+    # ---------- Thống kê ----------
+    def print_stats(self):
+        s = self.stats.snapshot()
+        log.info(f"[{self.name}] {s['msg_per_sec']:.1f} msg/s (TB {s['msg_per_sec_total']:.1f}) | "
+                 f"queue {self.qsize()}/{self.queue_size} | đang bay {self.in_flight()} | "
+                 f"lat avg {s['latency_avg_ms']:.0f}ms p50 {s['latency_p50_ms']:.0f}ms "
+                 f"p99 {s['latency_p99_ms']:.0f}ms max {s['latency_max_ms']:.0f}ms | "
+                 f"ok {s['sent']} fail {s['failed']} drop {s['dropped']}", extra={"uploader": self.name, **s})
+
+    async def _report_loop(self):
+        while True:
+            await asyncio.sleep(self.stats_interval)
+            self.print_stats()
+
+
+class SpoolOutbox:
+    """Bọc StoreAndForward: append (ghi file + fsync) chạy trên một thread riêng thay vì trên event loop."""
+
+    def __init__(self, spool):
+        self.spool = spool
+        self.log = spool.log
+        # Một thread duy nhất → payload được ghi đúng thứ tự nhận
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="spool-append")
+
+    def submit(self, payload):
+        self._executor.submit(self._append, payload)
+        return True
+
+    def _append(self, payload):
+        try:
+            self.spool.submit(payload)
+        except Exception as e:
+            log.error("[SPOOL] Không ghi được payload: %s", e)
+
+    def start(self):
+        self.spool.start()
+
+    def stop(self):
+        self._executor.shutdown(wait=True)
+        self.spool.stop()
+
+
+# ==================== MQTT ====================
+class _IncomingQueue(asyncio.Queue):
+    """Hàng đợi tin nhận của aiomqtt: khi đầy aiomqtt chỉ ghi log rồi bỏ tin → đếm vào flow control."""
+
+    def put_nowait(self, item):
+        try:
+            super().put_nowait(item)
+        except asyncio.QueueFull:
+            if gateway.flow is not None:
+                gateway.flow.record_shed(MQTT_INCOMING, 1)
+            raise
+
+
+def _mqtt_client():
+    if gateway.MQTT_SHARE_GROUP:
+        # Shared subscription cần MQTT 5; client id riêng cho từng instance
+        client = aiomqtt.Client(gateway.MQTT_BROKER, gateway.MQTT_PORT, keepalive=60,
+                                identifier=f"gateway-{gateway.GATEWAY_UID}", protocol=aiomqtt.ProtocolVersion.V5,
+                                max_queued_incoming_messages=gateway.MQTT_MAX_QUEUED, queue_type=_IncomingQueue,
+                                properties=gateway.mqtt_connect_properties())
+    else:
+        client = aiomqtt.Client(gateway.MQTT_BROKER, gateway.MQTT_PORT, keepalive=60,
+                                max_queued_incoming_messages=gateway.MQTT_MAX_QUEUED, queue_type=_IncomingQueue)
+    # paho mặc định ack QoS 1 ngay khi đưa tin vào hàng đợi của aiomqtt → tin bị bỏ khi hàng đợi đầy đã mất hẳn.
+    # Ack thủ công sau khi xử lý (như chế độ thread: paho ack sau khi on_message trả về); aiomqtt chưa có tùy chọn
+    # này nên bật trên client paho bên trong
+    client._client.manual_ack_set(True)
+    return client
+
+
+def _ack(client, message):
+    if message.qos > 0:
+        client._client.ack(message.mid, message.qos)
+
+
+def _mqtt_pending():
+    return len(_mqtt.messages) if _mqtt is not None else 0
+
+
+async def _mqtt_loop(counter):
+    """Nhận tin nhắn và xử lý ngay trên loop (thứ tự seq_num mỗi thiết bị được giữ nguyên)."""
+    global _mqtt
+    flow = gateway.flow
+    while True:
+        try:
+            async with _mqtt_client() as client:
+                _mqtt = client
+                log.info("[MQTT] Kết nối broker thành công!")
+                await client.subscribe(gateway.MQTT_SUBSCRIPTION, qos=gateway.MQTT_QOS)
+                log.info("[MQTT] Đã subscribe: %s (QoS %d)", gateway.MQTT_SUBSCRIPTION, gateway.MQTT_QOS)
+                ts_topic = None
+                if gateway.ts_store is not None and gateway.TIMESERIES_MQTT:
+                    ts_topic = gateway.ts_query_topic()
+                    await client.subscribe(ts_topic)
+                    log.info("[MQTT] Truy vấn lịch sử: %s", ts_topic)
+                async for message in client.messages:
+                    if ts_topic is not None and message.topic.matches(ts_topic):
+                        reply_to, body = gateway.ts_query_message(message.topic.value, message.payload)
+                        await client.publish(reply_to, body)
+                        _ack(client, message)
+                        continue
+                    # Hàng đợi upload đầy → chờ uploader xả; trong lúc chờ tin chưa được ack nên broker
+                    # ngừng gửi khi cửa sổ inflight đầy thay vì dồn vào hàng đợi của aiomqtt
+                    if flow is not None:
+                        await flow.wait_async()
+                    try:
+                        if gateway.process_message(message.payload, message.topic.value):
+                            counter[0] += 1
+                    finally:
+                        _ack(client, message)
+        except aiomqtt.MqttError as e:
+            log.error("[MQTT] Mất kết nối broker %s:%s (%s) → thử lại sau %.0fs",
+                      gateway.MQTT_BROKER, gateway.MQTT_PORT, e, MQTT_RECONNECT_DELAY)
+            await asyncio.sleep(MQTT_RECONNECT_DELAY)
+
+
+async def run():
+    loop = asyncio.get_running_loop()
+    stop_event = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:  # Windows
+            pass
+
+    gateway.registry = DeviceRegistry(gateway.DEVICE_PROFILES_FILE, reload_interval=gateway.PROFILE_RELOAD_INTERVAL)
+    gateway.registry.start_watching()
+
+    uploader = AsyncUploader(
+        gateway.API_SENSOR_DATA,
+        batch_url=gateway.API_SENSOR_DATA_BATCH,
+        batch_size=gateway.UPLOAD_BATCH_SIZE,
+        flush_interval=gateway.UPLOAD_FLUSH_INTERVAL,
+        timeout=gateway.UPLOAD_TIMEOUT,
+        verify=False,
+        stats_interval=gateway.UPLOAD_STATS_INTERVAL,
+        label_fn=gateway._payload_dev_id,
+        encoder=gateway.upload_encoder(),
+        endpoint=gateway.backend_endpoint("sensor_data", gateway.UPLOAD_TIMEOUT, gateway.UPLOAD_BUDGET),
+    )
+    await uploader.start()
+
+    alert_sender = AsyncUploader(
+        gateway.API_IDS_ALERT,
+        batch_url=gateway.API_IDS_ALERT_BATCH,
+        batch_size=gateway.ALERT_BATCH_SIZE,
+        flush_interval=gateway.ALERT_FLUSH_INTERVAL,
+        max_in_flight=4,
+        timeout=gateway.ALERT_TIMEOUT,
+        verify=False,
+        stats_interval=0,
+        name="IDS",
+        endpoint=gateway.backend_endpoint("ids_alerts", gateway.ALERT_TIMEOUT, gateway.ALERT_BUDGET),
+    )
+    await alert_sender.start()
+    gateway.alerts = AlertManager(alert_sender, gateway.GATEWAY_UID, window=gateway.ALERT_WINDOW,
+                                  flush_interval=gateway.ALERT_FLUSH_INTERVAL)
+    gateway.alerts.start()
+
+    if gateway.SPOOL_ENABLED:
+        spool_log = SegmentLog(gateway.SPOOL_DIR, segment_bytes=gateway.SPOOL_SEGMENT_BYTES,
+                               max_bytes=gateway.SPOOL_MAX_BYTES, fsync=gateway.SPOOL_FSYNC,
+                               fsync_interval=gateway.SPOOL_FSYNC_INTERVAL)
+        # Spool có thread riêng, gửi qua uploader.deliver (chờ kết quả từ loop)
+        gateway.outbox = SpoolOutbox(StoreAndForward(spool_log, uploader.deliver,
+                                                     batch_size=gateway.UPLOAD_BATCH_SIZE,
+                                                     replay_rate=gateway.SPOOL_REPLAY_RATE))
+        gateway.outbox.start()
+    else:
+        gateway.outbox = uploader
+
+    if gateway.AGGREGATION_ENABLED:
+        # Flusher của aggregator chạy trên thread riêng → submit vào uploader qua call_soon_threadsafe
+        gateway.aggregator = Aggregator(gateway.registry.window_spec, gateway.submit_sensors,
+                                        max_sensors=gateway.AGGREGATION_MAX_SENSORS,
+                                        flush_interval=gateway.AGGREGATION_FLUSH_INTERVAL)
+        gateway.aggregator.start()
+
+    # Chỉ tính hàng đợi sau điểm tạm dừng (hàng đợi của aiomqtt đứng trước → không dùng để quyết định)
+    if 0 < gateway.MQTT_MAX_QUEUED < gateway.MQTT_MAX_INFLIGHT:
+        log.warning("[MQTT] MQTT_MAX_QUEUED=%d < MQTT_MAX_INFLIGHT=%d → tin QoS 1 có thể bị bỏ khi hàng đợi nhận đầy",
+                    gateway.MQTT_MAX_QUEUED, gateway.MQTT_MAX_INFLIGHT)
+    gateway.flow = gateway.flow_controller()
+    if gateway.flow is not None:
+        gateway.flow.add_queue("upload", uploader.qsize, uploader.queue_size)
+        gateway.flow.add_queue("alerts", alert_sender.qsize, alert_sender.queue_size)
+        if gateway.SPOOL_ENABLED:
+            gateway.flow.add_queue("spool_bytes", gateway.outbox.log.pending, gateway.SPOOL_MAX_BYTES)
+
+    if gateway.METRICS_PORT:
+        metrics.register_queue("mqtt_incoming", _mqtt_pending)
+        metrics.register_queue("upload", uploader.qsize)
+        metrics.register_queue("upload_in_flight", uploader.in_flight)
+        metrics.register_queue("alerts", alert_sender.qsize)
+        metrics.Gauge("gateway_ids_alerts", "Cảnh báo IDS: emitted / suppressed / summaries / open_windows",
+                      ["state"], fn=gateway.alerts.stats)
+        gateway.register_backend_metrics()
+        if gateway.flow is not None:
+            gateway.register_flow_metrics()
+        if gateway.ts_store is not None:
+            gateway.register_timeseries_metrics()
+        if gateway.SPOOL_ENABLED:
+            metrics.register_queue("spool_bytes", gateway.outbox.log.pending)
+        if gateway.anomaly_detector is not None:
+            metrics.Gauge("gateway_anomalies", "Bất thường phát hiện tại gateway: spike / stuck / rate / sensors",
+                          ["kind"], fn=gateway.anomaly_detector.stats)
+        if gateway.aggregator is not None:
+            metrics.Gauge("gateway_aggregator", "Gộp cửa sổ: samples / emitted / passthrough / evicted / open_windows",
+                          ["state"], fn=gateway.aggregator.stats)
+        if gateway.seq_tracker is not None:
+            metrics.register_route("/devices/seq", gateway._seq_stats_route)
+        try:
+            metrics.start_http_server(gateway.METRICS_PORT, gateway.METRICS_ADDR)
+        except OSError as e:
+            log.error("[METRICS] Không mở được cổng %s: %s", gateway.METRICS_PORT, e)
+
+    counter = [0]
+    log.info("Kết nối MQTT broker %s:%s...", gateway.MQTT_BROKER, gateway.MQTT_PORT)
+    mqtt_task = asyncio.create_task(_mqtt_loop(counter), name="mqtt")
+    log.info("Gateway (asyncio) đã chạy! Nhấn Ctrl+C để dừng")
+
+    await stop_event.wait()
+    log.info("Dừng gateway: ngừng nhận MQTT, gửi nốt dữ liệu...")
+    mqtt_task.cancel()
+    await asyncio.gather(mqtt_task, return_exceptions=True)
+
+    if gateway.aggregator is not None:
+        await asyncio.to_thread(gateway.aggregator.stop)
+    # Cảnh báo tổng hợp cuối cùng được submit từ thread → chạy stop() ngoài loop
+    await asyncio.to_thread(gateway.alerts.stop)
+    await alert_sender.stop()
+    if gateway.SPOOL_ENABLED:
+        await asyncio.to_thread(gateway.outbox.stop)
+    await uploader.stop()
+    gateway.registry.stop_watching()
+    if gateway.flow is not None:
+        gateway.flow.print_stats()
+    log.info("Tổng số gói hợp lệ: %d", counter[0])
+
+
+def main():
+    setup_logging(gateway.LOG_LEVEL, gateway.LOG_FORMAT, gateway.LOG_QUEUE_SIZE)
+    if aiohttp is None:
+        log.error("Chế độ asyncio cần aiohttp và aiomqtt: pip install aiohttp aiomqtt")
+        shutdown_logging()
+        return
+    log.info("=" * 70)
+    log.info("IOT GATEWAY - ĐA CẢM BIẾN (chế độ asyncio)")
+    log.info("=" * 70)
+
+    if not gateway.register_gateway():
+        shutdown_logging()
+        return
+    try:
+        asyncio.run(run())
+    finally:
+        shutdown_logging()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Logger - Ghi log có cấp độ, có cấu trúc, không chặn luồng xử lý
+  - QueueHandler → QueueListener: luồng xử lý chỉ đẩy record vào hàng đợi, luồng nền mới format + ghi stdout
+  - Hàng đợi có giới hạn: đầy thì bỏ record (đếm lại), không bao giờ chặn
+  - LazyJson: payload chỉ được json.dumps khi record thực sự được ghi
+  - PacketSampler: chỉ log chi tiết 1/N gói tin ở mức DEBUG
+  - Sink: console (màu như print_packet cũ) | plain | json
+"""
+import itertools
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+
+RECV_COLOR = "\033[94m"
+SENT_COLOR = "\033[92m"
+RESET = "\033[0m"
+LEVEL_COLORS = {
+    logging.WARNING: "\033[93m",
+    logging.ERROR: "\033[91m",
+    logging.CRITICAL: "\033[91m",
+}
+
+_listener = None
+_handler = None
+
+
+class LazyJson:
+    """Chỉ serialize khi được format (tức là khi cấp log đang bật)."""
+    __slots__ = ("obj",)
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __str__(self):
+        return json.dumps(self.obj, ensure_ascii=False, separators=(',', ':'))
+
+
+class PacketSampler:
+    """Cho qua 1 trên mỗi n lần gọi (n <= 1 → cho qua tất cả)."""
+
+    def __init__(self, n=1):
+        self.n = max(1, int(n))
+        self._counter = itertools.count()
+
+    def sample(self):
+        return self.n == 1 or next(self._counter) % self.n == 0
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Không format trên luồng gọi, không chặn khi hàng đợi đầy."""
+
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Format ở luồng listener; payload trong args không bị sửa sau khi log
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _DrainingQueueListener(logging.handlers.QueueListener):
+    """stop() không bao giờ kẹt: hàng đợi vẫn đầy lúc thoát thì bỏ record cũ nhất để chỗ cho sentinel."""
+
+    def enqueue_sentinel(self):
+        while True:
+            try:
+                self.queue.put(self._sentinel, timeout=0.1)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    if _handler is not None:
+                        _handler.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def stop(self, timeout=None):
+        self.enqueue_sentinel()
+        self._thread.join(timeout)
+        self._thread = None
+
+
+class ConsoleFormatter(logging.Formatter):
+    """Giữ nguyên dạng hiển thị cũ: dòng gói tin tô màu theo chiều RECV/SENT, lỗi màu đỏ."""
+
+    def __init__(self, color=True):
+        super().__init__()
+        self.color = color
+
+    def format(self, record):
+        direction = getattr(record, "direction", None)
+        if direction is not None:
+            arrow = "←" if direction == "RECV" else "→"
+            line = f"[{record.label}] {arrow} {direction} (seq={record.seq}): {record.payload}"
+            color = RECV_COLOR if direction == "RECV" else SENT_COLOR
+        else:
+            line = record.getMessage()
+            color = LEVEL_COLORS.get(record.levelno)
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        if self.color and color:
+            return f"{color}{line}{RESET}"
+        return line
+
+
+class PlainFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s: %(message)s")
+
+    def format(self, record):
+        if getattr(record, "direction", None) is not None:
+            record.msg = f"[{record.label}] {record.direction} (seq={record.seq}): {record.payload}"
+            record.args = None
+        return super().format(record)
+
+
+# Các thuộc tính mặc định của LogRecord; phần còn lại là trường có cấu trúc truyền qua extra=
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        doc = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED:
+                doc[key] = value.obj if isinstance(value, LazyJson) else value
+        if record.exc_info:
+            doc["exc"] = self.formatException(record.exc_info)
+        return json.dumps(doc, ensure_ascii=False, default=str)
+
+
+def setup_logging(level="INFO", fmt="console", queue_size=10000):
+    """Cấu hình logger "gateway" một lần khi khởi động."""
+    global _listener, _handler
+    if fmt == "json":
+        formatter = JsonFormatter()
+    elif fmt == "plain":
+        formatter = PlainFormatter()
+    else:
+        formatter = ConsoleFormatter(color=(fmt == "console"))
+    sink = logging.StreamHandler(sys.stdout)
+    sink.setFormatter(formatter)
+
+    q = queue.Queue(maxsize=queue_size)
+    _handler = _DroppingQueueHandler(q)
+    root = logging.getLogger("gateway")
+    root.handlers[:] = [_handler]
+    root.setLevel(getattr(logging, str(level).upper(), logging.INFO))
+    root.propagate = False
+
+    _listener = _DrainingQueueListener(q, sink, respect_handler_level=False)
+    _listener.start()
+    return root
+
+
+def shutdown_logging(timeout=2.0):
+    """Ghi nốt các record còn trong hàng đợi (tối đa timeout giây) rồi dừng listener; quá hạn thì bỏ phần còn lại."""
+    global _listener
+    if _listener is None:
+        return
+    deadline = time.time() + timeout
+    while not _listener.queue.empty() and time.time() < deadline:
+        time.sleep(0.01)
+    _listener.stop(timeout=max(0.0, deadline - time.time()) + 1.0)
+    _listener = None
+
+
+def dropped_records():
+    return _handler.dropped if _handler else 0
+
+
+def log_packet(logger, label, direction, seq, data):
+    """Thay cho print_packet: payload chỉ được serialize nếu DEBUG đang bật."""
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("%s %s seq=%s", label, direction, seq,
+                     extra={"label": label, "direction": direction, "seq": seq, "payload": LazyJson(data)})
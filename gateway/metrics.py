@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Metrics - Counter / Gauge / Histogram tối giản, xuất định dạng Prometheus text qua HTTP
+  - Ghi nhận rẻ (< 1 µs): child theo nhãn được cache, inc() chỉ là một phép cộng, không lock
+    (mỗi dev_id chỉ do một worker shard ghi; sai lệch hiếm hoi do GIL chấp nhận được cho metric)
+  - Histogram bucket cố định, observe() = bisect + 2 phép cộng
+  - Giới hạn số tổ hợp nhãn mỗi metric; vượt quá → dồn vào nhãn "__other__"
+  - HTTP server nhúng: GET /metrics, có thể đăng ký thêm route (register_route)
+"""
+import bisect
+import http.server
+import logging
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+log = logging.getLogger("gateway.metrics")
+
+DEFAULT_MAX_CHILDREN = 1000
+OVERFLOW_LABEL = "__other__"
+# 50µs → 30s: đủ cho cả bước decode (µs) lẫn upload HTTP (giây)
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_metrics = []
+_routes = {}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _label_str(names, values, extra=""):
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt(value):
+    if isinstance(value, float):
+        if value == float("inf"):
+            return "+Inf"
+        return repr(value)
+    return str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labelnames=(), max_children=DEFAULT_MAX_CHILDREN, register=True):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.max_children = max_children
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self._new_child()
+            self._children[()] = self._default
+        if register:
+            _metrics.append(self)
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is not None:
+            return child
+        with self._lock:
+            child = self._children.get(values)
+            if child is None:
+                if len(self._children) >= self.max_children:
+                    values = (OVERFLOW_LABEL,) * len(self.labelnames)
+                    child = self._children.get(values)
+                if child is None:
+                    child = self._new_child()
+                    self._children[values] = child
+            return child
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default.value += amount
+
+    def render(self):
+        lines = self.header()
+        for values, child in list(self._children.items()):
+            lines.append(f"{self.name}{_label_str(self.labelnames, values)} {_fmt(child.value)}")
+        return lines
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labelnames=(), fn=None, **kwargs):
+        """fn (tùy chọn): hàm trả về giá trị, hoặc dict {nhãn hoặc tuple nhãn: giá trị}, đọc lúc scrape."""
+        self.fn = fn
+        super().__init__(name, help_text, labelnames, **kwargs)
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._default.value = value
+
+    def render(self):
+        lines = self.header()
+        if self.fn is not None:
+            try:
+                result = self.fn()
+            except Exception as e:
+                log.debug("Gauge %s lỗi: %s", self.name, e)
+                return lines
+            if isinstance(result, dict):
+                for key, value in result.items():
+                    values = key if isinstance(key, tuple) else (key,)
+                    lines.append(f"{self.name}{_label_str(self.labelnames, values)} {_fmt(value)}")
+            else:
+                lines.append(f"{self.name} {_fmt(result)}")
+            return lines
+        for values, child in list(self._children.items()):
+            lines.append(f"{self.name}{_label_str(self.labelnames, values)} {_fmt(child.value)}")
+        return lines
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def time(self):
+        return _Timer(self)
+
+
+class _Timer:
+    __slots__ = ("child", "start")
+
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.start)
+        return False
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS, **kwargs):
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, help_text, labelnames, **kwargs)
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def render(self):
+        lines = self.header()
+        for values, child in list(self._children.items()):
+            cumulative = 0
+            counts = list(child.counts)
+            for bound, count in zip(self.bounds + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + _fmt(float(bound)) + '"'
+                lines.append(f"{self.name}_bucket{_label_str(self.labelnames, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_str(self.labelnames, values)} {_fmt(child.sum)}")
+            lines.append(f"{self.name}_count{_label_str(self.labelnames, values)} {cumulative}")
+        return lines
+
+
+def render_all():
+    lines = []
+    for metric in list(_metrics):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ==================== HTTP SERVER ====================
+def register_route(path, handler):
+    """handler(query_dict) -> (status, content_type, body_str)."""
+    _routes[path] = handler
+
+
+def _metrics_route(query):
+    return 200, "text/plain; version=0.0.4; charset=utf-8", render_all()
+
+
+_routes["/metrics"] = _metrics_route
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        handler = _routes.get(url.path)
+        if handler is None:
+            status, ctype, body = 404, "text/plain; charset=utf-8", "not found\n"
+        else:
+            try:
+                status, ctype, body = handler(parse_qs(url.query))
+            except Exception as e:
+                status, ctype, body = 500, "text/plain; charset=utf-8", f"error: {e}\n"
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, fmt, *args):
+        log.debug("[METRICS] %s - %s", self.address_string(), fmt % args)
+
+
+def start_http_server(port, addr="0.0.0.0"):
+    server = http.server.ThreadingHTTPServer((addr, port), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    log.info("[METRICS] Phục vụ http://%s:%d/metrics", addr, server.server_address[1])
+    return server
+
+
+# ==================== METRIC CỦA GATEWAY ====================
+_queue_fns = {}
+
+
+def register_queue(name, fn):
+    """Đăng ký hàm trả về độ sâu hiện tại của một hàng đợi (đọc lúc scrape)."""
+    _queue_fns[name] = fn
+
+
+MESSAGES_RECEIVED = Counter("gateway_messages_received_total", "Gói MQTT đã decode được, theo thiết bị", ["dev_id"])
+CHECKSUM_FAILED = Counter("gateway_checksum_failed_total", "Gói bị bỏ do sai checksum", ["dev_id"])
+UNKNOWN_DEVICE = Counter("gateway_unknown_device_total", "Gói từ dev_id không khớp profile nào", ["dev_id"])
+MESSAGES_UPLOADED = Counter("gateway_messages_uploaded_total", "Payload backend đã nhận (2xx)", ["dev_id"])
+UPLOAD_FAILED = Counter("gateway_messages_upload_failed_total", "Payload gửi backend thất bại", ["dev_id"])
+STAGE_SECONDS = Histogram("gateway_stage_seconds", "Độ trễ từng bước xử lý", ["stage"])
+BACKEND_RESPONSES = Counter("gateway_backend_http_responses_total", "Response HTTP từ backend",
+                            ["endpoint", "status"])
+QUEUE_DEPTH = Gauge("gateway_queue_depth", "Độ sâu hàng đợi nội bộ", ["queue"],
+                    fn=lambda: {name: fn() for name, fn in list(_queue_fns.items())})
+SEQ_DUPLICATES = Counter("gateway_seq_duplicates_total", "Gói trùng seq_num đã bỏ", ["dev_id"])
+SEQ_REPLAYS = Counter("gateway_seq_replays_total", "Gói có seq_num cũ hơn cửa sổ (replay) đã bỏ", ["dev_id"])
@@ -6,6 +6,9 @@ import sys
 import os
 import csv
 import warnings
+import multiprocessing
+from collections import OrderedDict
+from multiprocessing import resource_tracker, shared_memory
 
 # Tắt cảnh báo Pandas (FutureWarning) để log sạch sẽ
 warnings.simplefilter(action='ignore', category=FutureWarning)
@@ -15,8 +18,16 @@ INPUT_FILE = "raw.csv"
 PROCESSING_FILE = "raw_processing.csv"     # File tạm để xử lý
 OUTPUT_FEATURE_FILE = "calculated_features.csv" # File kết quả cho Module 3
 
+# Số tiến trình tính feature (> 1: chia gói theo băm khóa luồng, mỗi core một shard)
+CALC_WORKERS = int(os.getenv("CALC_WORKERS", "1"))
+
 ARP_PROTO_ID = 2054 
 
+# Bảng luồng (FlowTable) - timeout kiểu CICFlowMeter, tính theo thời điểm gói
+FLOW_IDLE_TIMEOUT = float(os.getenv("FLOW_IDLE_TIMEOUT", "5"))      # luồng im lặng → xuất
+FLOW_ACTIVE_TIMEOUT = float(os.getenv("FLOW_ACTIVE_TIMEOUT", "120"))  # luồng sống quá lâu → xuất, gói sau mở luồng mới
+FLOW_MAX_FLOWS = int(os.getenv("FLOW_MAX_FLOWS", "100000"))          # vượt → xuất luồng lâu không có gói nhất (LRU)
+
 # --- DANH SÁCH FEATURE ---
 MODEL_FEATURE_COLUMNS = [
     'flow_duration', 'Header_Length', 'Protocol Type', 'Rate',
@@ -119,7 +130,441 @@ def calculate_features_from_group(group):
     except Exception:
         return None
 
-def process_raw_file(filepath):
+def calculate_features_groupby(df_raw):
+    """Bản gốc (apply từng dòng + groupby.apply từng luồng) - giữ làm chuẩn đối chiếu cho bản vector hóa."""
+    df_raw['Flow_Key'] = df_raw.apply(get_flow_key, axis=1)
+    return df_raw.groupby('Flow_Key').apply(calculate_features_from_group)
+
+# Bit cờ TCP cho cột Flags (chuỗi "FSRPAU" do Module 1 ghi)
+_FLAG_BIT = {'F': 1, 'S': 2, 'R': 4, 'P': 8, 'A': 16, 'U': 32}
+
+def _flag_bits(flags):
+    return sum(bit for c, bit in _FLAG_BIT.items() if c in flags)
+
+def _segment_sum(values, starts, counts):
+    """Tổng từng đoạn values[start : start + count]. Các đoạn cùng độ dài được gom thành ma trận rồi .sum(axis=1):
+    NumPy cộng mỗi hàng theo đúng thứ tự tổng cặp đôi như np.sum / pandas .sum() trên từng luồng riêng
+    → kết quả trùng từng bit với calculate_features_groupby (cộng tuần tự thì lệch ở bit cuối)."""
+    out = np.zeros(len(starts))
+    by_len = np.argsort(counts, kind='stable')
+    for group in np.split(by_len, np.flatnonzero(np.diff(counts[by_len])) + 1):
+        if len(group) == 0 or counts[group[0]] == 0:
+            continue
+        out[group] = values[starts[group, None] + np.arange(counts[group[0]])].sum(axis=1)
+    return out
+
+# Cột số sau khi mã hóa (_encode): đủ để tính feature mà không cần chuỗi → chia sẻ được qua shared memory
+_ENCODED_COLUMNS = (('ts', np.float64), ('src', np.int64), ('dst', np.int64), ('sport', np.int64),
+                    ('dport', np.int64), ('proto', np.int64), ('length', np.int64), ('ip_hdr', np.int64),
+                    ('tcp_hdr', np.int64), ('arp_op', np.int64), ('flag_bits', np.int64),
+                    ('broadcast', np.bool_), ('swap', np.bool_))
+
+def _encode(df_raw):
+    """DataFrame gói tin → (dict cột số, mảng IP gốc). IP mã hóa bằng factorize chung cho nguồn + đích."""
+    src = df_raw['Source_IP'].to_numpy(dtype=object)
+    dst = df_raw['Destination_IP'].to_numpy(dtype=object)
+    ip_codes, ip_uniques = pd.factorize(np.concatenate([src, dst]))
+    ip_uniques = np.asarray(ip_uniques, dtype=object)
+    # get_flow_key so chuỗi IP từng gói; so thứ hạng của IP (sắp các IP khác nhau một lần) cho cùng kết quả
+    ip_rank = np.empty(len(ip_uniques), dtype=np.int64)
+    ip_rank[np.argsort(ip_uniques, kind='stable')] = np.arange(len(ip_uniques))
+    src_codes, dst_codes = ip_codes[:len(src)], ip_codes[len(src):]
+    # Cờ: mỗi chuỗi khác nhau tính bit một lần; ô trống (NaN, mã -1 của factorize) → phần tử 0 thêm ở cuối
+    flag_codes, flag_uniques = pd.factorize(df_raw['Flags'])
+    cols = {
+        'ts': df_raw['Timestamp'].to_numpy(dtype=np.float64),
+        'src': src_codes, 'dst': dst_codes,
+        'sport': df_raw['Source_Port'].to_numpy(dtype=np.int64),
+        'dport': df_raw['Destination_Port'].to_numpy(dtype=np.int64),
+        'proto': df_raw['Protocol'].to_numpy(dtype=np.int64),
+        'length': df_raw['Packet_Length'].to_numpy(dtype=np.int64),
+        'ip_hdr': df_raw['IP_Header_Len'].to_numpy(dtype=np.int64),
+        'tcp_hdr': df_raw['TCP_Header_Len'].to_numpy(dtype=np.int64),
+        'arp_op': df_raw['ARP_Opcode'].to_numpy(dtype=np.int64),
+        'flag_bits': np.array([_flag_bits(str(f)) for f in flag_uniques] + [0], dtype=np.int64)[flag_codes],
+        'broadcast': (df_raw['Eth_Dst'] == 'ff:ff:ff:ff:ff:ff').to_numpy(dtype=bool),
+        # get_flow_key: IP nhỏ hơn đứng trước, bằng nhau thì đảo; ô trống (mã -1) so sánh luôn sai → đảo
+        'swap': (src_codes < 0) | (dst_codes < 0) | ~(ip_rank[src_codes] < ip_rank[dst_codes]),
+    }
+    return cols, ip_uniques
+
+def _flow_ids(c):
+    """Mã luồng số nguyên cho từng gói: 5-tuple chuẩn hóa như get_flow_key, ARP gộp chung một luồng."""
+    swap, is_arp = c['swap'], c['proto'] == ARP_PROTO_ID
+    a_ip = np.where(swap, c['dst'], c['src'])
+    b_ip = np.where(swap, c['src'], c['dst'])
+    a_port = np.where(swap, c['dport'], c['sport'])
+    b_port = np.where(swap, c['sport'], c['dport'])
+    for col in (a_ip, b_ip, a_port, b_port):
+        col[is_arp] = -1
+    return a_ip, a_port, b_ip, b_port, is_arp
+
+def _flow_features(c):
+    """Cột số (_encode, có thể là một đoạn / shard) → (chỉ số gói đầu tiên của mỗi luồng, ma trận feature).
+
+    Sắp gói theo (luồng, thời điểm) một lần rồi tính mọi feature bằng phép gộp theo đoạn (reduceat / bincount /
+    _segment_sum) - cùng công thức và cùng thứ tự cộng với calculate_features_from_group."""
+    ts, src, proto, length = c['ts'], c['src'], c['proto'], c['length']
+    a_ip, a_port, b_ip, b_port, _ = _flow_ids(c)
+    keys = pd.DataFrame({'a': a_ip, 'ap': a_port, 'b': b_ip, 'bp': b_port, 'p': proto})
+    flow = keys.groupby(['a', 'ap', 'b', 'bp', 'p'], sort=False).ngroup().to_numpy()
+    n_flows = int(flow.max()) + 1
+    _, first = np.unique(flow, return_index=True)  # gói đầu tiên (theo thứ tự đọc) của mỗi luồng
+
+    # --- 1. Sắp gói theo (luồng, thời điểm): mỗi luồng là một đoạn liên tiếp ---
+    order = np.lexsort((ts, flow))
+    counts = np.bincount(flow, minlength=n_flows)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    ts_sorted = ts[order]
+    t_min = np.minimum.reduceat(ts_sorted, starts)
+    t_max = np.maximum.reduceat(ts_sorted, starts)
+    span = t_max - t_min
+    duration = np.where(span <= 0, 0.000001, span)
+    rate = counts / duration
+
+    proto_f = proto[first]
+    arp_f = proto_f == ARP_PROTO_ID
+    tcp_f = proto_f == 6
+    features = np.zeros((n_flows, len(MODEL_FEATURE_COLUMNS)))
+    col = {name: i for i, name in enumerate(MODEL_FEATURE_COLUMNS)}
+    features[:, col['flow_duration']] = duration
+    features[:, col['Protocol Type']] = proto_f
+    features[:, col['Rate']] = rate
+    features[:, col['Number']] = counts
+
+    # --- 2. ARP ---
+    arp_op = c['arp_op']
+    features[:, col['APS']] = np.where(arp_f, rate, 0)
+    features[:, col['ABPS']] = np.where(arp_f, np.bincount(flow, c['broadcast'], n_flows) / duration, 0)
+    features[:, col['subARP']] = np.where(arp_f, np.bincount(flow, arp_op == 2, n_flows) -
+                                          np.bincount(flow, arp_op == 1, n_flows), 0)
+
+    # --- 3. TCP/IP: độ dài, IAT, chia chiều fwd/bwd ---
+    ip_f = ~arp_f
+    length_sorted = length[order]
+    len_min = np.minimum.reduceat(length_sorted, starts)
+    len_max = np.maximum.reduceat(length_sorted, starts)
+    # Tổng số nguyên < 2^53 → cộng theo thứ tự nào cũng chính xác
+    len_sum = np.bincount(flow, length, n_flows)
+    avg = len_sum / counts
+    iat = np.where(counts > 1, _segment_sum(np.diff(ts_sorted), starts, counts - 1) / np.maximum(counts - 1, 1),
+                   duration)
+
+    # fwd = IP nguồn của gói đầu tiên; sắp (luồng, bwd sau fwd, thời điểm) → đoạn fwd rồi đoạn bwd của mỗi luồng
+    is_fwd = src == src[first][flow]
+    fwd_n = np.bincount(flow, is_fwd, n_flows).astype(np.int64)
+    bwd_n = counts - fwd_n
+    order_dir = np.lexsort((ts, ~is_fwd, flow))
+    length_dir = length[order_dir].astype(np.float64)
+    fwd_sum = np.bincount(flow, np.where(is_fwd, length, 0), n_flows)
+    avg_fwd = np.where(fwd_n > 0, fwd_sum / np.maximum(fwd_n, 1), 0)
+    avg_bwd = np.where(bwd_n > 0, (len_sum - fwd_sum) / np.maximum(bwd_n, 1), 0)
+    # Phương sai hai lượt như pandas .var(ddof=0): avg = tổng / n, rồi tổng (avg - x)^2 / n
+    flow_dir = flow[order_dir]
+    row_avg = np.where(is_fwd[order_dir], avg_fwd[flow_dir], avg_bwd[flow_dir])
+    sqr = (row_avg - length_dir) ** 2
+    var_fwd = np.where(fwd_n > 1, _segment_sum(sqr, starts, fwd_n) / np.maximum(fwd_n, 1), 0)
+    var_bwd = np.where(bwd_n > 1, _segment_sum(sqr, starts + fwd_n, bwd_n) / np.maximum(bwd_n, 1), 0)
+    var_fwd = np.nan_to_num(var_fwd)
+    var_bwd = np.nan_to_num(var_bwd)
+
+    header_len = np.where(tcp_f, np.bincount(flow, c['ip_hdr'], n_flows) / counts +
+                          np.bincount(flow, c['tcp_hdr'], n_flows) / counts, c['ip_hdr'][first])
+    for name, values in (('Header_Length', header_len), ('Min', len_min), ('Max', len_max), ('AVG', avg),
+                         ('IAT', iat), ('Magnitue', (avg_fwd + avg_bwd) * 0.5),
+                         ('Radius', (var_fwd + var_bwd) * 0.5),
+                         ('Variance', np.where(var_bwd > 0, var_fwd / np.where(var_bwd > 0, var_bwd, 1), 0)),
+                         ('Weight', fwd_n * bwd_n)):
+        features[:, col[name]] = np.where(ip_f, values, 0)
+
+    # --- 4. Cờ TCP: cờ của gói đầu tiên + số gói có từng cờ (bitmask) ---
+    flag_bits = c['flag_bits']
+    first_bits = flag_bits[first]
+    for name, bit in (('fin_flag_number', 1), ('syn_flag_number', 2), ('psh_flag_number', 8),
+                      ('ack_flag_number', 16), ('rst_flag_number', 4)):
+        features[:, col[name]] = np.where(tcp_f, (first_bits & bit) != 0, 0)
+    for name, bit in (('ack_count', 16), ('syn_count', 2), ('urg_count', 32), ('rst_count', 4), ('fin_count', 1)):
+        features[:, col[name]] = np.where(tcp_f, np.bincount(flow, (flag_bits & bit) != 0, n_flows), 0)
+    return first, features
+
+def _features_frame(c, ip_uniques, first, features):
+    """Sắp các luồng theo chuỗi khóa của get_flow_key (thứ tự dòng của groupby('Flow_Key')) → DataFrame."""
+    src, dst, sport, dport, proto, swap = (c[k] for k in ('src', 'dst', 'sport', 'dport', 'proto', 'swap'))
+    flow_keys = np.array([
+        "ARP_Flow" if proto[k] == ARP_PROTO_ID else
+        str((ip_uniques[src[k]], int(sport[k]), ip_uniques[dst[k]], int(dport[k]), int(proto[k])) if not swap[k]
+            else (ip_uniques[dst[k]], int(dport[k]), ip_uniques[src[k]], int(sport[k]), int(proto[k])))
+        for k in first], dtype=object)
+    by_key = np.argsort(flow_keys, kind='stable')
+    return pd.DataFrame(features[by_key], columns=MODEL_FEATURE_COLUMNS,
+                        index=pd.Index(flow_keys[by_key], name='Flow_Key'))
+
+def calculate_features(df_raw):
+    """DataFrame gói tin (RAW_FILE_COLUMNS) → DataFrame feature, mỗi luồng một dòng (vector hóa).
+    Cùng kết quả (từng byte khi ghi CSV) với calculate_features_groupby."""
+    if df_raw.empty:
+        return pd.DataFrame(columns=MODEL_FEATURE_COLUMNS)
+    c, ip_uniques = _encode(df_raw)
+    first, features = _flow_features(c)
+    return _features_frame(c, ip_uniques, first, features)
+
+def write_features(features_df, path=OUTPUT_FEATURE_FILE):
+    """Ghi đè file feature cho Module 3: ghi file tạm rồi os.replace → Module 3 không đọc phải file ghi dở."""
+    tmp_path = path + ".tmp"
+    features_df.to_csv(tmp_path, mode='w', header=True, index=False, encoding='utf-8')
+    os.replace(tmp_path, path)
+
+# ==================== CHẾ ĐỘ SONG SONG (NHIỀU CORE) ====================
+def _shard_of(c, shards):
+    """Shard của từng gói = băm 5-tuple chuẩn hóa → hai chiều của một luồng luôn cùng shard.
+    ARP là một luồng giả duy nhất ("ARP_Flow") → cả khối ARP vào một shard (shard đang nhẹ nhất), không bao giờ
+    bị chia."""
+    a_ip, a_port, b_ip, b_port, is_arp = _flow_ids(c)
+    h = np.zeros(len(a_ip), dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for part in (a_ip, a_port, b_ip, b_port, c['proto']):
+            h = (h ^ part.astype(np.uint64)) * np.uint64(0x9E3779B97F4A7C15)
+        h ^= h >> np.uint64(29)
+    shard = (h % np.uint64(shards)).astype(np.int64)
+    shard[is_arp] = np.argmin(np.bincount(shard[~is_arp], minlength=shards))
+    return shard
+
+def _shard_features(shm_name, layout, n_rows, lo, hi):
+    """Chạy trong tiến trình con: gắn vào shared memory, tính feature cho các gói [lo, hi) (view, không chép)."""
+    # Tiến trình con dùng chung resource_tracker với tiến trình cha (ParallelExtractor) → chỉ cha unlink
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        c = {name: np.ndarray((n_rows,), dtype=dtype, buffer=shm.buf, offset=offset)[lo:hi]
+             for name, dtype, offset in layout}
+        first, features = _flow_features(c)
+        del c
+        return first + lo, features
+    finally:
+        shm.close()
+
+class ParallelExtractor:
+    """Tính feature trên nhiều core: chia gói theo băm khóa luồng thành N shard, mỗi tiến trình một shard.
+
+    Cột số (_encode) được ghi một lần vào shared memory theo thứ tự shard; tiến trình con đọc trực tiếp đoạn của
+    mình (không pickle DataFrame) và chỉ trả về feature của luồng. Kết quả gộp lại trùng calculate_features."""
+
+    def __init__(self, workers=CALC_WORKERS):
+        self.workers = max(1, workers)
+        self.pool = None
+        if self.workers > 1:
+            # resource_tracker phải chạy trước khi Pool tạo tiến trình con → con dùng chung tracker của cha
+            # (không thì mỗi con tự mở tracker riêng và "dọn" shared memory của cha khi thoát)
+            resource_tracker.ensure_running()
+            self.pool = multiprocessing.Pool(self.workers)
+
+    def __call__(self, df_raw):
+        if self.pool is None or df_raw.empty:
+            return calculate_features(df_raw)
+        c, ip_uniques = _encode(df_raw)
+        n_rows = len(df_raw)
+        shard = _shard_of(c, self.workers)
+        # Sắp ổn định theo shard: trong mỗi shard gói giữ thứ tự đọc (gói đầu tiên, thứ tự cộng như bản tuần tự)
+        perm = np.argsort(shard, kind='stable')
+        bounds = np.searchsorted(shard[perm], np.arange(self.workers + 1))
+
+        layout, size = [], 0
+        for name, dtype in _ENCODED_COLUMNS:
+            layout.append((name, dtype, size))
+            size += -(-n_rows * np.dtype(dtype).itemsize // 8) * 8  # căn 8 byte
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        try:
+            for name, dtype, offset in layout:
+                np.ndarray((n_rows,), dtype=dtype, buffer=shm.buf, offset=offset)[:] = c[name][perm]
+            tasks = [(shm.name, layout, n_rows, int(lo), int(hi))
+                     for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo]
+            results = self.pool.starmap(_shard_features, tasks)
+        finally:
+            shm.close()
+            shm.unlink()
+        first = np.concatenate([r[0] for r in results])
+        features = np.concatenate([r[1] for r in results])
+        c = {name: values[perm] for name, values in c.items()}
+        return _features_frame(c, ip_uniques, first, features)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+# ==================== BẢNG LUỒNG TĂNG DẦN ====================
+# Vị trí cột trong một dòng RAW_FILE_COLUMNS (Module 1)
+_TS, _SRC, _SPORT, _DST, _DPORT, _PROTO, _LEN, _FLAGS, _IP_HDR, _TCP_HDR, _ARP_OP, _ETH_DST = range(12)
+
+
+class _Flow:
+    """Thống kê chạy của một luồng: mỗi gói cập nhật O(1), không giữ lại gói."""
+    __slots__ = ("proto", "fwd_ip", "first_ts", "last_ts", "n", "len_min", "len_max", "len_sum",
+                 "fwd_n", "fwd_mean", "fwd_m2", "bwd_n", "bwd_mean", "bwd_m2",
+                 "first_ip_hdr", "ip_hdr_sum", "tcp_hdr_sum", "first_flags",
+                 "ack", "syn", "urg", "rst", "fin", "broadcast", "arp_req", "arp_rep")
+
+    def __init__(self, row):
+        self.proto = row[_PROTO]
+        self.fwd_ip = row[_SRC]  # chiều "fwd" = IP nguồn của gói đầu tiên
+        self.first_ts = self.last_ts = row[_TS]
+        self.n = 0
+        self.len_min = self.len_max = row[_LEN]
+        self.len_sum = 0
+        self.fwd_n = self.bwd_n = 0
+        self.fwd_mean = self.fwd_m2 = self.bwd_mean = self.bwd_m2 = 0.0
+        self.first_ip_hdr = row[_IP_HDR]
+        self.ip_hdr_sum = self.tcp_hdr_sum = 0
+        flags = row[_FLAGS]
+        self.first_flags = flags if isinstance(flags, str) else ''
+        self.ack = self.syn = self.urg = self.rst = self.fin = 0
+        self.broadcast = self.arp_req = self.arp_rep = 0
+
+    def add(self, row):
+        ts = row[_TS]
+        if ts < self.first_ts:
+            self.first_ts = ts
+        elif ts > self.last_ts:
+            self.last_ts = ts
+        self.n += 1
+        length = row[_LEN]
+
+        if self.proto == ARP_PROTO_ID:
+            if row[_ETH_DST] == 'ff:ff:ff:ff:ff:ff':
+                self.broadcast += 1
+            op = row[_ARP_OP]
+            if op == 1:
+                self.arp_req += 1
+            elif op == 2:
+                self.arp_rep += 1
+            return
+
+        if length < self.len_min:
+            self.len_min = length
+        elif length > self.len_max:
+            self.len_max = length
+        self.len_sum += length
+        # Welford: trung bình + tổng bình phương độ lệch theo từng chiều (var ddof=0 = m2 / n)
+        if row[_SRC] == self.fwd_ip:
+            self.fwd_n += 1
+            delta = length - self.fwd_mean
+            self.fwd_mean += delta / self.fwd_n
+            self.fwd_m2 += delta * (length - self.fwd_mean)
+        else:
+            self.bwd_n += 1
+            delta = length - self.bwd_mean
+            self.bwd_mean += delta / self.bwd_n
+            self.bwd_m2 += delta * (length - self.bwd_mean)
+
+        if self.proto == 6:
+            self.ip_hdr_sum += row[_IP_HDR]
+            self.tcp_hdr_sum += row[_TCP_HDR]
+            flags = row[_FLAGS]
+            if isinstance(flags, str) and flags:
+                if 'A' in flags: self.ack += 1
+                if 'S' in flags: self.syn += 1
+                if 'U' in flags: self.urg += 1
+                if 'R' in flags: self.rst += 1
+                if 'F' in flags: self.fin += 1
+
+    def features(self):
+        """26 feature theo MODEL_FEATURE_COLUMNS, cùng công thức calculate_features_from_group."""
+        n = self.n
+        span = self.last_ts - self.first_ts
+        duration = span if span > 0 else 0.000001
+        rate = n / duration
+
+        if self.proto == ARP_PROTO_ID:
+            return (duration, 0, self.proto, rate, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, n, 0, 0, 0, 0,
+                    rate, self.broadcast / duration, self.arp_rep - self.arp_req)
+
+        # Trung bình các khoảng cách liên tiếp (đã sắp theo thời gian) = (cuối - đầu) / (n - 1)
+        iat = span / (n - 1) if n > 1 else duration
+        var_fwd = self.fwd_m2 / self.fwd_n if self.fwd_n > 1 else 0
+        var_bwd = self.bwd_m2 / self.bwd_n if self.bwd_n > 1 else 0
+        flag_numbers = (0, 0, 0, 0, 0)
+        counts = (0, 0, 0, 0, 0)
+        header_len = self.first_ip_hdr
+        if self.proto == 6:
+            header_len = (self.ip_hdr_sum + self.tcp_hdr_sum) / n
+            f = self.first_flags
+            flag_numbers = (int('F' in f), int('S' in f), int('P' in f), int('A' in f), int('R' in f))
+            counts = (self.ack, self.syn, self.urg, self.rst, self.fin)
+        return (duration, header_len, self.proto, rate) + flag_numbers + counts + (
+            self.len_min, self.len_max, self.len_sum / n, iat, n,
+            (self.fwd_mean + self.bwd_mean) * 0.5, (var_fwd + var_bwd) * 0.5,
+            var_fwd / var_bwd if var_bwd > 0 else 0, self.fwd_n * self.bwd_n, 0, 0, 0)
+
+
+def flow_key(row):
+    """get_flow_key cho một dòng dạng list/tuple (RAW_FILE_COLUMNS)."""
+    if row[_PROTO] == ARP_PROTO_ID: return "ARP_Flow"
+    if row[_SRC] < row[_DST]:
+        return (row[_SRC], row[_SPORT], row[_DST], row[_DPORT], row[_PROTO])
+    return (row[_DST], row[_DPORT], row[_SRC], row[_SPORT], row[_PROTO])
+
+
+class FlowTable:
+    """Bảng luồng sống qua nhiều cửa sổ: luồng không bị cắt ở ranh giới 5 giây, xuất khi
+    im lặng idle_timeout giây, sống quá active_timeout giây, hoặc bị đẩy ra vì vượt max_flows (LRU)."""
+
+    def __init__(self, idle_timeout=FLOW_IDLE_TIMEOUT, active_timeout=FLOW_ACTIVE_TIMEOUT, max_flows=FLOW_MAX_FLOWS):
+        self.idle_timeout = idle_timeout
+        self.active_timeout = active_timeout
+        self.max_flows = max(1, max_flows)
+        self.flows = OrderedDict()  # khóa luồng → _Flow, lâu không có gói nhất ở đầu
+        self.exported = []          # feature của các luồng đã kết thúc, chờ drain()
+        self.counters = {"packets": 0, "idle": 0, "active": 0, "evicted": 0, "flushed": 0}
+
+    def add(self, row):
+        key = flow_key(row)
+        flows = self.flows
+        flow = flows.get(key)
+        if flow is not None and row[_TS] - flow.first_ts >= self.active_timeout:
+            self.exported.append(flow.features())
+            self.counters["active"] += 1
+            flow = None
+        if flow is None:
+            flow = flows[key] = _Flow(row)
+            if len(flows) > self.max_flows:
+                self.exported.append(flows.popitem(last=False)[1].features())
+                self.counters["evicted"] += 1
+        else:
+            flows.move_to_end(key)
+        flow.add(row)
+        self.counters["packets"] += 1
+
+    def add_rows(self, rows):
+        for row in rows:
+            self.add(row)
+
+    def expire(self, now):
+        """Xuất các luồng đã im lặng idle_timeout giây tính tới now (luồng im lặng lâu nhất nằm đầu OrderedDict)."""
+        flows = self.flows
+        while flows:
+            key, flow = next(iter(flows.items()))
+            if now - flow.last_ts < self.idle_timeout:
+                break
+            del flows[key]
+            self.exported.append(flow.features())
+            self.counters["idle"] += 1
+
+    def flush(self):
+        """Xuất mọi luồng còn sống (dừng chương trình / hết file)."""
+        self.exported.extend(flow.features() for flow in self.flows.values())
+        self.counters["flushed"] += len(self.flows)
+        self.flows.clear()
+
+    def drain(self):
+        """DataFrame feature các luồng đã xuất từ lần drain trước (cột MODEL_FEATURE_COLUMNS)."""
+        exported, self.exported = self.exported, []
+        return pd.DataFrame(exported, columns=MODEL_FEATURE_COLUMNS)
+
+    def stats(self):
+        return dict(self.counters, live=len(self.flows), pending=len(self.exported))
+
+
+def process_raw_file(filepath, extract=calculate_features):
     """Đọc raw, tính feature và BÀN GIAO cho Module 3."""
     try:
         # Thêm encoding='utf-8' để tránh lỗi ký tự lạ trên Windows
@@ -128,13 +573,11 @@ def process_raw_file(filepath):
 
         print(f"[Module 2] Đang tính toán feature cho {len(df_raw)} gói tin...")
 
-        df_raw['Flow_Key'] = df_raw.apply(get_flow_key, axis=1)
-        
         # Tính toán feature
-        features_df = df_raw.groupby('Flow_Key').apply(calculate_features_from_group)
+        features_df = extract(df_raw)
         
-        # Ghi đè (mode='w') vào file output
-        features_df.to_csv(OUTPUT_FEATURE_FILE, mode='w', header=True, index=False, encoding='utf-8')
+        # Ghi đè vào file output
+        write_features(features_df)
         
         print(f"[Module 2] Đã tạo {len(features_df)} luồng feature.")
 
@@ -160,8 +603,12 @@ if __name__ == "__main__":
                 print("[Module 2] Không thể truy cập file raw.csv (đang được ghi).")
                 sys.exit(0)
             
-            # 3. Xử lý
-            process_raw_file(PROCESSING_FILE)
+            # 3. Xử lý (CALC_WORKERS > 1 → song song theo shard)
+            extractor = ParallelExtractor()
+            try:
+                process_raw_file(PROCESSING_FILE, extractor)
+            finally:
+                extractor.close()
             
             # 4. Dọn dẹp
             if os.path.exists(PROCESSING_FILE):
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+Bắt gói tốc độ cao cho Module 1 (dump.py) - không dựng object Scapy cho từng gói
+  - Nguồn frame thô: AF_PACKET (Linux), libpcap / Npcap qua ctypes (Linux / Windows), phát lại file .pcap
+  - Giải mã Ethernet / IPv4 / TCP / UDP / ARP bằng struct ở offset cố định → đúng 14 cột RAW_FILE_COLUMNS,
+    cùng giá trị với process_packet (Scapy) của dump.py
+  - Cùng bộ lọc "ip or arp": BPF gắn vào socket AF_PACKET / pcap_setfilter; file pcap lọc khi giải mã
+  - Không mở được nguồn nào → open_source trả về None, dump.py quay về Scapy
+"""
+import ctypes
+import ctypes.util
+import mmap
+import socket
+import struct
+import sys
+import time
+
+ARP_PROTO_ID = 2054
+ETH_P_IP = 0x0800
+ETH_P_ARP = 0x0806
+ETH_P_ALL = 0x0003
+
+NO_IP = '0.0.0.0'
+
+BACKENDS = ("auto", "afpacket", "libpcap", "scapy")
+
+# Cờ TCP theo đúng thứ tự get_tcp_flags: F S R P A U → bảng tra 256 chuỗi dựng sẵn
+_FLAG_BITS = ((0x01, 'F'), (0x02, 'S'), (0x04, 'R'), (0x08, 'P'), (0x10, 'A'), (0x20, 'U'))
+TCP_FLAGS = tuple(''.join(c for bit, c in _FLAG_BITS if b & bit) for b in range(256))
+
+_PORTS = struct.Struct("!HH")
+_inet_ntoa = socket.inet_ntoa
+
+
+def parse_frame(frame, ts):
+    """Frame Ethernet (bytes / memoryview) → 14 cột RAW_FILE_COLUMNS, None nếu không phải IPv4 / ARP."""
+    n = len(frame)
+    if n < 14:
+        return None
+    ethertype = (frame[12] << 8) | frame[13]
+
+    if ethertype == ETH_P_IP:
+        if n < 34 or frame[14] >> 4 != 4:
+            return None
+        ihl = (frame[14] & 0x0F) * 4
+        proto = frame[23]
+        if proto == 0:  # dump.py chỉ ghi gói có proto != 0
+            return None
+        sport = dport = tcp_hlen = 0
+        flags = ''
+        # Scapy chỉ giải mã TCP/UDP ở mảnh đầu tiên (fragment offset = 0)
+        if not ((frame[20] & 0x1F) or frame[21]):
+            l4 = 14 + ihl
+            if proto == 6:
+                if n >= l4 + 14:
+                    sport, dport = _PORTS.unpack_from(frame, l4)
+                    tcp_hlen = (frame[l4 + 12] >> 4) * 4
+                    flags = TCP_FLAGS[frame[l4 + 13]]
+            elif proto == 17:
+                if n >= l4 + 4:
+                    sport, dport = _PORTS.unpack_from(frame, l4)
+        return [ts, _inet_ntoa(frame[26:30]), sport, _inet_ntoa(frame[30:34]), dport,
+                proto, n, flags, ihl, tcp_hlen, 0, frame[0:6].hex(':'), '', '']
+
+    if ethertype == ETH_P_ARP:
+        if n < 42:
+            return None
+        return [ts, NO_IP, 0, NO_IP, 0, ARP_PROTO_ID, n, '', 0, 0, (frame[20] << 8) | frame[21],
+                frame[0:6].hex(':'), frame[22:28].hex(':'), _inet_ntoa(frame[28:32])]
+
+    return None
+
+
+# ==================== FILE PCAP (phát lại để kiểm thử) ====================
+PCAP_MAGIC_USEC = 0xa1b2c3d4
+PCAP_MAGIC_NSEC = 0xa1b23c4d
+LINKTYPE_ETHERNET = 1
+
+
+class PcapFileSource:
+    """Đọc file pcap cổ điển (tcpdump -w, Wireshark "pcap"), mmap → không chép cả file vào bộ nhớ."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < 24:
+            raise ValueError(f"{path}: không phải file pcap")
+        for endian in ("<", ">"):
+            magic, = struct.unpack_from(endian + "I", self._map, 0)
+            if magic in (PCAP_MAGIC_USEC, PCAP_MAGIC_NSEC):
+                break
+        else:
+            raise ValueError(f"{path}: không phải file pcap cổ điển (pcapng chưa hỗ trợ)")
+        self._record = struct.Struct(endian + "IIII")
+        self._divisor = 1e6 if magic == PCAP_MAGIC_USEC else 1e9
+        self._scale = 1000000 if magic == PCAP_MAGIC_USEC else 1000000000
+        linktype, = struct.unpack_from(endian + "I", self._map, 20)
+        if linktype != LINKTYPE_ETHERNET:
+            raise ValueError(f"{path}: linktype {linktype} không hỗ trợ (chỉ Ethernet)")
+
+    def frames(self):
+        """(ts, frame) theo thứ tự trong file; ts tính từ số nguyên → cùng giá trị float với Scapy.
+
+        Scapy đọc file pcap ra EDecimal nên cột Timestamp ghi "1700000000.000000", ở đây là float
+        "1700000000.0" (như khi bắt trực tiếp) - calculate.py đọc ra cùng một số."""
+        buf = self._map
+        unpack, size = self._record.unpack_from, self._record.size
+        scale, divisor = self._scale, self._divisor
+        offset, end = 24, len(buf)
+        while offset + size <= end:
+            sec, frac, caplen, _ = unpack(buf, offset)
+            offset += size
+            if offset + caplen > end:
+                break  # bản ghi cuối bị cắt dở
+            # Cắt mmap → bytes (chép một frame), không giữ con trỏ vào mmap sau khi close
+            yield (sec * scale + frac) / divisor, buf[offset:offset + caplen]
+            offset += caplen
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+# ==================== AF_PACKET (Linux) ====================
+SO_ATTACH_FILTER = 26
+PACKET_OUTGOING = 4
+ARPHRD_ETHER = 1
+ARPHRD_LOOPBACK = 772
+
+# tcpdump -dd "ip or arp"
+_BPF_IP_OR_ARP = (
+    (0x28, 0, 0, 12),           # ldh [12]
+    (0x15, 1, 0, ETH_P_IP),     # jeq ip  → nhận
+    (0x15, 0, 1, ETH_P_ARP),    # jeq arp → nhận, không → bỏ
+    (0x06, 0, 0, 0x00040000),   # ret snaplen
+    (0x06, 0, 0, 0),            # ret 0
+)
+
+
+def _attach_bpf(sock, program):
+    code = b"".join(struct.pack("HBBI", *ins) for ins in program)
+    buf = ctypes.create_string_buffer(code)
+    fprog = struct.pack("HL", len(program), ctypes.addressof(buf))
+    sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+
+
+class AfPacketSource:
+    """Socket AF_PACKET + BPF "ip or arp" trong kernel; recv_into vào một buffer dùng lại."""
+
+    def __init__(self, interface=None, rcvbuf=16 * 1024 * 1024, poll=0.2):
+        self.sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
+        try:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+            _attach_bpf(self.sock, _BPF_IP_OR_ARP)
+            # Timeout ở kernel (SO_RCVTIMEO) thay cho settimeout → không tốn thêm poll() mỗi gói
+            usec = int(poll * 1e6)
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVTIMEO, struct.pack("ll", usec // 1000000,
+                                                                                    usec % 1000000))
+            if interface:
+                self.sock.bind((interface, 0))
+        except OSError:
+            self.sock.close()
+            raise
+        self._buf = bytearray(65536)
+
+    def frames(self):
+        """(ts, frame) liên tục; (None, None) khi hết poll giây không có gói (để người gọi kiểm tra hạn giờ)."""
+        view = memoryview(self._buf)
+        recv = self.sock.recvfrom_into
+        now = time.time
+        while True:
+            try:
+                n, addr = recv(self._buf)
+            except (BlockingIOError, socket.timeout):
+                yield None, None
+                continue
+            # Loopback: mỗi gói xuất hiện hai lần (gửi + nhận) → bỏ bản gửi như libpcap
+            if addr[2] == PACKET_OUTGOING and addr[3] == ARPHRD_LOOPBACK:
+                continue
+            if addr[3] != ARPHRD_ETHER and addr[3] != ARPHRD_LOOPBACK:
+                continue
+            yield now(), view[:n]
+
+    def close(self):
+        self.sock.close()
+
+
+# ==================== LIBPCAP / NPCAP (ctypes) ====================
+class _Timeval(ctypes.Structure):
+    _fields_ = [("tv_sec", ctypes.c_long), ("tv_usec", ctypes.c_long)]
+
+
+class _PktHdr(ctypes.Structure):
+    _fields_ = [("ts", _Timeval), ("caplen", ctypes.c_uint32), ("len", ctypes.c_uint32)]
+
+
+class _BpfProgram(ctypes.Structure):
+    _fields_ = [("bf_len", ctypes.c_uint), ("bf_insns", ctypes.c_void_p)]
+
+
+class _PcapIf(ctypes.Structure):
+    pass
+
+
+_PcapIf._fields_ = [("next", ctypes.POINTER(_PcapIf)), ("name", ctypes.c_char_p),
+                    ("description", ctypes.c_char_p), ("addresses", ctypes.c_void_p), ("flags", ctypes.c_uint)]
+
+
+def _load_libpcap():
+    name = ctypes.util.find_library("wpcap" if sys.platform == "win32" else "pcap")
+    if name is None:
+        raise OSError("không tìm thấy libpcap / Npcap (wpcap.dll)")
+    lib = ctypes.CDLL(name)
+    lib.pcap_open_live.restype = ctypes.c_void_p
+    lib.pcap_open_live.argtypes = [ctypes.c_char_p, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_char_p]
+    lib.pcap_next_ex.argtypes = [ctypes.c_void_p, ctypes.POINTER(ctypes.POINTER(_PktHdr)),
+                                 ctypes.POINTER(ctypes.POINTER(ctypes.c_ubyte))]
+    lib.pcap_compile.argtypes = [ctypes.c_void_p, ctypes.POINTER(_BpfProgram), ctypes.c_char_p, ctypes.c_int,
+                                 ctypes.c_uint32]
+    lib.pcap_setfilter.argtypes = [ctypes.c_void_p, ctypes.POINTER(_BpfProgram)]
+    lib.pcap_freecode.argtypes = [ctypes.POINTER(_BpfProgram)]
+    lib.pcap_geterr.restype = ctypes.c_char_p
+    lib.pcap_geterr.argtypes = [ctypes.c_void_p]
+    lib.pcap_close.argtypes = [ctypes.c_void_p]
+    lib.pcap_findalldevs.argtypes = [ctypes.POINTER(ctypes.POINTER(_PcapIf)), ctypes.c_char_p]
+    lib.pcap_freealldevs.argtypes = [ctypes.POINTER(_PcapIf)]
+    return lib
+
+
+def _pcap_device(lib, interface):
+    """Tên thiết bị pcap: khớp tên (\\Device\\NPF_{...}, eth0) hoặc mô tả card mạng chứa interface."""
+    devs = ctypes.POINTER(_PcapIf)()
+    errbuf = ctypes.create_string_buffer(256)
+    if lib.pcap_findalldevs(ctypes.byref(devs), errbuf) != 0:
+        raise OSError(errbuf.value.decode(errors="replace"))
+    try:
+        found = None
+        dev = devs
+        while dev:
+            name = dev.contents.name
+            desc = (dev.contents.description or b"").decode(errors="replace")
+            if interface is None or name.decode(errors="replace") == interface or interface in desc:
+                found = name
+                break
+            dev = dev.contents.next
+    finally:
+        lib.pcap_freealldevs(devs)
+    if found is None:
+        raise OSError(f"libpcap không có thiết bị '{interface}'")
+    return found
+
+
+class LibpcapSource:
+    def __init__(self, interface=None, snaplen=65535, poll=0.2):
+        self.lib = lib = _load_libpcap()
+        errbuf = ctypes.create_string_buffer(256)
+        device = _pcap_device(lib, interface)
+        self.handle = lib.pcap_open_live(device, snaplen, 1, int(poll * 1000), errbuf)
+        if not self.handle:
+            raise OSError(errbuf.value.decode(errors="replace"))
+        prog = _BpfProgram()
+        if lib.pcap_compile(self.handle, ctypes.byref(prog), b"ip or arp", 1, 0) != 0 or \
+                lib.pcap_setfilter(self.handle, ctypes.byref(prog)) != 0:
+            err = lib.pcap_geterr(self.handle).decode(errors="replace")
+            lib.pcap_close(self.handle)
+            raise OSError(err)
+        lib.pcap_freecode(ctypes.byref(prog))
+
+    def frames(self):
+        hdr = ctypes.POINTER(_PktHdr)()
+        data = ctypes.POINTER(ctypes.c_ubyte)()
+        next_ex, handle, string_at = self.lib.pcap_next_ex, self.handle, ctypes.string_at
+        href, dref = ctypes.byref(hdr), ctypes.byref(data)
+        while True:
+            rc = next_ex(handle, href, dref)
+            if rc == 1:
+                h = hdr.contents
+                yield (h.ts.tv_sec * 1000000 + h.ts.tv_usec) / 1e6, string_at(data, h.caplen)
+            elif rc == 0:
+                yield None, None
+            else:
+                raise OSError(self.lib.pcap_geterr(handle).decode(errors="replace"))
+
+    def close(self):
+        self.lib.pcap_close(self.handle)
+
+
+# ==================== CHỌN NGUỒN + VÒNG BẮT ====================
+def open_source(backend="auto", interface=None, pcap_file=None):
+    """Nguồn frame theo cấu hình; None → dùng Scapy (backend=scapy hoặc auto mà không mở được nguồn nhanh)."""
+    if backend not in BACKENDS:
+        raise ValueError(f"CAPTURE_BACKEND không hỗ trợ: {backend} ({' | '.join(BACKENDS)})")
+    if backend == "scapy":
+        return None
+    if pcap_file:
+        return PcapFileSource(pcap_file)
+    candidates = [backend] if backend != "auto" else (["afpacket"] if hasattr(socket, "AF_PACKET") else []) + ["libpcap"]
+    for name in candidates:
+        try:
+            return AfPacketSource(interface) if name == "afpacket" else LibpcapSource(interface)
+        except (OSError, AttributeError) as e:
+            if backend != "auto":
+                raise
+            print(f"[*] Không dùng được {name}: {e}")
+    return None
+
+
+def capture_rows(source, duration=None, count=None):
+    """Sinh các dòng RAW_FILE_COLUMNS tới khi hết duration giây HOẶC đủ count gói (None = không giới hạn).
+
+    File pcap: duration tính theo thời gian trong file (giống bắt trực tiếp 5 giây), không theo đồng hồ máy."""
+    live = not isinstance(source, PcapFileSource)
+    deadline = None
+    if duration is not None and live:
+        deadline = time.monotonic() + duration
+    written = 0
+    for ts, frame in source.frames():
+        if deadline is not None and time.monotonic() >= deadline:
+            return
+        if frame is None:
+            continue
+        row = parse_frame(frame, ts)
+        if row is None:
+            continue
+        if duration is not None and not live:
+            if deadline is None:
+                deadline = ts + duration
+            elif ts >= deadline:
+                return
+        yield row
+        written += 1
+        if count is not None and written >= count:
+            return
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Bắt gói liên tục (Module 1 + 2) thay cho vòng dump.py → calculate.py khởi động lại mỗi 5 giây
+  - Một tiến trình giữ socket bắt gói suốt đời → không mất gói giữa các lần chạy, không tốn thời gian import lại
+  - Cắt cửa sổ liền nhau theo thời điểm gói: [t, t + WINDOW_SEC), mốc căn theo bội số của WINDOW_SEC;
+    không còn giới hạn 1000 gói - lũ gói vẫn được đếm đủ, WINDOW_MAX_PACKETS chỉ cắt sớm để giới hạn bộ nhớ
+  - Mỗi cửa sổ được đưa sang Module 2 qua hàng đợi (thread, hoặc tiến trình riêng để không tranh GIL với
+    vòng bắt gói) thay cho đổi tên raw_temp.csv → raw.csv; feature vẫn ghi calculated_features.csv cho Module 3
+  - FEATURE_MODE=flowtable: Module 2 giữ bảng luồng (calculate.FlowTable) qua các cửa sổ → luồng không bị cắt
+    ở ranh giới cửa sổ, chỉ xuất feature khi luồng im lặng / sống quá lâu (FLOW_IDLE_TIMEOUT, FLOW_ACTIVE_TIMEOUT)
+  - Hàng đợi đầy (tính feature chậm hơn bắt gói) → bỏ cửa sổ và đếm, vòng bắt gói không bao giờ bị chặn;
+    phát lại file pcap thì chờ Module 2 (không có buffer kernel nào bị tràn)
+Chạy: python capture_daemon.py [file.pcap]   (Ctrl+C để dừng; file pcap: phát lại, cửa sổ theo thời gian trong file)
+"""
+import csv
+import math
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+
+import capture
+from dump import CAPTURE_BACKEND, INTERFACE, RAW_FILE_COLUMNS, RAW_FLOW_LOG_FILE, is_admin
+
+# --- CẤU HÌNH ---
+WINDOW_SEC = float(os.getenv("WINDOW_SEC", "5"))
+WINDOW_MAX_PACKETS = int(os.getenv("WINDOW_MAX_PACKETS", "200000"))
+WINDOW_QUEUE_SIZE = int(os.getenv("WINDOW_QUEUE_SIZE", "4"))
+WINDOW_HANDOFF = os.getenv("WINDOW_HANDOFF", "process")   # thread | process
+FEATURE_MODE = os.getenv("FEATURE_MODE", "window")       # window | flowtable
+LOG_RAW_FLOW = os.getenv("LOG_RAW_FLOW", "true").lower() == "true"   # ghi thêm gói vào raw_flow.csv (thu dataset)
+
+
+class Window:
+    __slots__ = ("seq", "start", "end", "rows")
+
+    def __init__(self, seq, start, end):
+        self.seq = seq
+        self.start = start
+        self.end = end
+        self.rows = []
+
+
+class WindowCutter:
+    """Gom dòng RAW_FILE_COLUMNS thành cửa sổ liền nhau; add / tick trả về cửa sổ vừa đóng (hoặc None)."""
+
+    def __init__(self, window_sec=WINDOW_SEC, max_packets=WINDOW_MAX_PACKETS):
+        self.window_sec = window_sec
+        self.max_packets = max_packets
+        self.current = None
+        self.seq = 0
+
+    def _open(self, start):
+        self.seq += 1
+        self.current = Window(self.seq, start, start + self.window_sec)
+
+    def _align(self, ts):
+        return math.floor(ts / self.window_sec) * self.window_sec
+
+    def add(self, row):
+        ts = row[0]
+        closed = None
+        if self.current is None:
+            self._open(self._align(ts))
+        elif ts >= self.current.end:
+            closed = self.current
+            # Khoảng lặng dài (phát lại file) → nhảy thẳng tới cửa sổ chứa gói, không sinh cửa sổ rỗng
+            self._open(max(closed.end, self._align(ts)))
+        elif len(self.current.rows) >= self.max_packets:
+            # Cắt sớm nhưng vẫn liền: cửa sổ đầy kết thúc tại gói này, phần còn lại tới mốc cũ thành cửa sổ mới
+            closed = self.current
+            self.seq += 1
+            self.current = Window(self.seq, ts, closed.end)
+            closed.end = ts
+        self.current.rows.append(row)
+        return closed
+
+    def tick(self, now):
+        """Không có gói tới: đóng cửa sổ khi đồng hồ đã qua mốc cuối (bắt trực tiếp)."""
+        if self.current is not None and now >= self.current.end:
+            closed, self.current = self.current, None
+            return closed
+        return None
+
+    def flush(self):
+        closed, self.current = self.current, None
+        return closed
+
+
+# ==================== MODULE 2 (đầu nhận hàng đợi) ====================
+def extraction_worker(windows, child=False):
+    """Lấy cửa sổ từ hàng đợi, tính feature, ghi file cho Module 3; None = dừng.
+    Chạy trong thread hoặc tiến trình con (hàm cấp module để spawn trên Windows import được)."""
+    if child:
+        # Ctrl+C tới cả nhóm tiến trình: tiến trình cha dừng bắt gói, đẩy cửa sổ dở rồi gửi None
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+    import pandas as pd
+    import calculate
+
+    table = calculate.FlowTable() if FEATURE_MODE == "flowtable" else None
+    while True:
+        window = windows.get()
+        if window is None:
+            if table is not None:
+                table.flush()
+                features_df = table.drain()
+                if len(features_df):
+                    calculate.write_features(features_df)
+                print(f"[Module 2] Dừng: xuất nốt {len(features_df)} luồng, {table.stats()}")
+            break
+        seq, start, end, rows = window
+        t0 = time.perf_counter()
+        try:
+            if LOG_RAW_FLOW:
+                new_file = not os.path.exists(RAW_FLOW_LOG_FILE) or os.path.getsize(RAW_FLOW_LOG_FILE) == 0
+                with open(RAW_FLOW_LOG_FILE, 'a', newline='') as f_log:
+                    writer = csv.writer(f_log)
+                    if new_file:
+                        writer.writerow(RAW_FILE_COLUMNS)
+                    writer.writerows(rows)
+            if table is None:
+                features_df = calculate.calculate_features(pd.DataFrame(rows, columns=RAW_FILE_COLUMNS))
+            else:
+                table.add_rows(rows)
+                table.expire(end)
+                features_df = table.drain()
+            if len(features_df):
+                calculate.write_features(features_df)
+            live = f", {len(table.flows)} luồng đang mở" if table is not None else ""
+            print(f"[Module 2] Cửa sổ #{seq} [{start:.0f}, {end:.0f}): {len(rows)} gói → {len(features_df)} luồng"
+                  f"{live} ({1000 * (time.perf_counter() - t0):.0f} ms)")
+        except Exception as e:
+            print(f"[Module 2] Lỗi tính toán cửa sổ #{seq}: {e}")
+
+
+class CaptureDaemon:
+    def __init__(self, source, handoff=WINDOW_HANDOFF, queue_size=WINDOW_QUEUE_SIZE, cutter=None):
+        if handoff not in ("thread", "process"):
+            raise ValueError(f"WINDOW_HANDOFF không hỗ trợ: {handoff} (thread | process)")
+        self.source = source
+        self.live = not isinstance(source, capture.PcapFileSource)
+        self.cutter = cutter or WindowCutter()
+        if handoff == "process":
+            ctx = multiprocessing.get_context("spawn")
+            self.windows = ctx.Queue(queue_size)
+            self.worker = ctx.Process(target=extraction_worker, args=(self.windows, True), name="module2",
+                                      daemon=True)
+        else:
+            self.windows = queue.Queue(queue_size)
+            self.worker = threading.Thread(target=extraction_worker, args=(self.windows,), name="module2", daemon=True)
+        self.packets = 0
+        self.windows_sent = 0
+        self.windows_dropped = 0
+        self.packets_dropped = 0
+
+    def _handoff(self, window):
+        if window is None or not window.rows:
+            return
+        try:
+            self.windows.put((window.seq, window.start, window.end, window.rows), block=not self.live)
+            self.windows_sent += 1
+        except queue.Full:
+            self.windows_dropped += 1
+            self.packets_dropped += len(window.rows)
+            print(f"[!] Module 2 không theo kịp: bỏ cửa sổ #{window.seq} ({len(window.rows)} gói), "
+                  f"đã bỏ {self.windows_dropped} cửa sổ")
+
+    def run(self):
+        """Bắt gói tới khi Ctrl+C (hoặc hết file pcap); luôn đẩy nốt cửa sổ dở và chờ Module 2 xong."""
+        self.worker.start()
+        parse, cutter, clock = capture.parse_frame, self.cutter, time.time
+        try:
+            for ts, frame in self.source.frames():
+                if frame is None:
+                    if self.live:
+                        self._handoff(cutter.tick(clock()))
+                    continue
+                row = parse(frame, ts)
+                if row is None:
+                    continue
+                self.packets += 1
+                closed = cutter.add(row)
+                if closed is not None:
+                    self._handoff(closed)
+        except KeyboardInterrupt:
+            print("\n[*] Đã dừng thủ công.")
+        finally:
+            self.source.close()
+            self._handoff(cutter.flush())
+            self.windows.put(None)
+            self.worker.join()
+
+    def stats(self):
+        return {"packets": self.packets, "windows": self.windows_sent, "windows_dropped": self.windows_dropped,
+                "packets_dropped": self.packets_dropped}
+
+
+if __name__ == "__main__":
+    pcap_file = sys.argv[1] if len(sys.argv) > 1 else None
+    if not pcap_file and not is_admin():
+        print("[!] Lỗi: Cần quyền Administrator / root để bắt gói tin.")
+        sys.exit(1)
+
+    source = capture.open_source(CAPTURE_BACKEND, INTERFACE, pcap_file)
+    if source is None:
+        # Scapy dựng object cho từng gói - không đủ nhanh để chạy liên tục; dùng dump.py + data_collect.bat
+        print("[!] Chế độ liên tục cần AF_PACKET hoặc libpcap/Npcap (CAPTURE_BACKEND=scapy không hỗ trợ).")
+        sys.exit(1)
+
+    if FEATURE_MODE not in ("window", "flowtable"):
+        print(f"[!] FEATURE_MODE không hỗ trợ: {FEATURE_MODE} (window | flowtable)")
+        sys.exit(1)
+
+    print(f"[*] {type(source).__name__}: Bắt liên tục trên '{pcap_file or INTERFACE}', "
+          f"cửa sổ {WINDOW_SEC:g}s, Module 2 ({FEATURE_MODE}) chạy trong {WINDOW_HANDOFF}")
+    daemon = CaptureDaemon(source)
+    start_time = time.time()
+    daemon.run()
+    s = daemon.stats()
+    print(f"[*] {s['packets']} gói / {s['windows']} cửa sổ trong {time.time() - start_time:.1f}s, "
+          f"bỏ {s['windows_dropped']} cửa sổ ({s['packets_dropped']} gói) vì Module 2 không theo kịp.")
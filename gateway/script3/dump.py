@@ -1,11 +1,12 @@
 #!/usr/bin/env python3
-from scapy.all import sniff, IP, TCP, UDP, ARP, Ether, conf
 import sys
 import os
 import csv
 import time
 import ctypes # Thư viện để check quyền Admin trên Windows
 
+import capture
+
 # --- CẤU HÌNH ---
 # Trên Windows, tên interface thường là "Wi-Fi" hoặc "Ethernet"
 # Để xem danh sách tên đúng, mở CMD chạy: "getmac" hoặc xem trong Network Connections
@@ -16,6 +17,11 @@ INTERFACE = "Wi-Fi"
 CAPTURE_DURATION_SEC = 5
 CAPTURE_PACKET_COUNT = 1000 
 
+# Bộ bắt gói: auto | afpacket | libpcap | scapy
+#   auto: AF_PACKET (Linux) → libpcap/Npcap qua ctypes → Scapy; không dựng object Scapy cho từng gói
+# Phát lại file pcap để kiểm thử: python dump.py capture.pcap (5 giây tính theo thời gian trong file)
+CAPTURE_BACKEND = os.getenv("CAPTURE_BACKEND", "auto")
+
 RAW_TEMP_FILE = "raw_temp.csv"
 RAW_FINAL_FILE = "raw.csv"
 RAW_FLOW_LOG_FILE = "raw_flow.csv"
@@ -31,12 +37,19 @@ RAW_FILE_COLUMNS = [
 packet_counter = 0
 
 def is_admin():
-    """Hàm kiểm tra quyền Admin trên Windows"""
+    """Hàm kiểm tra quyền Admin trên Windows (root trên Linux)"""
     try:
+        if hasattr(os, "geteuid"):
+            return os.geteuid() == 0
         return ctypes.windll.shell32.IsUserAnAdmin()
     except:
         return False
 
+def load_scapy():
+    """Chỉ import Scapy khi cần (fallback) - import mất ~1s"""
+    global sniff, IP, TCP, UDP, ARP, Ether
+    from scapy.all import sniff, IP, TCP, UDP, ARP, Ether
+
 def get_tcp_flags(pkt):
     """Chuyển đổi Flags TCP từ Scapy object sang chuỗi ký tự"""
     flags_str = ""
@@ -111,11 +124,44 @@ def process_packet(pkt, writer_temp, writer_log):
         # print(f"Lỗi parse packet: {e}") 
         pass
 
-def run_capture():
+def open_writers(f_temp, f_log):
+    writer_temp = csv.writer(f_temp)
+    writer_log = csv.writer(f_log)
+
+    # Ghi Header
+    writer_temp.writerow(RAW_FILE_COLUMNS)
+    if os.path.getsize(RAW_FLOW_LOG_FILE) == 0:
+        writer_log.writerow(RAW_FILE_COLUMNS)
+    return writer_temp, writer_log
+
+def run_capture(pcap_file=None):
+    source = capture.open_source(CAPTURE_BACKEND, INTERFACE, pcap_file)
+    if source is None:
+        return run_capture_scapy(pcap_file)
+
+    print(f"[*] {type(source).__name__}: Bắt đầu lắng nghe trên '{pcap_file or INTERFACE}'...")
+    print(f"[*] Cấu hình: Timeout={CAPTURE_DURATION_SEC}s HOẶC Limit={CAPTURE_PACKET_COUNT} gói")
+    print(f"[*] Filter: CHỈ IP HOẶC ARP (Bỏ qua IPv6, LLDP, STP...)")
+
+    count = 0
+    try:
+        with open(RAW_TEMP_FILE, 'w', newline='') as f_temp, \
+             open(RAW_FLOW_LOG_FILE, 'a', newline='') as f_log:
+            writer_temp, writer_log = open_writers(f_temp, f_log)
+            for row in capture.capture_rows(source, CAPTURE_DURATION_SEC, CAPTURE_PACKET_COUNT):
+                writer_temp.writerow(row)
+                writer_log.writerow(row)
+                count += 1
+    finally:
+        source.close()
+    return count
+
+def run_capture_scapy(pcap_file=None):
     global packet_counter
     packet_counter = 0
+    load_scapy()
     
-    print(f"[*] Scapy (Windows): Bắt đầu lắng nghe trên '{INTERFACE}'...")
+    print(f"[*] Scapy: Bắt đầu lắng nghe trên '{pcap_file or INTERFACE}'...")
     print(f"[*] Cấu hình: Timeout={CAPTURE_DURATION_SEC}s HOẶC Limit={CAPTURE_PACKET_COUNT} gói")
     print(f"[*] Filter: CHỈ IP HOẶC ARP (Bỏ qua IPv6, LLDP, STP...)")
 
@@ -123,13 +169,7 @@ def run_capture():
     with open(RAW_TEMP_FILE, 'w', newline='') as f_temp, \
          open(RAW_FLOW_LOG_FILE, 'a', newline='') as f_log:
         
-        writer_temp = csv.writer(f_temp)
-        writer_log = csv.writer(f_log)
-        
-        # Ghi Header
-        writer_temp.writerow(RAW_FILE_COLUMNS)
-        if os.path.getsize(RAW_FLOW_LOG_FILE) == 0:
-            writer_log.writerow(RAW_FILE_COLUMNS)
+        writer_temp, writer_log = open_writers(f_temp, f_log)
 
         def callback(pkt):
             process_packet(pkt, writer_temp, writer_log)
@@ -138,25 +178,30 @@ def run_capture():
         # filter="ip or arp": Lệnh này gửi xuống driver Npcap.
         # Driver sẽ chỉ gửi lên Python các gói IPv4 hoặc ARP.
         # Điều này giúp giảm tải CPU tối đa vì Python không phải xử lý rác.
-        sniff(iface=INTERFACE, 
-              prn=callback, 
-              store=False, 
-              timeout=CAPTURE_DURATION_SEC, 
-              count=CAPTURE_PACKET_COUNT,
-              filter="ip or arp") 
+        if pcap_file:
+            sniff(offline=pcap_file, prn=callback, store=False, count=CAPTURE_PACKET_COUNT)
+        else:
+            sniff(iface=INTERFACE, 
+                  prn=callback, 
+                  store=False, 
+                  timeout=CAPTURE_DURATION_SEC, 
+                  count=CAPTURE_PACKET_COUNT,
+                  filter="ip or arp") 
 
     return packet_counter
 
 if __name__ == "__main__":
-    # Check quyền Admin kiểu Windows
-    if not is_admin():
+    pcap_file = sys.argv[1] if len(sys.argv) > 1 else None
+
+    # Check quyền Admin kiểu Windows (phát lại file pcap không cần)
+    if not pcap_file and not is_admin():
         print("[!] Lỗi: Vui lòng click chuột phải -> 'Run as Administrator' để bắt gói tin.")
         sys.exit(1)
 
     start_time = time.time()
     
     try:
-        count = run_capture()
+        count = run_capture(pcap_file)
         end_time = time.time()
         duration = end_time - start_time
 
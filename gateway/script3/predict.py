@@ -1,13 +1,14 @@
 #!/usr/bin/env python3
 import pandas as pd
 import numpy as np
-import joblib
 import time
 import sys
 import os
 import csv
 import warnings
 
+from tree_model import TreeEnsemble
+
 # Suppress warnings
 warnings.filterwarnings("ignore")
 
@@ -17,6 +18,7 @@ INPUT_FILE = "calculated_features.csv"
 PROCESSING_FILE = "features_processing.csv"
 OUTPUT_FINAL_FILE = "final.csv"
 MODEL_FILE = "xgboost_model.joblib" 
+MODEL_NPZ_FILE = "xgboost_model.npz"  # Trees exported from MODEL_FILE by tree_model.py (no xgboost needed)
 API_ENDPOINT = "http://your-api-server/alert"
 
 # --- THRESHOLDS FOR RULE-BASED DETECTION ---
@@ -63,10 +65,11 @@ def initialize_csv_header(filepath, columns):
         except Exception as e:
             print(f"[Module 3] Error initializing header: {e}")
 
-def call_api_for_alert(label_text, flow_count):
+def call_api_for_alert(label_text, flow_count, method="Unknown"):
     print("---------------------------------")
     print(f"!!!!!!!!!! ATTACK ALERT !!!!!!!!!!!")
     print(f"TYPE: {label_text} (Count: {flow_count})")
+    print(f"METHOD: {method}")
     print(f"Calling API: {API_ENDPOINT}...")
     print("---------------------------------")
 
@@ -159,9 +162,8 @@ if __name__ == "__main__":
     
     # Load Model
     try:
-        # model = joblib.load(MODEL_FILE)
-        model = None
-        print(f"[*] [Module 3] Model '{MODEL_FILE}' loaded.")
+        model = TreeEnsemble.load(MODEL_NPZ_FILE)
+        print(f"[*] [Module 3] Model '{MODEL_NPZ_FILE}' loaded.")
     except Exception as e:
         print(f"[!] Error loading model: {e}")
         sys.exit(1)
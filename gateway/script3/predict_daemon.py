@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Module 3 chạy thường trú thay cho predict.py / predict2.py khởi động lại mỗi chu kỳ của data_collect.bat
+  - Import pandas / numpy và nạp model MỘT lần: xgboost_model.npz (tree_model, không cần xgboost), chưa xuất
+    thì xgboost_model.joblib (chạy thử một dòng để model khởi tạo xong)
+  - Chờ calculated_features.csv bằng inotify (Linux, qua ctypes): file ghi xong (IN_CLOSE_WRITE) hoặc được
+    os.replace vào (IN_MOVED_TO, cách calculate.write_features ghi) → xử lý ngay; không có inotify → hỏi lại
+    mỗi CHECK_INTERVAL_SEC như vòng while True bị comment trong predict.py
+  - Nhận file bằng cách đổi tên sang features_processing.csv như bản chạy một lần, rồi gọi run_predictor
+  - In độ trễ từng lô: thời gian xử lý và thời gian từ lúc file feature xuất hiện tới khi có kết quả
+Chạy: python predict_daemon.py   (PREDICT_MODULE=predict2: chỉ luật, không nạp model)
+"""
+import ctypes
+import ctypes.util
+import importlib
+import os
+import select
+import statistics
+import struct
+import sys
+import time
+
+import numpy as np
+
+# --- CẤU HÌNH ---
+PREDICT_MODULE = os.getenv("PREDICT_MODULE", "predict")   # predict (luật + ML) | predict2 (chỉ luật)
+
+predictor = importlib.import_module(PREDICT_MODULE)
+
+# inotify (sys/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len (+ tên file len byte)
+
+
+class InotifyWatcher:
+    """Theo dõi một thư mục, wait() trả về True khi có sự kiện cho đúng tên file cần chờ."""
+
+    def __init__(self, directory, filename):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        self.filename = os.fsencode(filename)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+            err = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(err, f"inotify_add_watch {directory}")
+
+    def wait(self, timeout):
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return False
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return False
+        hit, offset = False, 0
+        while offset + _EVENT.size <= len(buf):
+            _, mask, _, length = _EVENT.unpack_from(buf, offset)
+            name = buf[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0")
+            offset += _EVENT.size + length
+            # Tràn hàng đợi sự kiện → không biết đã bỏ lỡ gì, coi như có file mới
+            if name == self.filename or mask & IN_Q_OVERFLOW:
+                hit = True
+        return hit
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Không có inotify (Windows, macOS): ngủ hết chu kỳ rồi để vòng chính kiểm tra file."""
+
+    def wait(self, timeout):
+        time.sleep(timeout)
+        return False
+
+    def close(self):
+        pass
+
+
+def open_watcher(directory, filename):
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(directory, filename)
+        except (OSError, AttributeError) as e:
+            print(f"[Module 3] Không dùng được inotify ({e}), hỏi lại mỗi {predictor.CHECK_INTERVAL_SEC}s.")
+    return PollingWatcher()
+
+
+def load_model():
+    if PREDICT_MODULE == "predict2":
+        return None  # predict2 chạy chế độ chỉ luật, không gọi model
+    if os.path.exists(predictor.MODEL_NPZ_FILE):
+        model = predictor.TreeEnsemble.load(predictor.MODEL_NPZ_FILE)
+    else:
+        import joblib
+        model = joblib.load(predictor.MODEL_FILE)
+    model.predict(np.zeros((1, len(predictor.MODEL_FEATURE_COLUMNS))))  # lần predict đầu khởi tạo booster
+    return model
+
+
+def claim_input():
+    """Đổi tên file feature sang PROCESSING_FILE (như predict.py); trả về mtime của file, None nếu chưa nhận được."""
+    try:
+        landed = os.stat(predictor.INPUT_FILE).st_mtime
+        if os.path.exists(predictor.PROCESSING_FILE):
+            os.remove(predictor.PROCESSING_FILE)
+        os.rename(predictor.INPUT_FILE, predictor.PROCESSING_FILE)
+        return landed
+    except FileNotFoundError:
+        return None
+    except PermissionError:
+        print("[Module 3] Input file locked by Module 2. Retrying.")
+        return None
+
+
+class PredictDaemon:
+    def __init__(self, model, watcher):
+        self.model = model
+        self.watcher = watcher
+        self.latencies = []  # ms từ lúc file xuất hiện tới khi xử lý xong
+
+    def process_once(self):
+        landed = claim_input()
+        if landed is None:
+            return False
+        t0 = time.perf_counter()
+        try:
+            with open(predictor.PROCESSING_FILE, "rb") as f:
+                flows = max(sum(1 for _ in f) - 1, 0)
+            predictor.run_predictor(self.model)
+        finally:
+            try:
+                os.remove(predictor.PROCESSING_FILE)
+            except OSError:
+                pass
+        busy = 1000 * (time.perf_counter() - t0)
+        latency = max(1000 * (time.time() - landed), busy)
+        self.latencies.append(latency)
+        print(f"[Module 3] Lô #{len(self.latencies)}: {flows} luồng, xử lý {busy:.1f} ms, "
+              f"từ lúc có file feature tới kết quả {latency:.1f} ms")
+        return True
+
+    def run(self):
+        try:
+            while True:
+                # Kiểm tra cả khi hết thời gian chờ: file có sẵn lúc khởi động hoặc sự kiện bị bỏ lỡ
+                if os.path.exists(predictor.INPUT_FILE):
+                    self.process_once()
+                self.watcher.wait(predictor.CHECK_INTERVAL_SEC)
+        except KeyboardInterrupt:
+            print("\n[*] [Module 3] Stopped.")
+        finally:
+            self.watcher.close()
+
+    def stats(self):
+        if not self.latencies:
+            return {"batches": 0}
+        return {"batches": len(self.latencies), "p50_ms": statistics.median(self.latencies),
+                "max_ms": max(self.latencies)}
+
+
+if __name__ == "__main__":
+    print(f"[*] [Module 3] Starting resident detection service ({PREDICT_MODULE})...")
+    t0 = time.perf_counter()
+    try:
+        model = load_model()
+    except Exception as e:
+        print(f"[!] Error loading model: {e}")
+        sys.exit(1)
+    watcher = open_watcher(os.path.dirname(os.path.abspath(predictor.INPUT_FILE)), os.path.basename(predictor.INPUT_FILE))
+    print(f"[*] [Module 3] Ready in {time.perf_counter() - t0:.2f}s, watching '{predictor.INPUT_FILE}' "
+          f"({type(watcher).__name__}).")
+    daemon = PredictDaemon(model, watcher)
+    daemon.run()
+    print(f"[*] [Module 3] {daemon.stats()}")
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Mô hình XGBoost dạng mảng NumPy cho Module 3 - lúc chạy không cần xgboost / joblib
+  - export_model: đọc booster trong xgboost_model.joblib (chỉ bước này cần xgboost) và trải cả 1400 cây thành
+    mảng phẳng: feature, ngưỡng (nút lá: giá trị lá), con trái (con phải luôn = con trái + 1 trong XGBoost),
+    nhánh mặc định khi thiếu giá trị; nút lá trỏ về chính nó → mọi dòng đi đúng `depth` bước
+  - TreeEnsemble.predict: mỗi khối dòng so sánh một lần với các split khác nhau (~1000 cặp feature / ngưỡng cho
+    ~6400 nút) rồi đi cùng lúc mọi cây cho mọi dòng: mỗi tầng nút = con trái[nút] + hướng[dòng, split[nút]];
+    cộng lá theo thứ tự cây của từng lớp bằng float32 như XGBoost → margin trùng từng bit với
+    booster.predict(output_margin=True)
+  - So với model.predict: không import xgboost (khởi động ~0.1 s thay vì ~2 s), file .npz ~90 KB, không phụ
+    thuộc phiên bản pickle; lô lớn chậm hơn XGBoost (C++) khoảng 3 lần - lô của Module 3 nhỏ nên không đáng kể
+Chạy: python tree_model.py [xgboost_model.joblib] [xgboost_model.npz]   (xuất lại sau mỗi lần train)
+"""
+import json
+import sys
+
+import numpy as np
+
+# --- CẤU HÌNH ---
+MODEL_FILE = "xgboost_model.joblib"
+MODEL_NPZ_FILE = "xgboost_model.npz"
+PREDICT_CHUNK_ROWS = 256    # số dòng mỗi lượt: mảng (dòng, cây) vừa cache, lô lớn hơn chậm đi
+
+SUPPORTED_OBJECTIVES = ("multi:softmax", "multi:softprob")
+
+
+def _tree_depth(left, right):
+    depth, level = 0, [0]
+    while True:
+        level = [c for n in level if left[n] != -1 for c in (left[n], right[n])]
+        if not level:
+            return depth
+        depth += 1
+
+
+def export_model(model):
+    """Booster (XGBClassifier hoặc xgboost.Booster) → dict mảng NumPy để np.savez."""
+    booster = model.get_booster() if hasattr(model, "get_booster") else model
+    learner = json.loads(booster.save_raw("json"))["learner"]
+    objective = learner["objective"]["name"]
+    if objective not in SUPPORTED_OBJECTIVES:
+        raise ValueError(f"Objective không hỗ trợ: {objective} ({' | '.join(SUPPORTED_OBJECTIVES)})")
+    gbtree = learner["gradient_booster"]
+    if gbtree["name"] != "gbtree":
+        raise ValueError(f"Chỉ hỗ trợ gbtree, không hỗ trợ {gbtree['name']}")
+    trees = gbtree["model"]["trees"]
+    if any(any(t["split_type"]) for t in trees):
+        raise ValueError("Không hỗ trợ split categorical")
+
+    num_class = int(learner["learner_model_param"]["num_class"])
+    # base_score của multi-class là mảng (một giá trị mỗi lớp), bản cũ là một số
+    base_score = np.atleast_1d(np.array(json.loads(learner["learner_model_param"]["base_score"]), dtype=np.float32))
+    base_score = np.broadcast_to(base_score, (num_class,)).copy()
+
+    # Thứ tự cây của từng lớp (tree_info): lớp c cộng lá theo đúng thứ tự này
+    tree_class = np.asarray(gbtree["model"]["tree_info"], dtype=np.int32)
+    per_class = np.bincount(tree_class, minlength=num_class)
+    if (per_class != per_class[0]).any():
+        raise ValueError(f"Số cây mỗi lớp không đều: {per_class.tolist()}")
+    class_trees = np.stack([np.flatnonzero(tree_class == c) for c in range(num_class)]).astype(np.int32)
+
+    sizes = np.array([len(t["left_children"]) for t in trees])
+    roots = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int32)
+    left = np.concatenate([t["left_children"] for t in trees]).astype(np.int32)
+    right = np.concatenate([t["right_children"] for t in trees]).astype(np.int32)
+    is_leaf = left == -1
+    if (right[~is_leaf] != left[~is_leaf] + 1).any():
+        raise ValueError("Con phải không nằm ngay sau con trái")
+    node = np.arange(len(left), dtype=np.int32)
+    left = np.where(is_leaf, node, left + np.repeat(roots, sizes)).astype(np.int32)
+
+    return {
+        "feature": np.concatenate([t["split_indices"] for t in trees]).astype(np.int32),
+        # Nút lá: split_conditions chính là giá trị lá (đã nhân learning rate)
+        "threshold": np.concatenate([t["split_conditions"] for t in trees]).astype(np.float32),
+        "left": left,
+        "default_left": np.concatenate([t["default_left"] for t in trees]).astype(bool),
+        "roots": roots,
+        "class_trees": class_trees,
+        "base_score": base_score,
+        "depth": np.int32(max(_tree_depth(t["left_children"], t["right_children"]) for t in trees)),
+        "feature_names": np.array(booster.feature_names or [], dtype=str),
+    }
+
+
+class TreeEnsemble:
+    def __init__(self, arrays):
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.left = arrays["left"].astype(np.intp)  # chỉ số intp: numpy không phải đổi kiểu mỗi lần gather
+        self.default_left = arrays["default_left"]
+        self.roots = arrays["roots"].astype(np.intp)
+        self.class_trees = arrays["class_trees"]
+        self.base_score = arrays["base_score"]
+        self.depth = int(arrays["depth"])
+        self.feature_names = [str(name) for name in arrays["feature_names"]]
+
+        # Nút cùng (feature, ngưỡng, nhánh mặc định) cho cùng hướng → so sánh một lần mỗi split khác nhau
+        internal = self.left != np.arange(len(self.left))
+        splits = np.stack([self.feature, self.threshold.view(np.int32), self.default_left], axis=1)[internal]
+        unique, inverse = np.unique(splits, axis=0, return_inverse=True)
+        self.split_feature = unique[:, 0].astype(np.intp)
+        self.split_threshold = unique[:, 1].astype(np.int32).view(np.float32)
+        self.split_default_left = unique[:, 2].astype(bool)
+        # Nút lá dùng cột cuối luôn bằng 0 → nút = con trái[nút] + 0 = chính nó
+        self.node_split = np.full(len(self.left), len(unique), dtype=np.intp)
+        self.node_split[internal] = inverse.ravel()
+
+    @classmethod
+    def load(cls, path=MODEL_NPZ_FILE):
+        with np.load(path, allow_pickle=False) as npz:
+            return cls({key: npz[key] for key in npz.files})
+
+    def _leaves(self, X):
+        """Giá trị lá (dòng, cây) của một khối dòng."""
+        n_splits = len(self.split_feature)
+        x = X[:, self.split_feature]
+        # Giống XGBoost: x < ngưỡng → trái; NaN → nhánh mặc định. 1 = sang phải (con trái + 1)
+        right = np.zeros((len(X), n_splits + 1), dtype=np.int8)
+        right[:, :n_splits] = np.where(np.isnan(x), ~self.split_default_left, ~(x < self.split_threshold))
+        node = self.left[self.roots] + right[:, self.node_split[self.roots]]
+        flat = right.ravel()
+        row_offset = np.arange(len(X), dtype=np.intp)[:, None] * (n_splits + 1)
+        for _ in range(self.depth - 1):
+            node = self.left[node] + flat[row_offset + self.node_split[node]]
+        return self.threshold[node]
+
+    def predict_margin(self, X, chunk=PREDICT_CHUNK_ROWS):
+        if hasattr(X, "columns") and self.feature_names:
+            X = X[self.feature_names]
+        X = np.asarray(X, dtype=np.float32)  # XGBoost so sánh ở float32
+        margin = np.empty((len(X), len(self.base_score)), dtype=np.float32)
+        for lo in range(0, len(X), chunk):
+            leaves = self._leaves(X[lo:lo + chunk])
+            out = np.broadcast_to(self.base_score, (len(leaves), len(self.base_score))).copy()
+            # Cộng tuần tự theo thứ tự cây của mỗi lớp (float32) → trùng từng bit với XGBoost
+            for k in range(self.class_trees.shape[1]):
+                out += leaves[:, self.class_trees[:, k]]
+            margin[lo:lo + chunk] = out
+        return margin
+
+    def predict(self, X):
+        """Nhãn lớp (int) như XGBClassifier.predict."""
+        return self.predict_margin(X).argmax(axis=1)
+
+
+if __name__ == "__main__":
+    import joblib
+
+    src = sys.argv[1] if len(sys.argv) > 1 else MODEL_FILE
+    dst = sys.argv[2] if len(sys.argv) > 2 else MODEL_NPZ_FILE
+    arrays = export_model(joblib.load(src))
+    np.savez_compressed(dst, **arrays)
+    print(f"[*] Đã xuất {len(arrays['roots'])} cây / {len(arrays['feature'])} nút "
+          f"(sâu tối đa {int(arrays['depth'])}) từ '{src}' → '{dst}'.")
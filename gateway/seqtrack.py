@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Sequence Tracker - Theo dõi seq_num từng thiết bị: mất gói, trùng lặp, phát lại (replay)
+  - Mỗi thiết bị giữ một bitmap trượt W bit (W = window) tính từ seq cao nhất đã thấy → O(1) mỗi gói
+  - seq mới hơn: dịch bitmap, khoảng trống được tính là mất gói
+  - seq cũ trong cửa sổ: bit đã bật → trùng lặp; chưa bật → gói đến trễ (bù lại số mất)
+  - seq cũ hơn cửa sổ → replay / ngoài cửa sổ
+  - ESP32 khởi động lại → reset trạng thái, không coi là replay, khi seq đã thấy/quá cũ và:
+      * uptime nhỏ hơn điểm boot VÀ thiết bị phải boot sau gói được nhận cuối cùng
+        (uptime <= thời gian từ lần nhận cuối + uptime_slack), giữ qua restart_confirm gói liên tiếp có seq và
+        uptime tăng, uptime tăng khớp đồng hồ gateway → gói cũ phát lại (kể cả sau khi gateway khởi động lại,
+        điểm boot lúc đó chỉ là uptime gói đầu tiên) không thỏa
+      * hoặc restart_after gói liên tiếp bị từ chối với seq tăng dần VÀ không nhận gói nào trong restart_quiet
+        giây - thiết bị thật đang gửi thì gói mới liên tục phá chuỗi phát lại
+  - Bộ nhớ giới hạn: tối đa max_devices thiết bị (LRU), chia stripe để các worker không tranh chấp lock
+"""
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+FIRST = "first"
+NEW = "new"
+LATE = "late"
+DUPLICATE = "duplicate"
+REPLAY = "replay"
+RESTART = "restart"
+
+
+class _DeviceSeq:
+    __slots__ = ("highest", "bitmap", "boot_uptime", "last_accept", "reject_run", "reject_last", "boot_run",
+                 "boot_last", "boot_uptime_last", "boot_time_last", "received", "lost", "duplicates", "replays",
+                 "late", "restarts")
+
+    def __init__(self, seq, uptime, now):
+        self.highest = seq
+        self.bitmap = 1
+        self.boot_uptime = uptime
+        self.last_accept = now
+        self.reject_run = 0
+        self.reject_last = seq
+        self.boot_run = 0
+        self.boot_last = seq
+        self.boot_uptime_last = None
+        self.boot_time_last = now
+        self.received = 1
+        self.lost = 0
+        self.duplicates = 0
+        self.replays = 0
+        self.late = 0
+        self.restarts = 0
+
+    def reset(self, seq, uptime, now):
+        self.highest = seq
+        self.bitmap = 1
+        self.boot_uptime = uptime
+        self.last_accept = now
+        self.reject_run = 0
+        self.boot_run = 0
+        self.restarts += 1
+        self.received += 1
+
+
+class _Stripe:
+    __slots__ = ("lock", "devices")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.devices = OrderedDict()
+
+
+class SequenceTracker:
+    def __init__(self, window=256, max_devices=10000, stripes=16, restart_after=5, restart_quiet=10.0,
+                 restart_confirm=3, uptime_slack=2.0, clock=time.monotonic):
+        """uptime tính bằng giây (timestamp của ESP32); clock: đồng hồ gateway (giây, đơn điệu)."""
+        self.window = window
+        self.restart_after = max(1, restart_after)
+        self.restart_quiet = restart_quiet
+        self.restart_confirm = max(1, restart_confirm)
+        self.uptime_slack = uptime_slack
+        self.clock = clock
+        self.mask = (1 << window) - 1
+        self.stripes = [_Stripe() for _ in range(stripes)]
+        self.per_stripe = max(1, max_devices // stripes)
+
+    def check(self, dev_id, seq, uptime=None):
+        """Phân loại seq_num của một gói. Trả về FIRST/NEW/LATE/DUPLICATE/REPLAY/RESTART."""
+        stripe = self.stripes[zlib.crc32(dev_id.encode()) % len(self.stripes)]
+        now = self.clock()
+        with stripe.lock:
+            devices = stripe.devices
+            st = devices.get(dev_id)
+            if st is None:
+                if len(devices) >= self.per_stripe:
+                    devices.popitem(last=False)
+                devices[dev_id] = _DeviceSeq(seq, uptime, now)
+                return FIRST
+            devices.move_to_end(dev_id)
+            return self._classify(st, seq, uptime, now)
+
+    def _classify(self, st, seq, uptime, now):
+        diff = seq - st.highest
+        if diff > 0:
+            if diff > 1:
+                st.lost += diff - 1
+            st.bitmap = ((st.bitmap << diff) | 1) & self.mask if diff < self.window else 1
+            st.highest = seq
+            st.received += 1
+            st.last_accept = now
+            st.reject_run = 0
+            st.boot_run = 0
+            if st.boot_uptime is None:
+                st.boot_uptime = uptime
+            return NEW
+
+        offset = -diff
+        bit = 1 << offset if offset < self.window else 0
+        if bit and not st.bitmap & bit:
+            st.bitmap |= bit
+            st.late += 1
+            st.received += 1
+            st.last_accept = now
+            if st.lost:
+                st.lost -= 1
+            return LATE
+
+        # seq đã thấy / quá cũ: uptime thấp hơn điểm boot → có thể thiết bị vừa khởi động lại
+        # (gói trễ thật cũng có uptime nhỏ hơn nên chỉ xét ở nhánh này)
+        if self._boot_candidate(st, seq, uptime, now):
+            if st.boot_run >= self.restart_confirm:
+                st.reset(seq, uptime, now)
+                return RESTART
+        else:
+            st.boot_run = 0
+
+        # Chuỗi gói bị từ chối với seq tăng dần trong lúc thiết bị im lặng → thiết bị đã reset seq_num
+        if st.reject_run and seq > st.reject_last:
+            st.reject_run += 1
+        else:
+            st.reject_run = 1
+        st.reject_last = seq
+        if st.reject_run >= self.restart_after and now - st.last_accept >= self.restart_quiet:
+            st.reset(seq, uptime, now)
+            return RESTART
+        if bit:
+            st.duplicates += 1
+            return DUPLICATE
+        st.replays += 1
+        return REPLAY
+
+    def _boot_candidate(self, st, seq, uptime, now):
+        """Gói có thể là gói đầu của lần boot mới; cập nhật chuỗi boot_run."""
+        if uptime is None or st.boot_uptime is None or not uptime < st.boot_uptime:
+            return False
+        # Thiết bị boot lúc now - uptime, phải sau gói được nhận cuối cùng
+        if uptime > now - st.last_accept + self.uptime_slack:
+            return False
+        if st.boot_run and seq > st.boot_last and uptime > st.boot_uptime_last and \
+                abs((uptime - st.boot_uptime_last) - (now - st.boot_time_last)) <= self.uptime_slack:
+            st.boot_run += 1
+        else:
+            st.boot_run = 1
+        st.boot_last, st.boot_uptime_last, st.boot_time_last = seq, uptime, now
+        return True
+
+    def stats(self):
+        """{dev_id: {...}} cho từng thiết bị đang được theo dõi."""
+        out = {}
+        for stripe in self.stripes:
+            with stripe.lock:
+                items = list(stripe.devices.items())
+            for dev_id, st in items:
+                total = st.received + st.lost
+                out[dev_id] = {
+                    "highest_seq": st.highest,
+                    "received": st.received,
+                    "lost": st.lost,
+                    "loss_rate": st.lost / total if total else 0.0,
+                    "late": st.late,
+                    "duplicates": st.duplicates,
+                    "replays": st.replays,
+                    "restarts": st.restarts,
+                }
+        return out
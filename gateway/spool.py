@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Spool - Hàng đợi lưu trên đĩa (store-and-forward) khi backend lỗi hoặc chậm
+  - Log append-only chia segment: mỗi bản ghi = [độ dài][crc32][JSON]
+  - Ghi trước (write-ahead), chỉ xóa khi backend xác nhận (ack)
+  - Chính sách fsync: always | interval | never
+  - Xoay segment theo kích thước, giới hạn tổng dung lượng (bỏ segment cũ nhất)
+  - Khởi động lại nhanh: đọc checkpoint + chỉ quét segment cuối cùng
+  - Phát lại đúng thứ tự, chỉ giới hạn tốc độ khi xả backlog để không dội lên backend
+"""
+import json
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+
+RECORD_HEADER = struct.Struct("<II")  # length, crc32
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".log"
+CHECKPOINT_FILE = "checkpoint.json"
+
+log = logging.getLogger("gateway.spool")
+
+
+def _segment_name(seg_id):
+    return f"{SEGMENT_PREFIX}{seg_id:012d}{SEGMENT_SUFFIX}"
+
+
+class SegmentLog:
+    def __init__(self, directory, segment_bytes=8 * 1024 * 1024, max_bytes=512 * 1024 * 1024,
+                 fsync="interval", fsync_interval=1.0):
+        if fsync not in ("always", "interval", "never"):
+            raise ValueError(f"fsync policy không hợp lệ: {fsync}")
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.lock = threading.Lock()
+        self.appended = 0
+        self.acked = 0
+        self.dropped_bytes = 0
+        self._last_fsync = time.monotonic()
+        self._dirty = False
+        os.makedirs(directory, exist_ok=True)
+        self._recover()
+
+    # ---------- Khôi phục ----------
+    def _path(self, seg_id):
+        return os.path.join(self.directory, _segment_name(seg_id))
+
+    def _list_segments(self):
+        ids = []
+        for name in os.listdir(self.directory):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                try:
+                    ids.append(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+                except ValueError:
+                    pass
+        return sorted(ids)
+
+    def _load_checkpoint(self):
+        try:
+            with open(os.path.join(self.directory, CHECKPOINT_FILE), "r") as f:
+                cp = json.load(f)
+            return int(cp["segment"]), int(cp["offset"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _valid_end(self, seg_id, start):
+        """Quét một segment từ start, trả về offset cuối cùng của bản ghi hợp lệ."""
+        offset = start
+        with open(self._path(seg_id), "rb") as f:
+            f.seek(start)
+            while True:
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    break
+                length, crc = RECORD_HEADER.unpack(header)
+                body = f.read(length)
+                if len(body) < length or zlib.crc32(body) != crc:
+                    break
+                offset += RECORD_HEADER.size + length
+        return offset
+
+    def _recover(self):
+        segments = self._list_segments()
+        checkpoint = self._load_checkpoint()
+
+        if not segments:
+            segments = [checkpoint[0] if checkpoint else 0]
+            open(self._path(segments[0]), "ab").close()
+
+        # Checkpoint trỏ tới segment đã bị xóa (hoặc không có) → đọc từ đầu segment cũ nhất còn lại
+        if checkpoint is None or checkpoint[0] < segments[0]:
+            checkpoint = (segments[0], 0)
+        self.segments = segments
+        self.sizes = {s: os.path.getsize(self._path(s)) for s in segments}
+
+        # Chỉ segment cuối có thể bị ghi dở khi crash → cắt phần đuôi hỏng
+        last = segments[-1]
+        start = checkpoint[1] if checkpoint[0] == last else 0
+        start = min(start, self.sizes[last])
+        end = self._valid_end(last, start)
+        if end < self.sizes[last]:
+            log.warning("[SPOOL] Cắt %d byte ghi dở ở cuối %s", self.sizes[last] - end, _segment_name(last))
+            with open(self._path(last), "r+b") as f:
+                f.truncate(end)
+            self.sizes[last] = end
+
+        self.commit_pos = checkpoint
+        self.read_pos = checkpoint
+        self._reader = None
+        self._reader_seg = None
+        self._writer = open(self._path(last), "ab")
+        log.info("[SPOOL] Khôi phục: %d segment, %d byte, checkpoint=%d:%d",
+                 len(segments), self.total_bytes(), checkpoint[0], checkpoint[1])
+
+    # ---------- Ghi ----------
+    def total_bytes(self):
+        return sum(self.sizes.values())
+
+    def append(self, payload):
+        body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode("utf-8")
+        record = RECORD_HEADER.pack(len(body), zlib.crc32(body)) + body
+        with self.lock:
+            last = self.segments[-1]
+            if self.sizes[last] and self.sizes[last] + len(record) > self.segment_bytes:
+                last = self._rotate()
+            self._writer.write(record)
+            self._writer.flush()
+            self.sizes[last] += len(record)
+            self.appended += 1
+            self._dirty = True
+            if self.fsync == "always":
+                self._fsync_writer()
+            elif self.fsync == "interval":
+                self.maybe_fsync()
+            if self.total_bytes() > self.max_bytes:
+                self._enforce_cap()
+
+    def maybe_fsync(self):
+        if self._dirty and time.monotonic() - self._last_fsync >= self.fsync_interval:
+            self._fsync_writer()
+
+    def _fsync_writer(self):
+        os.fsync(self._writer.fileno())
+        self._last_fsync = time.monotonic()
+        self._dirty = False
+
+    def _rotate(self):
+        if self.fsync != "never":
+            self._fsync_writer()
+        self._writer.close()
+        new_id = self.segments[-1] + 1
+        self.segments.append(new_id)
+        self.sizes[new_id] = 0
+        self._writer = open(self._path(new_id), "ab")
+        return new_id
+
+    def _enforce_cap(self):
+        # Luôn giữ segment đang ghi; bỏ segment cũ nhất kể cả khi chưa ack
+        while self.total_bytes() > self.max_bytes and len(self.segments) > 1:
+            oldest = self.segments.pop(0)
+            self.dropped_bytes += self.sizes.pop(oldest)
+            self._remove_segment(oldest)
+            log.error("[SPOOL] Vượt giới hạn %d byte → bỏ %s", self.max_bytes, _segment_name(oldest))
+            if self.commit_pos[0] <= oldest:
+                self.commit_pos = (self.segments[0], 0)
+                self._write_checkpoint()
+            if self.read_pos[0] <= oldest:
+                self.read_pos = (self.segments[0], 0)
+
+    def _remove_segment(self, seg_id):
+        if self._reader_seg == seg_id:
+            self._reader.close()
+            self._reader, self._reader_seg = None, None
+        try:
+            os.remove(self._path(seg_id))
+        except OSError:
+            pass
+
+    # ---------- Đọc / ack ----------
+    def read_batch(self, max_count):
+        """Đọc tối đa max_count bản ghi từ con trỏ đọc. Trả về [(vị trí sau bản ghi, payload)]."""
+        out = []
+        with self.lock:
+            seg, offset = self.read_pos
+            while len(out) < max_count:
+                if offset >= self.sizes.get(seg, 0):
+                    nxt = [s for s in self.segments if s > seg]
+                    if not nxt:
+                        break
+                    seg, offset = nxt[0], 0
+                    continue
+                if self._reader_seg != seg:
+                    if self._reader:
+                        self._reader.close()
+                    self._reader, self._reader_seg = open(self._path(seg), "rb"), seg
+                self._reader.seek(offset)
+                length, crc = RECORD_HEADER.unpack(self._reader.read(RECORD_HEADER.size))
+                body = self._reader.read(length)
+                offset += RECORD_HEADER.size + length
+                if zlib.crc32(body) != crc:
+                    log.error("[SPOOL] Bản ghi hỏng tại %s:%d → bỏ qua", _segment_name(seg), offset)
+                    continue
+                out.append(((seg, offset), json.loads(body)))
+            self.read_pos = (seg, offset)
+        return out
+
+    def at_head(self):
+        """True nếu con trỏ đọc đã tới cuối log (không còn backlog chưa đọc)."""
+        with self.lock:
+            seg, offset = self.read_pos
+            return seg == self.segments[-1] and offset >= self.sizes[seg]
+
+    def rewind(self):
+        """Gửi thất bại → quay con trỏ đọc về checkpoint để phát lại đúng thứ tự."""
+        with self.lock:
+            self.read_pos = self.commit_pos
+
+    def ack(self, position, count):
+        with self.lock:
+            if position <= self.commit_pos:
+                return
+            self.commit_pos = position
+            self.acked += count
+            self._write_checkpoint()
+            # Xóa các segment đã được ack toàn bộ
+            while len(self.segments) > 1 and self.segments[0] < position[0]:
+                oldest = self.segments.pop(0)
+                self.sizes.pop(oldest)
+                self._remove_segment(oldest)
+
+    def _write_checkpoint(self):
+        path = os.path.join(self.directory, CHECKPOINT_FILE)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"segment": self.commit_pos[0], "offset": self.commit_pos[1]}, f)
+            if self.fsync == "always":
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def pending(self):
+        """Số byte (kể cả header) còn chờ ack."""
+        with self.lock:
+            seg, offset = self.commit_pos
+            return sum(size for s, size in self.sizes.items() if s >= seg) - offset
+
+    def close(self):
+        with self.lock:
+            if self.fsync != "never":
+                self._fsync_writer()
+            self._writer.close()
+            if self._reader:
+                self._reader.close()
+
+
+class StoreAndForward:
+    """Ghi mọi payload vào SegmentLog rồi chuyển tiếp theo thứ tự qua deliver(batch) -> số gói đã ack."""
+
+    def __init__(self, log, deliver, batch_size=20, replay_rate=50.0, max_backoff=30.0):
+        self.log = log
+        self.deliver = deliver
+        self.batch_size = max(1, batch_size)
+        self.replay_rate = replay_rate
+        self.max_backoff = max_backoff
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._tokens = float(self.batch_size)
+        self._last_refill = time.monotonic()
+        # Chỉ giới hạn tốc độ khi đang xả backlog (sau lỗi backend hoặc còn dữ liệu từ lần chạy trước);
+        # lưu lượng trực tiếp khi backend khỏe được gửi ngay
+        self.replaying = log.pending() > 0
+
+    def submit(self, payload):
+        self.log.append(payload)
+        self._wakeup.set()
+        return True
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="spool-forwarder", daemon=True)
+        self._thread.start()
+        log.info("[SPOOL] Chuyển tiếp từ %s | batch=%d | giới hạn phát lại %s msg/s | fsync=%s",
+                 self.log.directory, self.batch_size, self.replay_rate, self.log.fsync)
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self.log.close()
+
+    def _throttle(self, count):
+        """Token bucket: chờ cho đến khi đủ token cho count gói."""
+        if not self.replay_rate:
+            return
+        while not self._stop.is_set():
+            now = time.monotonic()
+            self._tokens = min(float(self.batch_size),
+                               self._tokens + (now - self._last_refill) * self.replay_rate)
+            self._last_refill = now
+            if self._tokens >= count:
+                self._tokens -= count
+                return
+            time.sleep((count - self._tokens) / self.replay_rate)
+
+    def _run(self):
+        backoff = 1.0
+        while not self._stop.is_set():
+            if self.log.fsync == "interval":
+                with self.log.lock:
+                    self.log.maybe_fsync()
+            batch = self.log.read_batch(self.batch_size)
+            if not batch:
+                self._wakeup.wait(1.0)
+                self._wakeup.clear()
+                continue
+
+            if self.replaying:
+                self._throttle(len(batch))
+            delivered = self.deliver([payload for _, payload in batch])
+            if delivered:
+                self.log.ack(batch[delivered - 1][0], delivered)
+            if delivered < len(batch):
+                # Backend lỗi: giữ nguyên phần chưa ack trên đĩa, chờ rồi phát lại đúng thứ tự
+                self.log.rewind()
+                log.warning("[SPOOL] Backend chưa sẵn sàng, còn %d byte chờ gửi → thử lại sau %.0fs",
+                            self.log.pending(), backoff)
+                self.replaying = True
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+            else:
+                backoff = 1.0
+                if self.replaying and self.log.at_head():
+                    self.replaying = False
+                    self._tokens = float(self.batch_size)
+                    log.info("[SPOOL] Đã xả hết backlog → gửi trực tiếp, không giới hạn tốc độ")
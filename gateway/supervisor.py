@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Supervisor - Chạy N instance gateway chia tải qua MQTT 5 shared subscription
+  - Mọi worker subscribe $share/<MQTT_SHARE_GROUP>/iot/sensor/# → broker chia tin nhắn cho từng worker
+  - Worker i: GATEWAY_INSTANCE=i (GATEWAY_UID có hậu tố -i), METRICS_PORT = cổng gốc + i, SPOOL_DIR/i
+  - Worker thoát bất thường → khởi động lại, backoff tăng dần nếu crash liên tục
+  - Ctrl+C / SIGTERM → gửi SIGINT cho mọi worker (dừng gọn, gửi nốt hàng đợi), quá hạn thì kill
+Chạy: python supervisor.py   (SUPERVISOR_WORKERS=4, SUPERVISOR_MODE=thread|async)
+"""
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from logger import setup_logging, shutdown_logging
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+SUPERVISOR_WORKERS = int(os.getenv("SUPERVISOR_WORKERS", os.cpu_count() or 1))
+SUPERVISOR_MODE = os.getenv("SUPERVISOR_MODE", "thread")  # thread → gateway.py | async → gateway_async.py
+SUPERVISOR_SHARE_GROUP = os.getenv("MQTT_SHARE_GROUP", "").strip() or "gateway"
+SUPERVISOR_STOP_TIMEOUT = float(os.getenv("SUPERVISOR_STOP_TIMEOUT", 20))
+RESTART_BACKOFF_MAX = float(os.getenv("RESTART_BACKOFF_MAX", 60))
+# Worker chạy lâu hơn ngưỡng này rồi mới chết → coi là ổn định, backoff về 1s
+RESTART_STABLE_AFTER = 60.0
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9108))
+SPOOL_DIR = os.getenv("SPOOL_DIR", "spool")
+
+log = logging.getLogger("gateway.supervisor")
+
+
+class Worker:
+    def __init__(self, index):
+        self.index = index
+        self.proc = None
+        self.started_at = 0.0
+        self.restarts = 0
+        self.backoff = 1.0
+        self.restart_at = 0.0
+
+    def env(self):
+        env = dict(os.environ)
+        env["GATEWAY_INSTANCE"] = str(self.index)
+        env["MQTT_SHARE_GROUP"] = SUPERVISOR_SHARE_GROUP
+        if METRICS_PORT:
+            env["METRICS_PORT"] = str(METRICS_PORT + self.index)
+        env["SPOOL_DIR"] = os.path.join(SPOOL_DIR, str(self.index))
+        return env
+
+    def start(self, script):
+        # Nhóm process riêng: Ctrl+C trên terminal chỉ tới supervisor, supervisor tự chuyển cho worker
+        self.proc = subprocess.Popen([sys.executable, script], cwd=HERE, env=self.env(), start_new_session=True)
+        self.started_at = time.monotonic()
+        log.info("[SUPERVISOR] Worker %d chạy (pid %d)", self.index, self.proc.pid)
+
+
+class Supervisor:
+    def __init__(self, num_workers=SUPERVISOR_WORKERS, mode=SUPERVISOR_MODE):
+        self.script = os.path.join(HERE, "gateway_async.py" if mode == "async" else "gateway.py")
+        self.workers = [Worker(i) for i in range(max(1, num_workers))]
+        self.stopping = False
+
+    def _on_signal(self, signum, frame):
+        self.stopping = True
+
+    def run(self):
+        signal.signal(signal.SIGINT, self._on_signal)
+        signal.signal(signal.SIGTERM, self._on_signal)
+        log.info("[SUPERVISOR] %d worker | nhóm $share/%s | %s",
+                 len(self.workers), SUPERVISOR_SHARE_GROUP, os.path.basename(self.script))
+        for w in self.workers:
+            w.start(self.script)
+        while not self.stopping:
+            time.sleep(0.5)
+            self._check()
+        self.stop()
+
+    def _check(self):
+        now = time.monotonic()
+        for w in self.workers:
+            if w.proc is None:
+                if now >= w.restart_at:
+                    w.restarts += 1
+                    w.start(self.script)
+                continue
+            code = w.proc.poll()
+            if code is None:
+                continue
+            if now - w.started_at >= RESTART_STABLE_AFTER:
+                w.backoff = 1.0
+            log.error("[SUPERVISOR] Worker %d thoát (mã %s) → khởi động lại sau %.0fs", w.index, code, w.backoff)
+            w.proc = None
+            w.restart_at = now + w.backoff
+            w.backoff = min(w.backoff * 2, RESTART_BACKOFF_MAX)
+
+    def stop(self):
+        log.info("[SUPERVISOR] Dừng %d worker...", len(self.workers))
+        running = [w for w in self.workers if w.proc is not None and w.proc.poll() is None]
+        for w in running:
+            w.proc.send_signal(signal.SIGINT)
+        deadline = time.monotonic() + SUPERVISOR_STOP_TIMEOUT
+        for w in running:
+            try:
+                w.proc.wait(max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                log.error("[SUPERVISOR] Worker %d không dừng kịp → kill", w.index)
+                w.proc.kill()
+                w.proc.wait()
+        log.info("[SUPERVISOR] Đã dừng | số lần khởi động lại: %s",
+                 {w.index: w.restarts for w in self.workers})
+
+
+def main():
+    setup_logging(os.getenv("LOG_LEVEL", "INFO"), os.getenv("LOG_FORMAT", "console"))
+    try:
+        Supervisor().run()
+    finally:
+        shutdown_logging()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Các module gateway nằm phẳng cạnh gateway.py (Dockerfile COPY . .)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+# Pipeline phát hiện tấn công (script3) chạy trong thư mục của nó, import phẳng như gateway
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "script3"))
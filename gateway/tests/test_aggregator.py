@@ -0,0 +1,126 @@
+import pytest
+
+from aggregator import Aggregator, WindowSpec, compile_rules
+
+RULES = compile_rules({
+    "TEMPERATURE": {"mode": "tumbling", "window": 60},
+    "LIGHT": {"mode": "sliding", "window": 60, "step": 20},
+    "GAS_LPG": None,
+})
+
+
+def reading(uid, sensor_type, key, value):
+    return {"sensorUid": uid, "type": sensor_type, "data": {key: value}}
+
+
+def make(emitted=None, **kwargs):
+    sink = emitted if emitted is not None else []
+    return Aggregator(RULES.get, lambda dev_id, sensors, ctx: sink.append((dev_id, sensors, ctx)), **kwargs)
+
+
+def test_unconfigured_types_pass_through():
+    agg = make()
+    gas = reading("d_mq2", "GAS_LPG", "gas_level", 300)
+    rain = reading("d_rain", "RAIN", "rain_detected", True)
+    assert agg.add("d", [gas, rain], {"dev_id": "d"}, now=0) == [gas, rain]
+    assert agg.stats()["passthrough"] == 2
+
+
+def test_tumbling_emits_one_record_per_window():
+    agg = make()
+    for t, v in ((0, 20.0), (10, 22.0), (59, 24.0)):
+        assert agg.add("d", [reading("d_t", "TEMPERATURE", "temperature", v)], {"dev_id": "d"}, now=t) == []
+    out = agg.add("d", [reading("d_t", "TEMPERATURE", "temperature", 30.0)], {"dev_id": "d"}, now=61)
+    assert len(out) == 1
+    data = out[0]["data"]
+    assert data["temperature"] == 22.0
+    assert data["aggregate"] == {"window": "tumbling", "start": 0, "end": 60000, "count": 3,
+                                 "min": 20.0, "max": 24.0, "mean": 22.0, "last": 24.0}
+
+
+def test_sliding_window_covers_last_window_each_step():
+    agg = make()
+    ctx = {"dev_id": "d"}
+    agg.add("d", [reading("d_ldr", "LIGHT", "light_level", 100)], ctx, now=5)
+    out = agg.add("d", [reading("d_ldr", "LIGHT", "light_level", 200)], ctx, now=25)
+    assert out[0]["data"]["aggregate"]["count"] == 1
+    out = agg.add("d", [reading("d_ldr", "LIGHT", "light_level", 300)], ctx, now=45)
+    assert out[0]["data"]["aggregate"]["count"] == 2
+    out = agg.add("d", [reading("d_ldr", "LIGHT", "light_level", 400)], ctx, now=65)
+    assert out[0]["data"]["aggregate"]["count"] == 3
+    # Ngăn đầu (t=5) đã trượt ra khỏi cửa sổ [20, 80)
+    out = agg.add("d", [reading("d_ldr", "LIGHT", "light_level", 500)], ctx, now=85)
+    agg_fields = out[0]["data"]["aggregate"]
+    assert agg_fields["count"] == 3 and agg_fields["min"] == 200 and agg_fields["max"] == 400
+
+
+def test_flush_closes_windows_of_silent_sensors_and_frees_state():
+    emitted = []
+    agg = make(emitted)
+    ctx = {"dev_id": "d", "seq_num": 7}
+    agg.add("d", [reading("d_t", "TEMPERATURE", "temperature", 21.0)], ctx, now=1)
+    agg.flush(now=30)
+    assert emitted == []
+    agg.flush(now=61)
+    assert len(emitted) == 1
+    dev_id, sensors, context = emitted[0]
+    assert dev_id == "d" and context is ctx and sensors[0]["data"]["aggregate"]["count"] == 1
+    assert agg.stats()["open_windows"] == 0
+
+
+def test_lru_cap_emits_evicted_window():
+    emitted = []
+    agg = make(emitted, max_sensors=2)
+    for i in range(3):
+        agg.add(f"d{i}", [reading(f"d{i}_t", "TEMPERATURE", "temperature", 20.0 + i)], {"dev_id": f"d{i}"}, now=1)
+    assert agg.stats()["open_windows"] == 2
+    assert [e[0] for e in emitted] == ["d0"]
+
+
+def test_reload_with_new_spec_closes_old_window():
+    rules = dict(RULES)
+    agg = Aggregator(rules.get, lambda *a: None)
+    agg.add("d", [reading("d_t", "TEMPERATURE", "temperature", 20.0)], {"dev_id": "d"}, now=1)
+    rules["TEMPERATURE"] = WindowSpec("TEMPERATURE", {"mode": "tumbling", "window": 10})
+    out = agg.add("d", [reading("d_t", "TEMPERATURE", "temperature", 21.0)], {"dev_id": "d"}, now=2)
+    assert out[0]["data"]["aggregate"]["count"] == 1
+
+
+@pytest.mark.parametrize("spec", [{"mode": "hopping"}, {"window": 0}, {"mode": "sliding", "window": 60, "step": 7}])
+def test_invalid_specs_are_rejected(spec):
+    with pytest.raises(ValueError):
+        WindowSpec("TEMPERATURE", spec)
+
+
+def test_report_last_keeps_bool_type():
+    rules = compile_rules({"RAIN": {"mode": "tumbling", "window": 60, "report": "last"}})
+    agg = Aggregator(rules.get, lambda *a: None)
+    ctx = {"dev_id": "d"}
+    agg.add("d", [reading("d_rain", "RAIN", "rain_detected", True)], ctx, now=1)
+    agg.add("d", [reading("d_rain", "RAIN", "rain_detected", False)], ctx, now=2)
+    out = agg.add("d", [reading("d_rain", "RAIN", "rain_detected", False)], ctx, now=61)
+    data = out[0]["data"]
+    assert data["rain_detected"] is False
+    assert data["aggregate"]["max"] == 1 and data["aggregate"]["mean"] == 0.5
+
+
+def test_flusher_emits_through_gateway_submit(monkeypatch):
+    import gateway
+
+    class Outbox:
+        def __init__(self):
+            self.payloads = []
+
+        def submit(self, payload):
+            self.payloads.append(payload)
+
+    outbox = Outbox()
+    monkeypatch.setattr(gateway, "outbox", outbox)
+    monkeypatch.setattr(gateway, "GATEWAY_UID", "GATEWAY-TEST")
+    agg = Aggregator(RULES.get, gateway.submit_sensors)
+    ctx = {"dev_id": "d", "seq_num": 9, "dev_ip": "10.0.0.2", "rssi": -50}
+    agg.add("d", [reading("d_t", "TEMPERATURE", "temperature", 21.0)], ctx, now=1)
+    agg.flush(now=61)
+    payload, = outbox.payloads
+    assert payload["sequenceNumber"] == 9 and payload["rawData"] is ctx
+    assert payload["sensors"][0]["data"]["aggregate"]["count"] == 1
@@ -0,0 +1,76 @@
+import pytest
+
+import alerts
+from alerts import AlertManager
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1700000000.0
+
+    def __call__(self):
+        return self.now
+
+
+class Sink:
+    def __init__(self):
+        self.payloads = []
+
+    def submit(self, payload):
+        self.payloads.append(payload)
+        return True
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = Clock()
+    monkeypatch.setattr(alerts.time, "time", c)
+    return c
+
+
+def test_repeats_inside_window_are_suppressed(clock):
+    sink = Sink()
+    am = AlertManager(sink, "GW", window=60)
+    assert am.raise_alert("dev1", "DOS", "flood", 3, 1, value=10)
+    for i in range(4):
+        clock.now += 5
+        assert not am.raise_alert("dev1", "DOS", "flood", 3, 2 + i, value=20 + i)
+    # Thiết bị / loại khác có cửa sổ riêng
+    assert am.raise_alert("dev2", "DOS", "flood", 3, 1)
+    assert am.raise_alert("dev1", "REPLAY", "replay", 2, 1)
+    assert len(sink.payloads) == 3
+    assert am.stats() == {"emitted": 3, "suppressed": 4, "summaries": 0, "open_windows": 3}
+
+
+def test_next_alert_after_window_sends_summary_first(clock):
+    sink = Sink()
+    am = AlertManager(sink, "GW", window=60)
+    am.raise_alert("dev1", "DOS", "flood", 2, 1, value=10)
+    clock.now += 10
+    am.raise_alert("dev1", "DOS", "flood", 4, 7, value=99)
+    clock.now += 60
+    assert am.raise_alert("dev1", "DOS", "flood", 2, 8)
+    summary, fresh = sink.payloads[1], sink.payloads[2]
+    assert summary["occurrences"] == 2 and summary["maxValue"] == 99
+    assert summary["severity"] == 4 and summary["sequenceNumber"] == 7
+    assert "lặp 2 lần" in summary["ruleDescription"]
+    assert "occurrences" not in fresh and fresh["sequenceNumber"] == 8
+
+
+def test_flush_closes_expired_windows_only(clock):
+    sink = Sink()
+    am = AlertManager(sink, "GW", window=60)
+    am.raise_alert("dev1", "DOS", "flood", 3, 1)
+    am.raise_alert("dev1", "DOS", "flood", 3, 2)
+    am.raise_alert("dev2", "DOS", "flood", 3, 1)  # không bị chặn lần nào → hết hạn không có tổng hợp
+    clock.now += 30
+    am.raise_alert("dev3", "DOS", "flood", 3, 1)
+    am.raise_alert("dev3", "DOS", "flood", 3, 2)
+    clock.now += 31
+    am.flush()
+    assert [p.get("occurrences") for p in sink.payloads[3:]] == [2]
+    assert am.stats()["open_windows"] == 1
+
+    am.flush(force=True)
+    assert [p.get("occurrences") for p in sink.payloads[3:]] == [2, 2]
+    assert am.stats() == {"emitted": 3, "suppressed": 2, "summaries": 2, "open_windows": 0}
@@ -0,0 +1,104 @@
+import random
+
+import pytest
+
+from anomaly import RATE, SPIKE, STUCK, AnomalyDetector, AnomalySpec, compile_specs
+
+SPECS = compile_specs({"temperature": {"z": 4, "max_rate": 0.5, "stuck": 10, "warmup": 20}})
+
+
+def feed(detector, values, start=0, step=3, field="temperature", dev_id="esp32_multi1"):
+    found = []
+    for i, v in enumerate(values):
+        found.extend(detector.check(dev_id, SPECS, {field: v}, start + i * step))
+    return found
+
+
+def noisy(n, seed=0, mean=27.0, sd=0.3):
+    rng = random.Random(seed)
+    return [round(rng.gauss(mean, sd), 1) for _ in range(n)]
+
+
+def test_normal_noise_raises_nothing():
+    det = AnomalyDetector()
+    assert feed(det, noisy(500)) == []
+    assert det.stats()["sensors"] == 1
+
+
+def test_spike_is_flagged_and_does_not_poison_the_baseline():
+    det = AnomalyDetector()
+    feed(det, noisy(100))
+    found = feed(det, [80.0], start=300)
+    assert any("bất thường" in d for _, d, _, _ in found)
+    assert det.stats()[SPIKE] == 1
+    # Giá trị kẹp → các mẫu bình thường ngay sau đó không bị coi là gai
+    feed(det, noisy(20, seed=1), start=303)
+    assert det.stats()[SPIKE] == 1
+
+
+def test_stuck_value_reported_once():
+    det = AnomalyDetector()
+    feed(det, noisy(30))
+    feed(det, [27.0] * 25, start=90)
+    assert det.stats()[STUCK] == 1
+
+
+def test_rate_of_change_uses_device_uptime():
+    det = AnomalyDetector()
+    feed(det, [27.0, 27.1], step=3)
+    # +3°C trong 3 giây = 1°C/s > 0.5
+    found = feed(det, [30.1], start=6)
+    assert det.stats()[RATE] == 1 and found[0][0] == "IOT_DATA_MANIPULATION"
+    # Thiết bị khởi động lại (uptime lùi) → không tính rate
+    feed(det, [35.0], start=1)
+    assert det.stats()[RATE] == 1
+
+
+def test_missing_and_non_numeric_values_are_ignored():
+    det = AnomalyDetector()
+    # multi1 gửi temperature=None khi DHT lỗi: không được làm hỏng detector
+    assert feed(det, [None, "err", True]) == []
+    assert det.stats()["sensors"] == 0
+
+
+def test_state_is_bounded_per_stripe():
+    det = AnomalyDetector(max_sensors=32, stripes=4)
+    for i in range(500):
+        det.check(f"dev{i}", SPECS, {"temperature": 25.0}, 0)
+    assert det.stats()["sensors"] <= 32
+
+
+def test_profiles_compile_anomaly_sections():
+    import gateway
+    from device_profiles import DeviceRegistry
+    registry = DeviceRegistry(gateway.DEVICE_PROFILES_FILE, reload_interval=0)
+    fields = {s.field for s in registry.lookup("esp32_multi3").anomaly}
+    assert {"temperature", "humidity", "gas_level"} <= fields
+
+
+@pytest.mark.parametrize("spec", [{"alpha": 0}, {"alpha": 1.5}, {"z": 0}])
+def test_invalid_specs_are_rejected(spec):
+    with pytest.raises(ValueError):
+        AnomalySpec("temperature", spec)
+
+
+def test_values_failing_the_profile_valid_rule_are_ignored():
+    from device_profiles import DeviceProfile
+    profile = DeviceProfile("dht", {
+        "sensors": [{"field": "temperature", "suffix": "t", "type": "TEMPERATURE", "key": "temperature",
+                     "valid": {"gt": -999}}],
+        "anomaly": {"temperature": {"z": 4, "max_rate": 0.5, "stuck": 3, "warmup": 20}},
+    })
+    det = AnomalyDetector()
+    for i, v in enumerate(noisy(60)):
+        det.check("esp32_multi1", profile.anomaly, {"temperature": v}, i * 3)
+    # DHT lỗi gửi -999: không báo gai / rate, không tính vào chuỗi đứng yên
+    for i in range(5):
+        assert det.check("esp32_multi1", profile.anomaly, {"temperature": -999}, 180 + i * 3) == []
+    assert det.check("esp32_multi1", profile.anomaly, {"temperature": 27.0}, 198) == []
+    assert det.stats() == {SPIKE: 0, STUCK: 0, RATE: 0, "sensors": 1}
+
+    # Sensor lỗi ngay từ mẫu đầu không được làm mốc EWMA
+    det = AnomalyDetector()
+    det.check("esp32_multi3", profile.anomaly, {"temperature": -999}, 0)
+    assert det.stats()["sensors"] == 0
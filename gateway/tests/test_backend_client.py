@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+
+import backend_client
+from backend_client import CLOSED, HALF_OPEN, OPEN, AdaptiveTimeout, BackendEndpoint, CircuitBreaker
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = Clock()
+    monkeypatch.setattr(backend_client.time, "monotonic", c)
+    return c
+
+
+def endpoint(**kwargs):
+    kwargs.setdefault("backoff_base", 0.0)
+    return BackendEndpoint("test", **kwargs)
+
+
+def test_retries_transient_errors_then_succeeds():
+    statuses = iter([503, None, 201])
+    calls = []
+    status = endpoint(retries=2, budget=60).call(lambda t: calls.append(t) or next(statuses), sleep=lambda d: None)
+    assert status == 201 and len(calls) == 3
+
+
+def test_client_errors_are_not_retried_and_do_not_trip():
+    ep = endpoint(retries=3, failure_threshold=1)
+    calls = []
+    assert ep.call(lambda t: calls.append(t) or 400, sleep=lambda d: None) == 400
+    assert len(calls) == 1 and ep.breaker.state == CLOSED
+
+
+def test_breaker_opens_fails_fast_then_half_open_probe(clock):
+    ep = endpoint(retries=0, failure_threshold=3, reset_timeout=30)
+    for _ in range(3):
+        ep.call(lambda t: None)
+    assert ep.breaker.state == OPEN
+    calls = []
+    assert ep.call(lambda t: calls.append(t) or 201) is None
+    assert calls == [] and ep.breaker.rejected == 1
+
+    clock.now += 31
+    # Half-open: chỉ một request thử, request khác vẫn bị chặn trong lúc chờ
+    assert ep.breaker.allow() and ep.breaker.state == HALF_OPEN
+    assert not ep.breaker.allow()
+    ep.breaker.record(False)
+    assert ep.breaker.state == OPEN
+
+    clock.now += 31
+    assert ep.call(lambda t: 201) == 201
+    assert ep.breaker.state == CLOSED
+
+
+def test_cancelled_probe_releases_half_open(clock):
+    breaker = CircuitBreaker("x", failure_threshold=1, reset_timeout=1)
+    breaker.record(False)
+    clock.now += 2
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+
+
+def test_budget_limits_total_retry_time(clock):
+    sleeps = []
+
+    def sleep(d):
+        sleeps.append(d)
+        clock.now += d
+
+    def send(timeout):
+        clock.now += timeout
+        return None
+
+    ep = endpoint(timeout=4, retries=10, budget=10, backoff_base=0.5)
+    ep.call(send, sleep=sleep)
+    assert clock.now - 1000.0 <= 10 + 1e-9
+
+
+def test_backoff_is_jittered_and_capped():
+    ep = endpoint(backoff_base=1.0, backoff_max=5.0)
+    delays = [ep.backoff(10) for _ in range(200)]
+    assert max(delays) <= 5.0 and min(delays) >= 0.0 and len(set(delays)) > 100
+
+
+def test_adaptive_timeout_shrinks_and_grows():
+    t = AdaptiveTimeout(15.0, min_timeout=0.5, factor=3.0)
+    for _ in range(64):
+        t.observe(0.05)
+    assert t.current() == 0.5
+    for _ in range(64):
+        t.observe(2.0)
+    assert t.current() == pytest.approx(6.0)
+    for _ in range(256):
+        t.observe(15.0)
+    assert t.current() == 15.0
+
+
+def test_async_call_retries():
+    statuses = iter([None, 200])
+
+    async def send(timeout):
+        return next(statuses)
+
+    assert asyncio.run(endpoint(retries=1, budget=60).acall(send)) == 200
@@ -0,0 +1,99 @@
+import struct
+
+import pytest
+
+scapy_all = pytest.importorskip("scapy.all")
+
+import capture
+import dump
+from scapy.all import ARP, ICMP, IP, TCP, UDP, Ether, IPOption_RR, IPv6, Raw, rdpcap, wrpcap
+
+T0 = 1700000000
+
+
+class Rows:
+    def __init__(self):
+        self.rows = []
+
+    def writerow(self, row):
+        self.rows.append(row)
+
+
+def packets():
+    eth = Ether(src="aa:bb:cc:00:00:01", dst="aa:bb:cc:00:00:02")
+    pkts = [
+        Ether(src="aa:bb:cc:00:00:01", dst="ff:ff:ff:ff:ff:ff") /
+        ARP(op=1, hwsrc="aa:bb:cc:00:00:01", psrc="192.168.1.10", pdst="192.168.1.1"),
+        eth / IP(src="192.168.1.10", dst="10.0.0.1", options=[IPOption_RR()]) / TCP(sport=40000, dport=443,
+                                                                                     flags="SA"),
+        eth / IP(src="192.168.1.10", dst="10.0.0.1") / TCP(sport=40001, dport=80, flags="FPAU",
+                                                           options=[("MSS", 1460)]),
+        eth / IP(src="192.168.1.10", dst="8.8.8.8") / UDP(sport=5353, dport=53) / Raw(b"q" * 20),
+        # Mảnh không phải đầu tiên: không có header TCP → cổng / cờ bằng 0
+        eth / IP(src="192.168.1.10", dst="10.0.0.1", proto=6, frag=185) / Raw(b"x" * 40),
+        eth / IP(src="192.168.1.10", dst="10.0.0.1") / ICMP(),
+        # IPv6 và proto 0: dump.py không ghi
+        eth / IPv6(src="fe80::1", dst="fe80::2") / UDP(sport=1, dport=2),
+        eth / IP(src="192.168.1.10", dst="10.0.0.1", proto=0) / Raw(b"z" * 8),
+        # Gói TCP bị cắt trước cờ: Scapy vẫn ghi IP, không có cổng
+        eth / IP(src="192.168.1.10", dst="10.0.0.1", proto=6) / Raw(b"\x9c\x40\x01"),
+    ]
+    for i, p in enumerate(pkts):
+        p.time = T0 + i / 1000
+    return pkts
+
+
+def scapy_rows(path):
+    dump.load_scapy()
+    out = Rows()
+    for pkt in rdpcap(str(path)):
+        dump.process_packet(pkt, out, Rows())
+    return out.rows
+
+
+def capture_rows(path):
+    source = capture.PcapFileSource(str(path))
+    try:
+        return [row for row in (capture.parse_frame(f, ts) for ts, f in source.frames()) if row is not None]
+    finally:
+        source.close()
+
+
+def normalize(rows):
+    # Timestamp: Scapy đọc pcap ra EDecimal ("1700000000.001000"), capture ra float ("1700000000.001") – cùng giá trị
+    return [[float(r[0])] + list(r[1:]) for r in rows]
+
+
+def test_parse_frame_matches_scapy_process_packet(tmp_path):
+    path = tmp_path / "mixed.pcap"
+    wrpcap(str(path), packets())
+    expected = scapy_rows(path)
+    assert len(expected) == 7
+    assert normalize(capture_rows(path)) == normalize(expected)
+
+
+def test_truncated_final_record_is_skipped(tmp_path):
+    path = tmp_path / "cut.pcap"
+    pkts = packets()[:4]
+    wrpcap(str(path), pkts)
+    data = path.read_bytes()
+    # Bản ghi cuối khai báo 60 byte nhưng file chỉ còn 10 (tcpdump bị dừng giữa chừng)
+    path.write_bytes(data + struct.pack("<IIII", T0 + 1, 0, 60, 60) + b"\x00" * 10)
+    source = capture.PcapFileSource(str(path))
+    try:
+        assert len(list(source.frames())) == 4
+    finally:
+        source.close()
+    assert normalize(capture_rows(path)) == normalize(scapy_rows(path))
+
+
+def test_capture_rows_duration_follows_file_time(tmp_path):
+    path = tmp_path / "mixed.pcap"
+    wrpcap(str(path), packets())
+    source = capture.PcapFileSource(str(path))
+    try:
+        rows = list(capture.capture_rows(source, duration=0.003))
+    finally:
+        source.close()
+    # Gói đầu ở T0, hạn T0 + 3ms → gói 0, 1, 2
+    assert [r[0] for r in rows] == [T0, T0 + 0.001, T0 + 0.002]
@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+from checksum import (ALGORITHMS, SLOW_PATH_SKIP, ChecksumVerifier, calculate_checksum,
+                      canonical_bytes, resolve_algorithm)
+
+SAMPLE = {"dev_id": "esp32_multi1", "timestamp": 12345, "seq_num": 7, "temperature": 25.5,
+          "humidity": 61.0, "rain_status": 0, "dev_status": "bình thường"}
+
+
+def signed(algorithm="md5_8", **extra):
+    data = dict(SAMPLE, **extra)
+    data["checksum"] = calculate_checksum(data, algorithm)
+    return data
+
+
+def compact(data):
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode("utf-8")
+
+
+def pretty(data):
+    return json.dumps(data, indent=2, ensure_ascii=False).encode("utf-8")
+
+
+def test_canonical_bytes_drops_checksum_and_keeps_unicode():
+    body = canonical_bytes(signed())
+    assert b'"checksum"' not in body
+    assert "bình thường".encode("utf-8") in body
+    assert b" " not in body.replace("bình thường".encode("utf-8"), b"")
+
+
+def test_md5_8_matches_legacy_definition():
+    import hashlib
+    data = signed()
+    legacy = {k: v for k, v in data.items() if k != "checksum"}
+    expected = int(hashlib.md5(json.dumps(legacy, separators=(',', ':'), ensure_ascii=False)
+                               .encode("utf-8")).hexdigest()[:2], 16)
+    assert data["checksum"] == expected
+
+
+@pytest.mark.parametrize("algorithm", sorted(ALGORITHMS))
+def test_fast_path_accepts_compact_json(algorithm):
+    v = ChecksumVerifier()
+    data = signed(algorithm)
+    assert v.verify(data, compact(data), data["dev_id"], algorithm) == (True, data["checksum"])
+    assert v.stats()["fast_ok"] == 1
+
+
+def test_slow_path_accepts_non_compact_json():
+    v = ChecksumVerifier()
+    data = signed()
+    ok, calculated = v.verify(data, pretty(data), data["dev_id"])
+    assert ok and calculated == data["checksum"]
+    assert v.stats()["slow_ok"] == 1
+
+
+def test_tampered_payload_is_rejected_on_both_paths():
+    v = ChecksumVerifier()
+    data = signed()
+    data["temperature"] = 99.9
+    assert v.verify(data, compact(data), data["dev_id"])[0] is False
+    assert v.verify(data, None, data["dev_id"])[0] is False
+    assert v.stats()["failed"] == 2
+
+
+def test_missing_checksum_is_rejected():
+    assert ChecksumVerifier().verify(dict(SAMPLE), compact(SAMPLE), "x") == (False, None)
+
+
+def test_one_pretty_packet_does_not_pin_device_to_slow_path():
+    v = ChecksumVerifier()
+    data = signed()
+    v.verify(data, pretty(data), data["dev_id"])
+    assert data["dev_id"] in v.slow_devices
+    for _ in range(SLOW_PATH_SKIP + 1):
+        assert v.verify(data, compact(data), data["dev_id"])[0]
+    assert data["dev_id"] not in v.slow_devices
+    assert v.stats()["fast_ok"] == 1
+
+
+def test_persistently_non_compact_device_backs_off_exponentially():
+    v = ChecksumVerifier()
+    data = signed()
+    raw = pretty(data)
+    v.verify(data, raw, data["dev_id"])
+    for _ in range(SLOW_PATH_SKIP + 1):
+        v.verify(data, raw, data["dev_id"])
+    assert v.slow_devices[data["dev_id"]][0] == SLOW_PATH_SKIP * 2
+
+
+def test_resolve_algorithm():
+    assert resolve_algorithm({}, ("crc32", "md5_8")) == "crc32"
+    assert resolve_algorithm({"checksum_alg": "md5_8"}, ("crc32", "md5_8")) == "md5_8"
+    assert resolve_algorithm({"checksum_alg": "blake2s_32"}, ("md5_8",)) is None
@@ -0,0 +1,126 @@
+import json
+import os
+import time
+
+import pytest
+
+from device_profiles import DeviceProfile, DeviceRegistry
+
+CONFIG = {
+    "profiles": {
+        "dht": {
+            "sensors": [
+                {"field": "temperature", "suffix": "temp", "type": "TEMPERATURE", "key": "temperature",
+                 "cast": "round1", "valid": {"gt": -999}},
+                {"field": "rain_status", "suffix": "rain", "type": "RAIN", "key": "rain_detected", "cast": "bool"},
+            ],
+            "alerts": [
+                {"field": "temperature", "op": ">", "value": 35, "attackType": "IOT_DATA_MANIPULATION",
+                 "severity": 80, "message": "Nhiệt độ {value} từ {dev_id}"},
+            ],
+        },
+        "gas": {
+            "checksum": ["crc32", "md5_8"],
+            "sensors": [{"field": "gas_level", "suffix": "mq2", "type": "GAS_LPG", "key": "gas_level", "cast": "int"}],
+        },
+    },
+    "devices": {"esp32_multi1": "dht"},
+    "patterns": [
+        {"prefix": "esp32_multi1_", "profile": "dht"},
+        {"glob": "esp32_gas*", "profile": "gas"},
+        {"regex": "^mq2_\\d+$", "profile": "gas"},
+    ],
+}
+
+
+def write_config(path, config):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(config, f)
+
+
+@pytest.fixture
+def registry(tmp_path):
+    path = str(tmp_path / "devices.json")
+    write_config(path, CONFIG)
+    return DeviceRegistry(path, reload_interval=0)
+
+
+def test_extract_casts_and_filters():
+    profile = DeviceProfile("dht", CONFIG["profiles"]["dht"])
+    sensors = profile.extract({"temperature": 25.46, "rain_status": 1}, "dev")
+    assert sensors == [
+        {"sensorUid": "dev_temp", "type": "TEMPERATURE", "data": {"temperature": 25.5}},
+        {"sensorUid": "dev_rain", "type": "RAIN", "data": {"rain_detected": True}},
+    ]
+    assert profile.extract({"temperature": -999}, "dev") == []
+
+
+def test_alerts_fire_only_past_threshold():
+    profile = DeviceProfile("dht", CONFIG["profiles"]["dht"])
+    assert profile.check_alerts({"temperature": 30}, "dev") == []
+    assert profile.check_alerts({"temperature": 40}, "dev") == [
+        ("IOT_DATA_MANIPULATION", "Nhiệt độ 40 từ dev", 80, 40)]
+
+
+def test_checksum_algorithms_from_profile():
+    assert DeviceProfile("gas", CONFIG["profiles"]["gas"]).checksum_algorithms == ("crc32", "md5_8")
+    assert DeviceProfile("dht", CONFIG["profiles"]["dht"]).checksum_algorithms == ("md5_8",)
+
+
+@pytest.mark.parametrize("spec", [
+    {"sensors": [{"field": "a", "suffix": "a", "type": "T", "key": "a", "cast": "hex"}]},
+    {"alerts": [{"field": "a", "op": "~", "value": 1, "attackType": "X", "message": ""}]},
+    {"sensors": [{"field": "a", "suffix": "a", "type": "T", "key": "a", "valid": {"between": 1}}]},
+    {"checksum": "sha1"},
+])
+def test_invalid_profile_is_rejected(spec):
+    with pytest.raises(ValueError):
+        DeviceProfile("bad", spec)
+
+
+def test_lookup_exact_prefix_glob_regex(registry):
+    assert registry.lookup("esp32_multi1").name == "dht"
+    assert registry.lookup("esp32_multi1_042").name == "dht"
+    assert registry.lookup("esp32_gas7").name == "gas"
+    assert registry.lookup("mq2_12").name == "gas"
+    assert registry.lookup("mq2_x") is None
+    assert registry.lookup("unknown") is None
+
+
+def test_reload_swaps_table_on_change(registry):
+    config = json.loads(json.dumps(CONFIG))
+    config["devices"]["esp32_multi1"] = "gas"
+    write_config(registry.path, config)
+    os.utime(registry.path, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+    assert registry.reload()
+    assert registry.lookup("esp32_multi1").name == "gas"
+    assert not registry.reload()
+
+
+def test_broken_reload_keeps_previous_table(registry):
+    with open(registry.path, "w") as f:
+        f.write("{broken")
+    os.utime(registry.path, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+    assert not registry.reload()
+    assert registry.lookup("esp32_multi1").name == "dht"
+
+
+def test_unknown_profile_reference_keeps_previous_table(registry):
+    config = json.loads(json.dumps(CONFIG))
+    config["devices"]["x"] = "missing"
+    write_config(registry.path, config)
+    os.utime(registry.path, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+    assert not registry.reload()
+    assert registry.lookup("x") is None
+
+
+def test_initial_load_errors_are_raised(tmp_path):
+    with pytest.raises(OSError):
+        DeviceRegistry(str(tmp_path / "missing.json"))
+
+
+def test_shipped_devices_json_loads():
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "devices.json")
+    registry = DeviceRegistry(path, reload_interval=0)
+    for dev_id in ("esp32_multi1", "esp32_multi2", "esp32_multi3"):
+        assert registry.lookup(dev_id) is not None
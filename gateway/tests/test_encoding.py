@@ -0,0 +1,68 @@
+import gzip
+import json
+import zlib
+
+import pytest
+
+from encoding import FORMATS, RAW_DEDUP, RAW_FULL, RAW_NONE, BodyEncoder, strip_raw_data
+
+DATA = {"dev_id": "esp32_multi1", "timestamp": 351, "dev_ip": "192.168.4.3", "seq_num": 116,
+        "temperature": 28.8, "humidity": 44.7, "rain_status": 1, "rssi": -36, "checksum": 236}
+PAYLOAD = {"deviceUid": "GATEWAY-001", "sensors": [{"sensorUid": "esp32_multi1_dht_temp", "type": "TEMPERATURE",
+                                                    "data": {"temperature": 28.8}}] * 4, "rawData": DATA}
+
+
+def test_strip_raw_data_modes():
+    dup = frozenset(("temperature", "humidity", "rain_status", "seq_num", "dev_ip", "rssi"))
+    assert strip_raw_data(DATA, RAW_FULL, dup) is DATA
+    assert strip_raw_data(DATA, RAW_NONE, dup) is None
+    assert strip_raw_data(DATA, RAW_DEDUP, dup) == {"dev_id": "esp32_multi1", "timestamp": 351, "checksum": 236}
+
+
+def test_profile_duplicates_cover_sensor_and_envelope_fields():
+    from device_profiles import DeviceRegistry
+    import gateway
+    profile = DeviceRegistry(gateway.DEVICE_PROFILES_FILE, reload_interval=0).lookup("esp32_multi1")
+    assert {"temperature", "humidity", "rain_status", "seq_num", "dev_ip", "rssi"} <= profile.raw_duplicates
+    assert "dev_id" not in profile.raw_duplicates
+
+
+def test_default_encoder_is_plain_json():
+    body, headers = BodyEncoder().encode(PAYLOAD)
+    assert headers == {"Content-Type": "application/json"}
+    assert json.loads(body) == PAYLOAD
+
+
+@pytest.mark.parametrize("compression,decompress", [("gzip", gzip.decompress), ("deflate", zlib.decompress)])
+def test_compression_roundtrip_and_min_size(compression, decompress):
+    enc = BodyEncoder("json", compression, min_size=64)
+    body, headers = enc.encode(PAYLOAD)
+    assert headers["Content-Encoding"] == compression
+    assert json.loads(decompress(body)) == PAYLOAD
+    small, headers = enc.encode({"a": 1})
+    assert "Content-Encoding" not in headers and json.loads(small) == {"a": 1}
+
+
+def test_negotiate_follows_backend_advertisement():
+    headers = {"Accept-Post": "application/cbor, application/msgpack", "Accept-Encoding": "deflate, gzip;q=0"}
+    enc = BodyEncoder.negotiate(headers)
+    expected = "msgpack" if "msgpack" in FORMATS else "cbor" if "cbor" in FORMATS else "json"
+    assert enc.format == expected and enc.compression == "deflate"
+    assert repr(BodyEncoder.negotiate({})) == "json+identity"
+    # Giá trị cấu hình cụ thể không phụ thuộc backend
+    assert BodyEncoder.negotiate(headers, "json", "gzip").compression == "gzip"
+
+
+@pytest.mark.skipif("msgpack" not in FORMATS, reason="cần gói msgpack")
+def test_msgpack_roundtrip():
+    import msgpack
+    body, headers = BodyEncoder("msgpack").encode(PAYLOAD)
+    assert headers["Content-Type"] == "application/msgpack"
+    assert msgpack.unpackb(body) == PAYLOAD
+
+
+def test_unknown_options_are_rejected():
+    with pytest.raises(ValueError):
+        BodyEncoder("xml")
+    with pytest.raises(ValueError):
+        BodyEncoder("json", "br")
@@ -0,0 +1,154 @@
+import asyncio
+
+import pytest
+
+import flowcontrol
+from flowcontrol import AGGREGATABLE, ALERT, READING, FlowController, parse_shed_policy
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, d):
+        self.now += d
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = Clock()
+    monkeypatch.setattr(flowcontrol.time, "monotonic", c)
+    return c
+
+
+def controller(depth, capacity=100, **kwargs):
+    kwargs.setdefault("refresh", 0)
+    flow = FlowController(shed={AGGREGATABLE: 0.85, READING: 0.95}, **kwargs)
+    flow.add_queue("upload", lambda: depth[0], capacity)
+    return flow
+
+
+def test_pause_and_resume_use_hysteresis():
+    depth = [0]
+    flow = controller(depth, high=0.8, low=0.5)
+    assert not flow.update()
+    depth[0] = 80
+    assert flow.update()
+    # Giữa hai ngưỡng: vẫn tạm dừng cho tới khi xuống ngưỡng thấp
+    depth[0] = 60
+    assert flow.update()
+    depth[0] = 50
+    assert not flow.update()
+    depth[0] = 60
+    assert not flow.update()
+    assert flow.stats()["pauses"] == 1
+
+
+def test_fill_is_the_fullest_queue():
+    flow = controller([10])
+    flow.add_queue("alerts", lambda: 9, 10)
+    flow.add_queue("empty", lambda: 0, 0)  # sức chứa 0 = không giới hạn → bỏ qua
+    flow.update()
+    assert flow.fill == pytest.approx(0.9)
+    assert set(flow.fills()) == {"upload", "alerts"}
+
+
+def test_wait_blocks_until_queue_drains(clock):
+    depth = [90]
+
+    def sleep(d):
+        clock.sleep(d)
+        depth[0] -= 5  # uploader xả dần trong lúc chờ
+
+    flow = controller(depth)
+    waited = flow.wait(sleep=sleep)
+    assert depth[0] <= 50 and waited > 0
+    assert not flow.paused and flow.stats()["paused_seconds"] == pytest.approx(waited)
+
+
+def test_wait_gives_up_after_max_pause_until_resumed(clock):
+    depth = [100]
+    flow = controller(depth, max_pause=2.0)
+    assert flow.wait(sleep=clock.sleep) == pytest.approx(2.0)
+    assert flow.stats()["overruns"] == 1
+    # Cùng đợt nghẽn: không chặn nữa (tránh bị broker ngắt vì keepalive)
+    assert flow.wait(sleep=clock.sleep) == 0.0
+    depth[0] = 0
+    flow.update()
+    depth[0] = 100
+    assert flow.wait(sleep=clock.sleep) == pytest.approx(2.0)
+
+
+def test_shed_order_aggregatable_then_reading_never_alerts():
+    depth = [0]
+    flow = controller(depth)
+    depth[0] = 86
+    assert not flow.admit(AGGREGATABLE, 2) and flow.admit(READING) and flow.admit(ALERT)
+    depth[0] = 100
+    assert not flow.admit(READING) and flow.admit(ALERT)
+    s = flow.stats()
+    assert (s["shed_aggregatable"], s["shed_reading"], s["shed_alert"]) == (2, 1, 0)
+
+
+def test_wait_async_yields_to_the_loop():
+    depth = [100]
+    flow = controller(depth, poll=0.001)
+
+    async def drain():
+        while depth[0] > 0:
+            depth[0] -= 10
+            await asyncio.sleep(0)
+
+    async def main():
+        task = asyncio.create_task(drain())
+        await flow.wait_async()
+        await task
+
+    asyncio.run(main())
+    assert not flow.paused
+
+
+def test_parse_shed_policy():
+    assert parse_shed_policy("aggregatable:0.8, reading:0.9,alert:1") == {AGGREGATABLE: 0.8, READING: 0.9, ALERT: 1.0}
+    assert parse_shed_policy("") == {}
+    for bad in ("video:0.5", "reading:x", "reading:1.5"):
+        with pytest.raises(ValueError):
+            parse_shed_policy(bad)
+
+
+def test_gateway_sheds_aggregatable_sensors_first(monkeypatch):
+    import gateway
+    from device_profiles import DeviceRegistry
+    monkeypatch.setattr(gateway, "registry", DeviceRegistry(gateway.DEVICE_PROFILES_FILE, reload_interval=0))
+    depth = [86]
+    monkeypatch.setattr(gateway, "flow", controller(depth))
+    monkeypatch.setattr(gateway, "aggregator", object())
+    sensors = [{"type": "TEMPERATURE", "data": {"temperature": 27.0}},
+               {"type": "VIBRATION", "data": {"vibration": 1}}]
+    aggregatable = [s for s in sensors if gateway.registry.window_spec(s["type"]) is not None]
+    assert len(aggregatable) == 1
+    kept = gateway.shed_sensors(sensors)
+    assert kept == [s for s in sensors if s not in aggregatable]
+    depth[0] = 100
+    assert gateway.shed_sensors(sensors) == []
+
+
+def test_gateway_keeps_aggregatable_sensors_when_aggregation_disabled(monkeypatch):
+    import gateway
+    from device_profiles import DeviceRegistry
+    monkeypatch.setattr(gateway, "registry", DeviceRegistry(gateway.DEVICE_PROFILES_FILE, reload_interval=0))
+    monkeypatch.setattr(gateway, "aggregator", None)
+    depth = [90]
+    flow = controller(depth)
+    monkeypatch.setattr(gateway, "flow", flow)
+    sensors = [{"type": "TEMPERATURE", "data": {"temperature": 27.0}},
+               {"type": "VIBRATION", "data": {"vibration": 1}}]
+    # Không có cửa sổ gộp bù lại → chỉ bỏ theo ngưỡng READING
+    assert gateway.shed_sensors(sensors) == sensors
+    assert flow.stats()["shed_aggregatable"] == 0
+    depth[0] = 96
+    assert gateway.shed_sensors(sensors) == []
+    assert flow.stats()["shed_reading"] == 2
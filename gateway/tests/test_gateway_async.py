@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+aiomqtt = pytest.importorskip("aiomqtt")
+
+import gateway
+import gateway_async
+from flowcontrol import FlowController
+
+
+class FakePaho:
+    def __init__(self, events):
+        self.events = events
+
+    def ack(self, mid, qos):
+        self.events.append(("ack", mid))
+
+
+class FakeMessage:
+    def __init__(self, mid, qos=1):
+        self.mid = mid
+        self.qos = qos
+        self.payload = b"{}"
+        self.topic = aiomqtt.Topic("iot/sensor/esp32_multi1")
+
+
+class FakeClient:
+    def __init__(self, events, messages):
+        self._client = FakePaho(events)
+        self._messages = messages
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def subscribe(self, topic, qos=0):
+        pass
+
+    @property
+    def messages(self):
+        async def gen():
+            for m in self._messages:
+                yield m
+            await asyncio.Event().wait()
+        return gen()
+
+
+def test_client_acks_manually_and_counts_dropped_messages(monkeypatch):
+    flow = FlowController()
+    monkeypatch.setattr(gateway, "flow", flow)
+
+    async def main():
+        client = gateway_async._mqtt_client()
+        assert client._client._manual_ack
+        queue = gateway_async._IncomingQueue(maxsize=1)
+        queue.put_nowait(1)
+        with pytest.raises(asyncio.QueueFull):
+            queue.put_nowait(2)
+
+    asyncio.run(main())
+    assert flow.stats()["shed_mqtt_incoming"] == 1
+
+
+def test_qos1_is_acked_only_after_processing_and_not_while_paused(monkeypatch):
+    events = []
+    depth = [90]
+    flow = FlowController(high=0.8, low=0.5, refresh=0, poll=0.01)
+    flow.add_queue("upload", lambda: depth[0], 100)
+    monkeypatch.setattr(gateway, "flow", flow)
+    monkeypatch.setattr(gateway, "ts_store", None)
+    monkeypatch.setattr(gateway, "process_message", lambda payload, topic: events.append("process") or True)
+    monkeypatch.setattr(gateway_async, "_mqtt_client",
+                        lambda: FakeClient(events, [FakeMessage(1), FakeMessage(2), FakeMessage(3, qos=0)]))
+
+    async def main():
+        counter = [0]
+        task = asyncio.create_task(gateway_async._mqtt_loop(counter))
+        await asyncio.sleep(0.1)
+        # Hàng đợi upload đầy → tin đầu tiên chưa được xử lý, chưa ack → broker giữ cửa sổ inflight
+        assert events == []
+        depth[0] = 0
+        await asyncio.sleep(0.1)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return counter[0]
+
+    assert asyncio.run(main()) == 3
+    assert events == ["process", ("ack", 1), "process", ("ack", 2), "process"]
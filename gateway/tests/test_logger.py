@@ -0,0 +1,93 @@
+import io
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+
+import pytest
+
+import logger
+from logger import JsonFormatter, LazyJson, PacketSampler
+
+
+class BlockingStream(io.StringIO):
+    """stdout bị kẹt (pipe đầy) cho tới khi release được set."""
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def write(self, s):
+        self.release.wait()
+        return super().write(s)
+
+
+@pytest.fixture
+def gateway_log(monkeypatch):
+    yield logging.getLogger("gateway")
+    logger.shutdown_logging(timeout=0.1)
+    logging.getLogger("gateway").handlers[:] = []
+
+
+def test_queue_handler_drops_when_full_without_blocking():
+    handler = logger._DroppingQueueHandler(queue.Queue(maxsize=2))
+    log = logging.getLogger("gateway.test.drop")
+    log.propagate = False
+    log.handlers[:] = [handler]
+    t0 = time.perf_counter()
+    for i in range(5):
+        log.warning("record %d", i)
+    assert time.perf_counter() - t0 < 0.5
+    assert handler.queue.qsize() == 2 and handler.dropped == 3
+    # Record không bị format trên luồng gọi
+    assert handler.queue.get_nowait().args == (0,)
+
+
+def test_log_packet_serializes_only_when_debug_enabled(monkeypatch):
+    dumps = []
+    real_dumps = logger.json.dumps
+    monkeypatch.setattr(logger.json, "dumps", lambda *a, **k: dumps.append(1) or real_dumps(*a, **k))
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logger.ConsoleFormatter(color=False))
+    log = logging.getLogger("gateway.test.lazy")
+    log.propagate = False
+    log.handlers[:] = [handler]
+
+    log.setLevel(logging.INFO)
+    logger.log_packet(log, "ESP32", "RECV", 1, {"temperature": 27.5})
+    assert dumps == [] and stream.getvalue() == ""
+
+    log.setLevel(logging.DEBUG)
+    logger.log_packet(log, "ESP32", "RECV", 2, {"temperature": 27.5})
+    assert dumps == [1]
+    assert stream.getvalue().strip() == '[ESP32] ← RECV (seq=2): {"temperature":27.5}'
+
+
+def test_packet_sampler():
+    sampler = PacketSampler(4)
+    assert [sampler.sample() for _ in range(8)] == [True, False, False, False] * 2
+    assert all(PacketSampler(1).sample() for _ in range(3))
+
+
+def test_json_formatter_includes_structured_fields():
+    record = logging.LogRecord("gateway.x", logging.INFO, "", 0, "sent %d", (3,), None)
+    record.payload = LazyJson({"a": 1})
+    doc = json.loads(JsonFormatter().format(record))
+    assert doc["msg"] == "sent 3" and doc["payload"] == {"a": 1} and doc["level"] == "INFO"
+
+
+def test_shutdown_does_not_hang_when_queue_full_and_sink_stuck(monkeypatch, gateway_log):
+    stream = BlockingStream()
+    monkeypatch.setattr(sys, "stdout", stream)
+    log = logger.setup_logging(fmt="plain", queue_size=3)
+    for i in range(10):
+        log.warning("record %d", i)
+    time.sleep(0.05)
+    t0 = time.perf_counter()
+    logger.shutdown_logging(timeout=0.2)
+    assert time.perf_counter() - t0 < 3
+    assert logger.dropped_records() >= 6
+    stream.release.set()
@@ -0,0 +1,87 @@
+import re
+import urllib.request
+
+import pytest
+
+import metrics
+from metrics import OVERFLOW_LABEL, Counter, Gauge, Histogram
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{(?:[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\\n]|\\.)*",?)*\})? (\S+)$')
+
+
+def parse(lines):
+    """Kiểm tra từng dòng theo định dạng Prometheus text 0.0.4, trả về [(tên, chuỗi nhãn, giá trị)]."""
+    samples, typed = [], {}
+    for line in lines:
+        if line.startswith("# HELP "):
+            continue
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split(" ")
+            assert kind in ("counter", "gauge", "histogram", "untyped")
+            typed[name] = kind
+            continue
+        m = SAMPLE.match(line)
+        assert m, f"dòng không hợp lệ: {line!r}"
+        name, labels, value = m.group(1), m.group(2) or "", m.group(3)
+        base = re.sub(r"_(bucket|sum|count)$", "", name)
+        assert name in typed or base in typed, f"thiếu # TYPE cho {name}"
+        float(value.replace("+Inf", "inf"))
+        samples.append((name, labels, value))
+    return samples
+
+
+def test_children_are_capped_into_overflow_label():
+    c = Counter("test_capped_total", "x", ["dev_id"], max_children=3, register=False)
+    for i in range(10):
+        c.labels(f"esp32_{i}").inc()
+    assert len(c._children) == 4
+    assert c._children[(OVERFLOW_LABEL,)].value == 7
+    # Nhãn đã có vẫn dùng child riêng sau khi vượt giới hạn
+    c.labels("esp32_0").inc(5)
+    assert c._children[("esp32_0",)].value == 6
+
+
+def test_counter_and_gauge_render_with_escaped_labels():
+    c = Counter("test_escape_total", "x", ["dev_id"], register=False)
+    c.labels('a"b\\c\nd').inc(2)
+    g = Gauge("test_depth", "x", ["queue"], fn=lambda: {"upload": 3, ("spool",): 7}, register=False)
+    samples = parse(c.render() + g.render())
+    assert ("test_escape_total", '{dev_id="a\\"b\\\\c\\nd"}', "2") in samples
+    assert ("test_depth", '{queue="upload"}', "3") in samples
+    assert ("test_depth", '{queue="spool"}', "7") in samples
+
+
+def test_histogram_buckets_are_cumulative_and_end_with_inf():
+    h = Histogram("test_seconds", "x", ["stage"], buckets=(0.1, 0.01, 1.0), register=False)
+    for v in (0.005, 0.05, 0.05, 0.5, 3.0):
+        h.labels("decode").observe(v)
+    samples = parse(h.render())
+    buckets = [(labels, int(value)) for name, labels, value in samples if name == "test_seconds_bucket"]
+    assert [le for le, _ in buckets] == ['{stage="decode",le="0.01"}', '{stage="decode",le="0.1"}',
+                                        '{stage="decode",le="1.0"}', '{stage="decode",le="+Inf"}']
+    assert [n for _, n in buckets] == [1, 3, 4, 5]
+    assert ("test_seconds_count", '{stage="decode"}', "5") in samples
+    assert float(dict((n, v) for n, _, v in samples)["test_seconds_sum"]) == pytest.approx(3.605)
+
+
+def test_gauge_fn_error_renders_header_only():
+    g = Gauge("test_broken", "x", fn=lambda: 1 / 0, register=False)
+    assert parse(g.render()) == []
+
+
+def test_registered_gateway_metrics_are_valid_over_http():
+    metrics.MESSAGES_RECEIVED.labels("esp32_test").inc()
+    server = metrics.start_http_server(0, addr="127.0.0.1")
+    try:
+        port = server.server_address[1]
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as resp:
+            assert resp.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            body = resp.read().decode("utf-8")
+        assert body.endswith("\n")
+        samples = parse(body.rstrip("\n").split("\n"))
+        assert any(n == "gateway_messages_received_total" and 'esp32_test' in labels for n, labels, _ in samples)
+        with pytest.raises(urllib.error.HTTPError) as err:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/nope", timeout=5)
+        assert err.value.code == 404
+    finally:
+        server.shutdown()
@@ -0,0 +1,148 @@
+from seqtrack import DUPLICATE, FIRST, LATE, NEW, REPLAY, RESTART, SequenceTracker
+
+
+class Clock:
+    def __init__(self):
+        self.now = 5000.0
+
+    def __call__(self):
+        return self.now
+
+
+def feed(tracker, dev_id, seqs, uptime=None):
+    return [tracker.check(dev_id, s, uptime) for s in seqs]
+
+
+def live(tracker, clock, seqs, boot_uptime=0, period=3, dev_id="d"):
+    """Thiết bị gửi đều mỗi period giây, timestamp = uptime."""
+    out = []
+    for s in seqs:
+        clock.now += period
+        out.append(tracker.check(dev_id, s, boot_uptime + s * period))
+    return out
+
+
+def test_in_order_stream():
+    t = SequenceTracker(window=16)
+    assert feed(t, "d", range(5)) == [FIRST] + [NEW] * 4
+    s = t.stats()["d"]
+    assert (s["received"], s["lost"], s["highest_seq"]) == (5, 0, 4)
+
+
+def test_gap_counts_loss_and_late_arrival_recovers_it():
+    t = SequenceTracker(window=16)
+    feed(t, "d", [0, 1, 4])
+    assert t.stats()["d"]["lost"] == 2
+    assert t.check("d", 2) == LATE
+    s = t.stats()["d"]
+    assert (s["lost"], s["late"], s["received"]) == (1, 1, 4)
+
+
+def test_duplicate_inside_window():
+    t = SequenceTracker(window=16)
+    feed(t, "d", [0, 1, 2])
+    assert t.check("d", 1) == DUPLICATE
+    assert t.check("d", 1) == DUPLICATE
+    assert t.stats()["d"]["duplicates"] == 2
+
+
+def test_older_than_window_is_replay():
+    t = SequenceTracker(window=8)
+    feed(t, "d", range(20))
+    assert t.check("d", 3) == REPLAY
+    assert t.stats()["d"]["replays"] == 1
+
+
+def test_large_jump_clears_bitmap():
+    t = SequenceTracker(window=8)
+    feed(t, "d", [0, 1])
+    assert t.check("d", 100) == NEW
+    assert t.check("d", 99) == LATE
+    assert t.check("d", 100) == DUPLICATE
+
+
+def test_late_packet_with_older_uptime_is_not_a_restart():
+    t = SequenceTracker(window=16)
+    for s in range(5):
+        t.check("d", s, uptime=1000 + s * 100)
+    t.check("d", 7, uptime=1700)
+    assert t.check("d", 5, uptime=1500) == LATE
+
+
+def test_reboot_detected_by_uptime_below_boot_point():
+    clock = Clock()
+    t = SequenceTracker(window=256, restart_confirm=3, clock=clock)
+    live(t, clock, range(1000), boot_uptime=10000)
+    # Thiết bị khởi động lại (mất ~8 s), seq bắt đầu lại từ 0; cần 3 gói có uptime tăng khớp đồng hồ
+    clock.now += 5
+    assert live(t, clock, range(5), boot_uptime=3) == [REPLAY, REPLAY, RESTART, NEW, NEW]
+    assert t.stats()["d"]["restarts"] == 1
+
+
+def test_replayed_packet_from_current_boot_is_not_a_restart():
+    t = SequenceTracker(window=256)
+    for s in range(1000):
+        t.check("d", s, uptime=10000 + s * 100)
+    assert t.check("d", 2, uptime=10200) == REPLAY
+    assert t.check("d", 999, uptime=109900) == DUPLICATE
+
+
+def test_seq_reset_without_uptime_rebaselines_after_k_packets_and_quiet_period():
+    clock = Clock()
+    t = SequenceTracker(window=256, restart_after=5, restart_quiet=10, clock=clock)
+    for s in range(1000):
+        clock.now += 3
+        t.check("d", s)
+    out = []
+    for s in range(8):
+        clock.now += 3
+        out.append(t.check("d", s))
+    # Gói thứ 5 tới lúc đã im lặng 15 s >= restart_quiet
+    assert out == [REPLAY] * 4 + [RESTART, NEW, NEW, NEW]
+
+
+def test_replay_burst_without_uptime_does_not_rebaseline_while_device_is_live():
+    clock = Clock()
+    t = SequenceTracker(window=16, restart_after=5, restart_quiet=10, clock=clock)
+    for s in range(100):
+        clock.now += 3
+        t.check("d", s)
+    # Kẻ tấn công phát lại 20 gói seq tăng dần xen giữa gói thật; thiết bị vẫn đang gửi
+    out = []
+    for s in range(100, 120):
+        clock.now += 1
+        out.append(t.check("d", s - 90))
+        if s % 3 == 0:
+            assert t.check("d", s) == NEW
+    assert set(out) == {REPLAY}
+    assert t.stats()["d"]["restarts"] == 0
+
+
+def test_replay_after_gateway_restart_is_not_a_restart():
+    clock = Clock()
+    t = SequenceTracker(window=16, restart_confirm=3, clock=clock)
+    # Gateway vừa khởi động lại: điểm boot = uptime gói đầu tiên (thiết bị đã chạy 10000 s)
+    live(t, clock, range(3000, 3010), boot_uptime=1000)
+    # Gói cũ hơn của cùng lần boot: uptime < điểm boot nhưng thiết bị không thể boot sau gói nhận cuối
+    assert t.check("d", 10, uptime=1000 + 30) == REPLAY
+    # Năm gói cũ seq + uptime tăng dần, gửi liền nhau
+    assert [t.check("d", s, 1000 + s * 3) for s in range(20, 25)] == [REPLAY] * 5
+    # Gói ngay sau một lần boot cũ (uptime nhỏ) phát lại dồn dập: uptime tăng không khớp đồng hồ
+    clock.now += 2
+    assert [t.check("d", s, s * 3) for s in range(1, 4)] == [REPLAY] * 3
+    assert t.stats()["d"]["restarts"] == 0
+    assert live(t, clock, range(3010, 3012), boot_uptime=1000) == [NEW, NEW]
+
+
+def test_repeated_replay_of_same_packet_never_rebaselines():
+    t = SequenceTracker(window=16, restart_after=3)
+    feed(t, "d", range(100))
+    assert feed(t, "d", [10] * 10) == [REPLAY] * 10
+
+
+def test_devices_are_independent_and_bounded():
+    t = SequenceTracker(window=16, max_devices=32, stripes=4)
+    for i in range(100):
+        assert t.check(f"dev{i}", 0) == FIRST
+    assert len(t.stats()) <= 32
+    assert t.check("dev99", 1) == NEW
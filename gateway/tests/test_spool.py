@@ -0,0 +1,158 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from spool import CHECKPOINT_FILE, SegmentLog, StoreAndForward, _segment_name
+
+
+def drain(log, n=1000):
+    batch = log.read_batch(n)
+    if batch:
+        log.ack(batch[-1][0], len(batch))
+    return [payload for _, payload in batch]
+
+
+def test_append_read_ack(tmp_path):
+    log = SegmentLog(str(tmp_path), fsync="never")
+    for i in range(5):
+        log.append({"i": i})
+    batch = log.read_batch(3)
+    assert [p["i"] for _, p in batch] == [0, 1, 2]
+    log.ack(batch[-1][0], 3)
+    assert [p["i"] for p in drain(log)] == [3, 4]
+    assert log.pending() == 0
+
+
+def test_rewind_replays_unacked_in_order(tmp_path):
+    log = SegmentLog(str(tmp_path), fsync="never")
+    for i in range(4):
+        log.append({"i": i})
+    first = log.read_batch(2)
+    log.ack(first[0][0], 1)
+    log.read_batch(10)
+    log.rewind()
+    assert [p["i"] for _, p in log.read_batch(10)] == [1, 2, 3]
+
+
+def test_restart_resumes_from_checkpoint(tmp_path):
+    log = SegmentLog(str(tmp_path), fsync="always")
+    for i in range(6):
+        log.append({"i": i})
+    batch = log.read_batch(4)
+    log.ack(batch[-1][0], 4)
+    log.close()
+
+    reopened = SegmentLog(str(tmp_path), fsync="always")
+    assert [p["i"] for p in drain(reopened)] == [4, 5]
+
+
+def test_torn_tail_is_truncated_on_recovery(tmp_path):
+    log = SegmentLog(str(tmp_path), fsync="always")
+    for i in range(3):
+        log.append({"i": i})
+    log.close()
+    path = os.path.join(str(tmp_path), _segment_name(0))
+    with open(path, "ab") as f:
+        f.write(b"\x40\x00\x00\x00\x01\x02")  # header ghi dở khi crash
+    size_before = os.path.getsize(path)
+
+    reopened = SegmentLog(str(tmp_path), fsync="always")
+    assert os.path.getsize(path) == size_before - 6
+    reopened.append({"i": 3})
+    assert [p["i"] for p in drain(reopened)] == [0, 1, 2, 3]
+
+
+def test_corrupt_checkpoint_falls_back_to_oldest_segment(tmp_path):
+    log = SegmentLog(str(tmp_path), fsync="always")
+    log.append({"i": 0})
+    log.close()
+    with open(os.path.join(str(tmp_path), CHECKPOINT_FILE), "w") as f:
+        f.write("{not json")
+    assert [p["i"] for p in drain(SegmentLog(str(tmp_path)))] == [0]
+
+
+def test_rotation_and_acked_segments_are_removed(tmp_path):
+    log = SegmentLog(str(tmp_path), segment_bytes=200, fsync="never")
+    for i in range(30):
+        log.append({"i": i, "pad": "x" * 20})
+    assert len(log.segments) > 1
+    assert [p["i"] for p in drain(log)] == list(range(30))
+    assert len(log.segments) == 1
+    files = [n for n in os.listdir(str(tmp_path)) if n.endswith(".log")]
+    assert files == [_segment_name(log.segments[0])]
+
+
+def test_size_cap_drops_oldest_segment(tmp_path):
+    log = SegmentLog(str(tmp_path), segment_bytes=200, max_bytes=600, fsync="never")
+    for i in range(60):
+        log.append({"i": i, "pad": "x" * 20})
+    assert log.total_bytes() <= 600 + 200
+    assert log.dropped_bytes > 0
+    remaining = [p["i"] for p in drain(log)]
+    assert remaining == sorted(remaining) and remaining[-1] == 59 and remaining[0] > 0
+    with open(os.path.join(str(tmp_path), CHECKPOINT_FILE)) as f:
+        assert json.load(f)["segment"] == log.segments[0]
+
+
+def test_invalid_fsync_policy(tmp_path):
+    with pytest.raises(ValueError):
+        SegmentLog(str(tmp_path), fsync="sometimes")
+
+
+def _wait(cond, timeout=5.0):
+    deadline = time.time() + timeout
+    while not cond() and time.time() < deadline:
+        time.sleep(0.01)
+    return cond()
+
+
+def test_forwarder_sends_live_traffic_unthrottled(tmp_path):
+    got = []
+    sf = StoreAndForward(SegmentLog(str(tmp_path), fsync="never"),
+                         lambda b: got.extend(b) or len(b), replay_rate=10)
+    sf.start()
+    try:
+        for i in range(200):
+            sf.submit({"i": i})
+        # 200 gói ở 10 msg/s sẽ mất 20s nếu bị giới hạn
+        assert _wait(lambda: len(got) == 200, timeout=3)
+        assert not sf.replaying
+    finally:
+        sf.stop()
+
+
+def test_forwarder_replays_in_order_after_outage(tmp_path):
+    got = []
+    down = threading.Event()
+    down.set()
+
+    def deliver(batch):
+        if down.is_set():
+            return 0
+        got.extend(batch)
+        return len(batch)
+
+    sf = StoreAndForward(SegmentLog(str(tmp_path), fsync="never"), deliver, batch_size=5,
+                         replay_rate=0, max_backoff=0.1)
+    sf.start()
+    try:
+        for i in range(20):
+            sf.submit({"i": i})
+        assert _wait(lambda: sf.replaying)
+        down.clear()
+        assert _wait(lambda: len(got) == 20)
+        assert [p["i"] for p in got] == list(range(20))
+        assert _wait(lambda: not sf.replaying)
+    finally:
+        sf.stop()
+
+
+def test_forwarder_starts_in_replay_mode_with_leftover_backlog(tmp_path):
+    log = SegmentLog(str(tmp_path), fsync="always")
+    log.append({"i": 0})
+    log.close()
+    sf = StoreAndForward(SegmentLog(str(tmp_path)), lambda b: len(b))
+    assert sf.replaying
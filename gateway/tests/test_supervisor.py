@@ -0,0 +1,49 @@
+import time
+
+import supervisor
+from supervisor import Supervisor, Worker
+
+
+def test_worker_env_splits_instance_ports_and_spool(monkeypatch):
+    monkeypatch.setattr(supervisor, "METRICS_PORT", 9108)
+    monkeypatch.setattr(supervisor, "SPOOL_DIR", "spool")
+    env = Worker(2).env()
+    assert env["GATEWAY_INSTANCE"] == "2"
+    assert env["MQTT_SHARE_GROUP"] == supervisor.SUPERVISOR_SHARE_GROUP
+    assert env["METRICS_PORT"] == "9110"
+    assert env["SPOOL_DIR"].endswith("2")
+
+
+def test_crashing_worker_restarts_with_growing_backoff(tmp_path):
+    script = tmp_path / "crash.py"
+    script.write_text("import sys\nsys.exit(3)\n")
+    sup = Supervisor(num_workers=1)
+    sup.script = str(script)
+    w = sup.workers[0]
+    w.start(sup.script)
+    w.proc.wait()
+
+    sup._check()
+    assert w.proc is None and w.backoff == 2.0
+
+    w.restart_at = 0.0
+    sup._check()
+    assert w.restarts == 1 and w.proc is not None
+    w.proc.wait()
+    sup._check()
+    assert w.proc is None and w.backoff == 4.0
+
+
+def test_stop_kills_worker_that_ignores_sigint(tmp_path, monkeypatch):
+    monkeypatch.setattr(supervisor, "SUPERVISOR_STOP_TIMEOUT", 0.5)
+    script = tmp_path / "stubborn.py"
+    script.write_text("import signal, time\nsignal.signal(signal.SIGINT, signal.SIG_IGN)\n"
+                      "print('ready', flush=True)\ntime.sleep(60)\n")
+    sup = Supervisor(num_workers=1)
+    w = sup.workers[0]
+    w.start(str(script))
+    time.sleep(0.5)
+    t0 = time.monotonic()
+    sup.stop()
+    assert w.proc.returncode is not None and w.proc.returncode != 0
+    assert time.monotonic() - t0 < 5
@@ -0,0 +1,100 @@
+import json
+
+import pytest
+
+from timeseries import POINT_BYTES, TimeSeriesStore
+
+
+def sensor(uid, value, key="gas_level", sensor_type="GAS_LPG"):
+    return {"sensorUid": uid, "type": sensor_type, "data": {key: value}}
+
+
+def fill(store, uid, values, t0=1000.0, step=3.0, dev_id="esp32_multi3"):
+    for i, v in enumerate(values):
+        store.record(dev_id, [sensor(uid, v)], t0 + i * step)
+
+
+def test_ring_keeps_newest_points_in_order():
+    store = TimeSeriesStore(points=5)
+    fill(store, "m3_mq2", range(8))
+    assert store.range("m3_mq2", 0) == [(1000.0 + i * 3, float(i)) for i in range(3, 8)]
+    assert store.latest("m3_mq2") == (1021.0, 7.0)
+
+
+def test_range_is_half_open_and_limited():
+    store = TimeSeriesStore(points=100)
+    fill(store, "s", range(10))
+    assert [v for _, v in store.range("s", 1003, 1012)] == [1.0, 2.0, 3.0]
+    assert [v for _, v in store.range("s", 0, limit=2)] == [8.0, 9.0]
+
+
+def test_downsample_buckets():
+    store = TimeSeriesStore(points=100)
+    fill(store, "s", [1, 2, 3, 10, 20, 30], t0=990.0, step=10)
+    # Ngăn 30s căn theo bội số của 30: [1,2,3] và [10,20,30]; start giữa ngăn không làm lệch ngăn
+    assert store.downsample("s", 990, 2000, 30) == [(990, 3, 2.0, 1.0, 3.0), (1020, 3, 20.0, 10.0, 30.0)]
+    assert store.downsample("s", 1005, 2000, 30) == [(990, 1, 3.0, 3.0, 3.0), (1020, 3, 20.0, 10.0, 30.0)]
+
+
+def test_values_are_coerced_and_non_numeric_skipped():
+    store = TimeSeriesStore(points=4)
+    store.record("esp32_multi1", [sensor("rain", True, "rain_detected", "RAIN"), sensor("bad", "err"),
+                                  {"sensorUid": "multi", "type": "X", "data": {"a": 1, "b": 2}}], 1.0)
+    assert store.latest("rain") == (1.0, 1.0)
+    assert store.latest("bad") is None and store.latest("multi") is None
+
+
+def test_clock_going_backwards_keeps_order():
+    store = TimeSeriesStore(points=8)
+    fill(store, "s", [1, 2], t0=1000.0)
+    store.record("d", [sensor("s", 3)], 900.0)
+    assert [t for t, _ in store.range("s", 0)] == [1000.0, 1003.0, 1003.0]
+
+
+def test_memory_cap_evicts_least_recently_written_idle_sensor():
+    store = TimeSeriesStore(points=10, max_bytes=4 * 10 * POINT_BYTES, stripes=1, idle=600)
+    for i in range(4):
+        fill(store, f"s{i}", [i])
+    # Mọi cảm biến vẫn đang gửi → cảm biến mới không được lưu thay vì đẩy cảm biến khác ra
+    fill(store, "s4", [4], t0=1100.0)
+    assert store.latest("s4") is None and store.stats()["rejected"] == 1
+    fill(store, "s0", [0], t0=2000.0)  # s0 vừa ghi → s1 cũ nhất, đã im lặng 1000s
+    fill(store, "s4", [4], t0=2000.0)
+    assert store.latest("s1") is None and store.latest("s0") is not None
+    s = store.stats()
+    assert s["sensors"] == 4 and s["evicted"] == 1 and s["bytes"] == 4 * 10 * POINT_BYTES
+    # Mảng của cảm biến bị thu hồi được dùng lại, không còn mẫu cũ
+    assert store.range("s4", 0) == [(2000.0, 4.0)]
+
+
+def test_query_api():
+    store = TimeSeriesStore(points=100)
+    fill(store, "esp32_multi3_mq2", range(10), t0=1000.0)
+    assert store.query("latest", {"sensor": "esp32_multi3_mq2"}) == (200, {"sensor": "esp32_multi3_mq2",
+                                                                          "latest": (1027.0, 9.0)})
+    status, body = store.query("range", {"sensor": "esp32_multi3_mq2", "since": "9"}, now=1030.0)
+    assert status == 200 and len(body["range"]) == 3
+    status, body = store.query("downsample", {"sensor": "esp32_multi3_mq2", "start": "1000", "step": "15"})
+    assert status == 200 and [b[1] for b in body["downsample"]] == [2, 5, 3]  # 990 | 1005 | 1020
+    assert store.query("latest", {"dev_id": "esp32_multi3"})[1] == {"esp32_multi3_mq2": (1027.0, 9.0)}
+    assert store.query("sensors", {})[1][0]["points"] == 10
+    assert store.query("range", {})[0] == 400
+    assert store.query("range", {"sensor": "x"})[0] == 404
+    assert store.query("downsample", {"sensor": "esp32_multi3_mq2", "step": "0"})[0] == 400
+    assert store.query("range", {"sensor": "esp32_multi3_mq2", "since": "abc"})[0] == 400
+    assert store.query("delete", {})[0] == 404
+
+
+@pytest.mark.parametrize("reply_to, expected", [(None, "iot/response"), ("iot/response/ui-7", "iot/response/ui-7"),
+                                                ("iot/sensor/esp32_multi1", "iot/response")])
+def test_mqtt_query_replies_only_under_response_topic(monkeypatch, reply_to, expected):
+    import gateway
+    store = TimeSeriesStore(points=10)
+    fill(store, "esp32_multi3_mq2", [400])
+    monkeypatch.setattr(gateway, "ts_store", store)
+    topic, body = gateway.ts_query_message("iot/gateway/GW/ts/latest",
+                                           json.dumps({"sensor": "esp32_multi3_mq2", "id": 7, "reply_to": reply_to}))
+    assert topic == expected
+    assert json.loads(body) == {"op": "latest", "id": 7, "status": 200,
+                                "result": {"sensor": "esp32_multi3_mq2", "latest": [1000.0, 400.0]}}
+    assert json.loads(gateway.ts_query_message("iot/gateway/GW/ts/latest", b"[1]")[1])["status"] == 400
@@ -0,0 +1,77 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+xgboost = pytest.importorskip("xgboost")
+joblib = pytest.importorskip("joblib")
+
+import calculate
+import tree_model
+
+SCRIPT3 = os.path.dirname(os.path.abspath(tree_model.__file__))
+
+# joblib của XGBoost cũ hơn bản đang cài → cảnh báo khi nạp, không ảnh hưởng kết quả
+pytestmark = pytest.mark.filterwarnings("ignore:.*serialized model:UserWarning")
+
+
+@pytest.fixture(scope="module")
+def model():
+    return joblib.load(os.path.join(SCRIPT3, tree_model.MODEL_FILE))
+
+
+@pytest.fixture(scope="module")
+def ensemble():
+    return tree_model.TreeEnsemble.load(os.path.join(SCRIPT3, tree_model.MODEL_NPZ_FILE))
+
+
+@pytest.fixture(scope="module")
+def real(ensemble):
+    df = calculate.calculate_features(pd.read_csv(os.path.join(SCRIPT3, "raw_flow.csv")))
+    return df[ensemble.feature_names].to_numpy(dtype=np.float64)
+
+
+def hard_rows(ensemble, real):
+    """Mỗi split khác nhau: một dòng thật với feature của split đặt đúng ngưỡng, sát trên / dưới 1 ULP, NaN."""
+    base = real[np.arange(len(ensemble.split_feature)) % len(real)].astype(np.float32)
+    f, cut = ensemble.split_feature, ensemble.split_threshold
+    rows = []
+    for value in (cut, np.nextafter(cut, np.float32(np.inf)), np.nextafter(cut, np.float32(-np.inf)),
+                  np.full_like(cut, np.nan)):
+        X = base.copy()
+        X[np.arange(len(X)), f] = value
+        rows.append(X)
+    return np.concatenate(rows)
+
+
+def assert_same_as_xgboost(model, ensemble, X):
+    booster = model.get_booster()
+    expected = booster.predict(xgboost.DMatrix(X, feature_names=booster.feature_names), output_margin=True)
+    assert np.array_equal(ensemble.predict_margin(X), expected)
+    assert np.array_equal(ensemble.predict(X), model.predict(X))
+
+
+def test_npz_is_exported_from_the_committed_joblib_model(model, ensemble):
+    # xgboost_model.joblib được huấn luyện lại mà quên chạy "python tree_model.py" → npz cũ, test này hỏng
+    fresh = tree_model.export_model(model)
+    with np.load(os.path.join(SCRIPT3, tree_model.MODEL_NPZ_FILE), allow_pickle=False) as npz:
+        assert sorted(npz.files) == sorted(fresh)
+        for key, value in fresh.items():
+            assert np.array_equal(npz[key], value), key
+
+
+def test_margins_and_labels_match_xgboost_on_real_flows(model, ensemble, real):
+    assert_same_as_xgboost(model, ensemble, real)
+
+
+def test_margins_and_labels_match_xgboost_at_split_thresholds_and_nan(model, ensemble, real):
+    X = hard_rows(ensemble, real)
+    assert np.isnan(X).any() and len(X) == 4 * len(ensemble.split_feature)
+    assert_same_as_xgboost(model, ensemble, X)
+
+
+def test_single_row_and_chunk_boundaries(model, ensemble, real):
+    assert_same_as_xgboost(model, ensemble, real[:1])
+    X = hard_rows(ensemble, real)[:600]
+    assert np.array_equal(ensemble.predict_margin(X, chunk=7), ensemble.predict_margin(X))
@@ -0,0 +1,59 @@
+import logging
+
+import pytest
+
+from uploader import BackendUploader
+
+
+def uploader(statuses, **kwargs):
+    up = BackendUploader("http://backend/sensor", stats_interval=0, **kwargs)
+    replies = iter(statuses)
+    up.sent_bodies = []
+
+    def send(session, url, data, headers, count, timeout):
+        up.sent_bodies.append((url, count))
+        return next(replies)
+
+    up._send = send
+    return up
+
+
+@pytest.mark.parametrize("status, final", [
+    (200, True), (201, True), (400, True), (422, True),
+    (408, False), (429, False), (500, False), (503, False), (None, False),
+])
+def test_is_final(status, final):
+    assert BackendUploader._is_final(status) is final
+
+
+def test_deliver_stops_at_first_unacked_payload():
+    up = uploader([201, 400, 503, 201])
+    batch = [{"sequenceNumber": i} for i in range(4)]
+    # 400 là từ chối vĩnh viễn → tính là đã xử lý; 503 dừng lại, gói sau không được gửi
+    assert up.deliver(batch) == 2
+    assert len(up.sent_bodies) == 3
+
+
+def test_deliver_acks_whole_batch_or_nothing_on_batch_url():
+    batch = [{"sequenceNumber": i} for i in range(3)]
+    assert uploader([503], batch_url="http://backend/batch").deliver(batch) == 0
+    assert uploader([None], batch_url="http://backend/batch").deliver(batch) == 0
+    assert uploader([201], batch_url="http://backend/batch").deliver(batch) == 3
+    up = uploader([201], batch_url="http://backend/batch")
+    assert up.deliver(batch[:1]) == 1
+    assert up.sent_bodies == [("http://backend/sensor", 1)]
+
+
+def test_submit_drops_when_queue_full():
+    up = uploader([], queue_size=2)
+    assert up.submit({"sequenceNumber": 1}) and up.submit({"sequenceNumber": 2})
+    assert not up.submit({"sequenceNumber": 3})
+    assert (up.stats.enqueued, up.stats.dropped) == (2, 1)
+
+
+def test_print_stats_is_lazy(caplog):
+    up = uploader([])
+    with caplog.at_level(logging.INFO, logger="gateway.uploader"):
+        up.print_stats()
+    record = caplog.records[-1]
+    assert record.args and "msg/s" in record.getMessage()
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Time Series - Lịch sử số đo gần đây ngay tại gateway, không cần hỏi backend
+  - Mỗi sensorUid một vòng đệm cố định (array 'd': thời điểm + giá trị), ghi đè mẫu cũ nhất
+  - Ghi không cấp phát theo mẫu: chỉ gán vào array có sẵn; bool → 0/1, giá trị không phải số → bỏ qua
+  - Tổng bộ nhớ giới hạn max_bytes: hết chỗ → thu hồi vòng đệm của cảm biến lâu nhất không có số đo (LRU)
+    nếu nó đã im lặng ≥ idle giây và dùng lại luôn mảng của nó; mọi cảm biến đều đang gửi → cảm biến mới
+    không được lưu (tránh thu hồi vòng quanh khiến không cảm biến nào giữ được lịch sử); chia stripe như anomaly
+  - Truy vấn: latest / range [start, end) / downsample theo bước (count, mean, min, max), tìm nhị phân theo thời gian
+  - query(params) dùng chung cho HTTP (/ts/...) và MQTT (yêu cầu JSON trên topic riêng của gateway)
+"""
+import math
+import threading
+import time
+import zlib
+from array import array
+from collections import OrderedDict
+
+POINT_BYTES = 16  # float64 thời điểm + float64 giá trị
+MAX_RANGE_POINTS = 10000
+
+OPS = ("sensors", "latest", "range", "downsample")
+
+
+class _Series:
+    __slots__ = ("uid", "dev_id", "type", "key", "ts", "vals", "head", "count")
+
+    def __init__(self, capacity):
+        self.ts = array("d", bytes(8 * capacity))
+        self.vals = array("d", bytes(8 * capacity))
+        self.reset(None, None, None, None)
+
+    def reset(self, uid, dev_id, sensor_type, key):
+        self.uid = uid
+        self.dev_id = dev_id
+        self.type = sensor_type
+        self.key = key
+        self.head = 0
+        self.count = 0
+
+    def append(self, t, value):
+        cap = len(self.ts)
+        if self.count:
+            # Đồng hồ gateway lùi (NTP) → giữ thời gian không giảm để tìm nhị phân vẫn đúng
+            last = self.ts[self.head - 1]
+            if t < last:
+                t = last
+        self.ts[self.head] = t
+        self.vals[self.head] = value
+        self.head = (self.head + 1) % cap
+        if self.count < cap:
+            self.count += 1
+
+    def _pos(self, i):
+        """Chỉ số logic (0 = mẫu cũ nhất) → vị trí trong mảng."""
+        return (self.head - self.count + i) % len(self.ts)
+
+    def lower_bound(self, t):
+        """Chỉ số logic đầu tiên có thời điểm >= t."""
+        lo, hi = 0, self.count
+        ts, pos = self.ts, self._pos
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if ts[pos(mid)] < t:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def latest(self):
+        if not self.count:
+            return None
+        p = self.head - 1
+        return self.ts[p], self.vals[p]
+
+    def _slices(self, i, j):
+        """Chỉ số logic [i, j) → tối đa hai đoạn liên tiếp trong mảng (vòng đệm bị gập ở cuối)."""
+        cap = len(self.ts)
+        a, b = self._pos(i), self._pos(i) + (j - i)
+        if j <= i:
+            return ()
+        if b <= cap:
+            return ((a, b),)
+        return ((a, cap), (0, b - cap))
+
+    def range(self, start, end, limit):
+        """Các mẫu trong [start, end), tối đa limit mẫu mới nhất."""
+        i, j = self.lower_bound(start), self.lower_bound(end)
+        out = []
+        for a, b in self._slices(max(i, j - limit), j):
+            out.extend(zip(self.ts[a:b], self.vals[a:b]))
+        return out
+
+    def downsample(self, start, end, step):
+        """Gộp [start, end) theo ngăn step giây căn theo bội số của step → [(đầu ngăn, count, mean, min, max)],
+        bỏ ngăn rỗng."""
+        out = []
+        bucket = None
+        edge = -math.inf  # mẫu có thời điểm >= edge sang ngăn mới
+        n = total = lo = hi = 0
+        for a, b in self._slices(self.lower_bound(start), self.lower_bound(end)):
+            for t, v in zip(self.ts[a:b], self.vals[a:b]):
+                if t >= edge:
+                    if n:
+                        out.append((bucket, n, total / n, lo, hi))
+                    bucket = math.floor(t / step) * step
+                    edge = bucket + step
+                    n, total, lo, hi = 0, 0.0, v, v
+                n += 1
+                total += v
+                if v < lo:
+                    lo = v
+                elif v > hi:
+                    hi = v
+        if n:
+            out.append((bucket, n, total / n, lo, hi))
+        return out
+
+    def info(self):
+        latest = self.latest()
+        return {"sensorUid": self.uid, "dev_id": self.dev_id, "type": self.type, "key": self.key,
+                "points": self.count, "first": self.ts[self._pos(0)] if self.count else None,
+                "last": latest[0] if latest else None}
+
+
+class _Stripe:
+    __slots__ = ("lock", "series", "allocated")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.series = OrderedDict()  # sensorUid → _Series, cũ nhất (lâu không ghi) ở đầu
+        self.allocated = 0
+
+
+class TimeSeriesStore:
+    def __init__(self, points=1200, max_bytes=32 * 1024 * 1024, stripes=16, idle=600.0):
+        """points: số mẫu giữ lại mỗi cảm biến; max_bytes: tổng bộ nhớ mảng cho mọi cảm biến;
+        idle: số giây không có số đo trước khi vòng đệm của cảm biến được phép thu hồi."""
+        self.points = max(2, points)
+        self.idle = idle
+        self.stripes = [_Stripe() for _ in range(stripes)]
+        self.max_series = max(stripes, max_bytes // (POINT_BYTES * self.points))
+        self.per_stripe = max(1, self.max_series // stripes)
+        self.evicted = 0
+        self.rejected = 0
+
+    def _stripe(self, uid):
+        return self.stripes[zlib.crc32(uid.encode()) % len(self.stripes)]
+
+    # ---------- Ghi ----------
+    def record(self, dev_id, sensors, t=None):
+        """Ghi danh sách cảm biến của một gói (định dạng profile.extract) tại thời điểm t (epoch giây)."""
+        t = time.time() if t is None else t
+        for sensor in sensors:
+            data = sensor["data"]
+            if len(data) != 1:
+                continue
+            (key, value), = data.items()
+            if isinstance(value, bool):
+                value = 1.0 if value else 0.0
+            elif not isinstance(value, (int, float)):
+                continue
+            uid = sensor["sensorUid"]
+            stripe = self._stripe(uid)
+            with stripe.lock:
+                series = stripe.series.get(uid)
+                if series is None:
+                    series = self._acquire(stripe, t)
+                    if series is None:
+                        self.rejected += 1
+                        continue
+                    series.reset(uid, dev_id, sensor["type"], key)
+                    stripe.series[uid] = series
+                else:
+                    stripe.series.move_to_end(uid)
+                series.append(t, value)
+
+    def _acquire(self, stripe, t):
+        """Vòng đệm trống: cấp mới nếu còn hạn mức, không thì thu hồi mảng của cảm biến LRU đã im lặng đủ lâu."""
+        if stripe.allocated < self.per_stripe:
+            stripe.allocated += 1
+            return _Series(self.points)
+        oldest = next(iter(stripe.series.values()))
+        if t - oldest.latest()[0] < self.idle:
+            return None
+        del stripe.series[oldest.uid]
+        self.evicted += 1
+        return oldest
+
+    # ---------- Truy vấn ----------
+    def _read(self, uid, fn):
+        stripe = self._stripe(uid)
+        with stripe.lock:
+            series = stripe.series.get(uid)
+            return None if series is None else fn(series)
+
+    def latest(self, uid):
+        return self._read(uid, _Series.latest)
+
+    def range(self, uid, start, end=math.inf, limit=MAX_RANGE_POINTS):
+        return self._read(uid, lambda s: s.range(start, end, limit))
+
+    def downsample(self, uid, start, end, step):
+        return self._read(uid, lambda s: s.downsample(start, end, step))
+
+    def sensors(self, dev_id=None):
+        out = []
+        for stripe in self.stripes:
+            with stripe.lock:
+                out.extend(s.info() for s in stripe.series.values() if dev_id is None or s.dev_id == dev_id)
+        out.sort(key=lambda s: s["sensorUid"])
+        return out
+
+    def stats(self):
+        series = points = allocated = 0
+        for stripe in self.stripes:
+            with stripe.lock:
+                series += len(stripe.series)
+                points += sum(s.count for s in stripe.series.values())
+                allocated += stripe.allocated
+        return {"sensors": series, "points": points, "evicted": self.evicted, "rejected": self.rejected,
+                "bytes": allocated * POINT_BYTES * self.points}
+
+    # ---------- API dùng chung HTTP / MQTT ----------
+    def query(self, op, params, now=None):
+        """op: sensors | latest | range | downsample; params: sensor, dev_id, start, end, since, step, limit.
+        Trả về (status HTTP, đối tượng JSON)."""
+        now = time.time() if now is None else now
+        try:
+            if op not in OPS:
+                return 404, {"error": f"op không hỗ trợ: {op}", "ops": list(OPS)}
+            if op == "sensors":
+                return 200, self.sensors(params.get("dev_id"))
+            uid = params.get("sensor")
+            if op == "latest" and not uid and params.get("dev_id"):
+                return 200, {s["sensorUid"]: self.latest(s["sensorUid"]) for s in self.sensors(params["dev_id"])}
+            if not uid:
+                return 400, {"error": "thiếu tham số sensor"}
+            if op == "latest":
+                result = self.latest(uid)
+            else:
+                end = float(params.get("end", math.inf))
+                if "start" in params:
+                    start = float(params["start"])
+                else:
+                    start = now - float(params.get("since", 600))
+                if op == "range":
+                    result = self.range(uid, start, end, min(int(params.get("limit", MAX_RANGE_POINTS)),
+                                                             MAX_RANGE_POINTS))
+                else:
+                    # Ngăn rỗng bị bỏ → số ngăn trả về không vượt số mẫu trong vòng đệm
+                    step = float(params.get("step", 60))
+                    if not step > 0:
+                        return 400, {"error": "step phải > 0"}
+                    result = self.downsample(uid, start, end, step)
+        except (TypeError, ValueError) as e:
+            return 400, {"error": f"tham số không hợp lệ: {e}"}
+        if result is None:
+            return 404, {"error": f"không có dữ liệu cho {uid}"}
+        return 200, {"sensor": uid, op: result}
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Backend Uploader - Gửi dữ liệu cảm biến lên backend tách khỏi callback MQTT
+  - Hàng đợi trong bộ nhớ có giới hạn (đầy → bỏ gói, không chặn luồng paho)
+  - Mỗi worker giữ một requests.Session riêng (keep-alive, tái sử dụng kết nối TLS)
+  - Gom lô theo kích thước (batch_size) hoặc theo thời gian (flush_interval)
+  - Bộ đếm độ trễ / thông lượng để so sánh msg/s trước và sau
+"""
+import logging
+import queue
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from encoding import BodyEncoder
+from metrics import BACKEND_RESPONSES, MESSAGES_UPLOADED, STAGE_SECONDS, UPLOAD_FAILED
+
+LATENCY_WINDOW = 1024
+
+log = logging.getLogger("gateway.uploader")
+
+
+class UploaderStats:
+    """Bộ đếm dùng chung cho các worker, cập nhật theo lô để giảm tranh chấp lock."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.enqueued = 0
+        self.dropped = 0
+        self.sent = 0
+        self.failed = 0
+        self.requests = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self._last_sent = 0
+        self._last_time = self.started_at
+
+    def record(self, count, ok, latency):
+        with self.lock:
+            self.requests += 1
+            if ok:
+                self.sent += count
+            else:
+                self.failed += count
+            self.latency_total += latency
+            if latency > self.latency_max:
+                self.latency_max = latency
+            self.latencies.append(latency)
+
+    def snapshot(self):
+        with self.lock:
+            now = time.time()
+            interval = max(now - self._last_time, 1e-6)
+            rate = (self.sent - self._last_sent) / interval
+            self._last_sent, self._last_time = self.sent, now
+            lats = sorted(self.latencies)
+            return {
+                "enqueued": self.enqueued,
+                "dropped": self.dropped,
+                "sent": self.sent,
+                "failed": self.failed,
+                "requests": self.requests,
+                "msg_per_sec": rate,
+                "msg_per_sec_total": self.sent / max(now - self.started_at, 1e-6),
+                "latency_avg_ms": 1000 * self.latency_total / self.requests if self.requests else 0.0,
+                "latency_p50_ms": 1000 * lats[len(lats) // 2] if lats else 0.0,
+                "latency_p99_ms": 1000 * lats[min(len(lats) - 1, int(len(lats) * 0.99))] if lats else 0.0,
+                "latency_max_ms": 1000 * self.latency_max,
+            }
+
+
+class BackendUploader:
+    def __init__(self, url, batch_url=None, queue_size=1000, batch_size=20,
+                 flush_interval=0.5, concurrency=2, timeout=15, verify=False,
+                 stats_interval=30, name="UPLOAD", label_fn=None, encoder=None, endpoint=None):
+        """label_fn(payload) -> dev_id dùng làm nhãn metric uploaded/failed (None = không đếm theo thiết bị).
+        encoder: BodyEncoder (định dạng + nén body), mặc định JSON không nén.
+        endpoint: BackendEndpoint (circuit breaker + thử lại + timeout thích nghi), None = gửi một lần."""
+        self.name = name
+        self.encoder = encoder or BodyEncoder()
+        self.endpoint = endpoint
+        self.label_fn = label_fn
+        self._upload_seconds = STAGE_SECONDS.labels(name.lower())
+        self.url = url
+        self.batch_url = batch_url
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.verify = verify
+        self.stats_interval = stats_interval
+        self.stats = UploaderStats()
+        self._stop = threading.Event()
+        self._threads = []
+        self._deliver_session = None
+
+    # ---------- API cho luồng MQTT ----------
+    def submit(self, payload):
+        """Đưa payload vào hàng đợi, không bao giờ chặn. Trả về False nếu hàng đợi đầy."""
+        try:
+            self.queue.put_nowait(payload)
+        except queue.Full:
+            with self.stats.lock:
+                self.stats.dropped += 1
+            log.error("[%s] Hàng đợi đầy (%d) → bỏ gói seq=%s", self.name, self.queue.maxsize, payload.get('sequenceNumber'))
+            return False
+        with self.stats.lock:
+            self.stats.enqueued += 1
+        return True
+
+    def start(self):
+        for i in range(self.concurrency):
+            t = threading.Thread(target=self._worker, name=f"{self.name.lower()}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        if self.stats_interval:
+            t = threading.Thread(target=self._report_loop, name=f"{self.name.lower()}-stats", daemon=True)
+            t.start()
+        log.info("[%s] Khởi động %d worker | batch=%d | flush=%ss | queue=%d",
+                 self.name, self.concurrency, self.batch_size, self.flush_interval, self.queue.maxsize)
+
+    def stop(self, timeout=10):
+        """Dừng worker sau khi gửi nốt những gì còn trong hàng đợi (tối đa timeout giây)."""
+        deadline = time.time() + timeout
+        while not self.queue.empty() and time.time() < deadline:
+            time.sleep(0.05)
+        self._stop.set()
+        for t in self._threads:
+            t.join(max(0.0, deadline - time.time()))
+        self.print_stats()
+
+    # ---------- Worker ----------
+    def _new_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.verify = self.verify
+        return session
+
+    def _collect_batch(self):
+        try:
+            first = self.queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self):
+        session = self._new_session()
+        while not self._stop.is_set():
+            batch = self._collect_batch()
+            if not batch:
+                continue
+            if self.batch_url and len(batch) > 1:
+                self._post(session, self.batch_url, batch, len(batch))
+            else:
+                for payload in batch:
+                    self._post(session, self.url, payload, 1)
+        session.close()
+
+    def deliver(self, batch):
+        """Gửi đồng bộ theo thứ tự (dùng cho spool). Trả về số gói đầu tiên đã được backend xác nhận.
+
+        Lỗi 4xx (trừ 408/429) là payload bị từ chối vĩnh viễn → coi như đã xử lý để không kẹt hàng đợi.
+        """
+        if self._deliver_session is None:
+            self._deliver_session = self._new_session()
+        session = self._deliver_session
+        if self.batch_url and len(batch) > 1:
+            return len(batch) if self._is_final(self._post(session, self.batch_url, batch, len(batch))) else 0
+        for i, payload in enumerate(batch):
+            if not self._is_final(self._post(session, self.url, payload, 1)):
+                return i
+        return len(batch)
+
+    @staticmethod
+    def _is_final(status):
+        if status is None:
+            return False
+        return status < 500 and status not in (408, 429)
+
+    def _post(self, session, url, body, count):
+        """POST một payload hoặc một lô. Trả về status code, None nếu lỗi kết nối/timeout/mạch đang open."""
+        t0 = time.perf_counter()
+        data, headers = self.encoder.encode(body)
+        if self.endpoint is None:
+            status = self._send(session, url, data, headers, count, self.timeout)
+        else:
+            # Chờ giữa các lần thử bằng _stop.wait → dừng gateway không bị kẹt trong backoff
+            status = self.endpoint.call(lambda timeout: self._send(session, url, data, headers, count, timeout),
+                                        sleep=self._stop.wait)
+        elapsed = time.perf_counter() - t0
+        ok = status in [200, 201]
+        self.stats.record(count, ok, elapsed)
+        self._record_metrics(body, count, status, ok, elapsed)
+        return status
+
+    def _send(self, session, url, data, headers, count, timeout):
+        try:
+            response = session.post(url, data=data, headers=headers, timeout=timeout)
+        except requests.exceptions.Timeout:
+            log.error("[SERVER] TIMEOUT %.1fs (%s, %d gói)", timeout, self.name, count)
+            return None
+        except Exception as e:
+            log.error("[SERVER] LỖI: %s", e)
+            return None
+        self._log_response(response, count)
+        return response.status_code
+
+    def _record_metrics(self, body, count, status, ok, elapsed):
+        self._upload_seconds.observe(elapsed)
+        BACKEND_RESPONSES.labels(self.name.lower(), str(status) if status is not None else "error").inc()
+        if self.label_fn is None:
+            return
+        counter = MESSAGES_UPLOADED if ok else UPLOAD_FAILED
+        for payload in (body if count > 1 else (body,)):
+            counter.labels(self.label_fn(payload)).inc()
+
+    def _log_response(self, response, count):
+        if response.status_code not in [200, 201]:
+            log.error("[SERVER] LỖI %s → %s", response.status_code, response.text[:150])
+            return
+        if not log.isEnabledFor(logging.DEBUG):
+            return
+        if count > 1:
+            log.debug("[SERVER] ĐÃ NHẬN THÀNH CÔNG %d gói", count)
+            return
+        try:
+            res = response.json()
+            anomaly = res.get("data", {}).get("anomalyDetected", False)
+            sid = res.get("data", {}).get("sensorDataId", "N/A")
+            log.debug("[SERVER] ĐÃ NHẬN THÀNH CÔNG | ID: %s | Anomaly: %s", sid, anomaly)
+        except Exception:
+            log.debug("[SERVER] ĐÃ NHẬN THÀNH CÔNG (không parse được JSON)")
+
+    # ---------- Thống kê ----------
+    def print_stats(self):
+        s = self.stats.snapshot()
+        log.info("[%s] %.1f msg/s (TB %.1f) | queue %d/%d | lat avg %.0fms p50 %.0fms p99 %.0fms max %.0fms | "
+                 "ok %d fail %d drop %d", self.name, s['msg_per_sec'], s['msg_per_sec_total'],
+                 self.queue.qsize(), self.queue.maxsize, s['latency_avg_ms'], s['latency_p50_ms'],
+                 s['latency_p99_ms'], s['latency_max_ms'], s['sent'], s['failed'], s['dropped'],
+                 extra={"uploader": self.name, **s})
+
+    def _report_loop(self):
+        while not self._stop.wait(self.stats_interval):
+            self.print_stats()